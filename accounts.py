@@ -0,0 +1,46 @@
+"""Правила регистрации и проверка входа без интерфейса: общие для окна входа и игрового сервера."""
+
+from passwords import encrypt_password, decrypt_password
+
+INCORRECT_CHARS = '!@#$%^&*+_-=|/?><~`[]±§'
+
+
+def registration_error(username, password):
+    """Текст ошибки, если логин или пароль не подходят для регистрации, иначе None"""
+    if len(username) < 5:
+        return "Логин должен быть не менее 5 символов!"
+    if '@' not in username:
+        return "Логин должен содержать символ '@'!"
+    if len(password) < 5:
+        return "Пароль должен быть не менее 5 символов!"
+    for char in username:
+        if char in INCORRECT_CHARS and char != '@':
+            return f"Недопустимый символ в логине: {char}"
+    for char in password:
+        if char in INCORRECT_CHARS:
+            return f"Недопустимый символ в пароле: {char}"
+    if '@' in password:
+        return "Пароль не должен содержать символ '@'!"
+    return None
+
+
+def register_user(store, username, password, key=None):
+    """Проверяет и добавляет пользователя. Возвращает текст ошибки или None при успехе"""
+    error = registration_error(username, password)
+    if error is not None:
+        return error
+    # Логин — первичный ключ: повторная регистрация не проходит вставку
+    if not store.add(username, encrypt_password(password, key)):
+        return "Пользователь с таким логином уже существует!"
+    return None
+
+
+def check_login(store, username, password, key=None):
+    """True, если пользователь есть и пароль верный.
+    ValueError — сохраненный пароль не расшифровывается"""
+    if not username or not password:
+        return False
+    user = store.get(username)
+    if user is None:
+        return False
+    return decrypt_password(user['password'], key) == password
@@ -0,0 +1,134 @@
+"""Оценка пачки позиций за один вызов на массивах NumPy.
+
+Те же слагаемые, что и у search.evaluate: материал, продвижение пешек, расстояние королей
+до пешек, правило квадрата и штраф королю за край доски; результат совпадает с evaluate
+для каждой позиции. Позиции складываются в массив через двоичную запись serialize.pack
+(25 байт на позицию) или напрямую из битбордов фигур, дальше нет ни одного цикла Python
+по клеткам.
+
+evaluate_batch и evaluate_children всегда возвращают список int: с NumPy он получается из
+массива evaluate_arrays, без NumPy (зависимость необязательная) позиции считаются по одной
+через evaluate.
+
+Пачками оценивает ответы политика greedy в selfplay.py. Альфа-бета поиск пачки не использует:
+листья приходят к нему по одному, а упорядочивание тихих ходов по оценке потомков, собранных
+пачкой, на позициях bench.py до глубины 11 сокращает дерево лишь на 1%, а сам сбор потомков
+делает поиск в 1,2-1,7 раза медленнее.
+"""
+
+try:
+    import numpy as np
+except ImportError:  # Без NumPy пачка оценивается по одной позиции
+    np = None
+
+from bitboard import WHITE, BLACK, PIECES, PIECE_VALUES, row_col
+from serialize import PIECE_CODES, PACKED_SIZE
+from search import (
+    evaluate, PAWN_ADVANCE, CENTER_DISTANCE, EDGE_PENALTY, KING_DISTANCE_WEIGHT, UNSTOPPABLE_PAWN,
+)
+
+HAVE_NUMPY = np is not None
+
+if HAVE_NUMPY:
+    _SQUARES = np.arange(64)
+    _ROWS = _SQUARES >> 3
+    _COLS = _SQUARES & 7
+    _RC = np.array([row_col(sq) for sq in range(64)])
+    # Расстояние в ходах короля между любыми двумя клетками; строка 64 — «короля нет»
+    _DISTANCE = np.zeros((65, 64), dtype=np.int32)
+    _DISTANCE[:64] = np.abs(_RC[:, None, :] - _RC[None, :, :]).max(axis=2)
+    # Слагаемые, зависящие только от фигуры и клетки (со знаком, с точки зрения белых):
+    # материал, продвижение пешек и штраф королю за край доски
+    _TABLE = np.zeros((8, 64), dtype=np.int32)
+    for _piece, _code in PIECE_CODES.items():
+        _TABLE[_code] = PIECE_VALUES[_piece]
+    _TABLE[PIECE_CODES['P']] += np.array(PAWN_ADVANCE)[_ROWS]
+    _TABLE[PIECE_CODES['K']] -= EDGE_PENALTY * np.array(CENTER_DISTANCE)
+    for _piece in 'kpq':
+        _TABLE[PIECE_CODES[_piece]] *= -1
+    _TABLE[PIECE_CODES['p']] -= np.array(PAWN_ADVANCE)[7 - _ROWS]
+    _TABLE[PIECE_CODES['k']] += EDGE_PENALTY * np.array(CENTER_DISTANCE)
+
+    _PIECE_WEIGHTS = np.array([PIECE_CODES[piece] for piece in PIECES], dtype=np.uint8)[:, None]
+
+
+def _bitboards(pos):
+    """Битборды фигур в порядке PIECES и сторона на ходу"""
+    bb = pos.bb
+    return [bb[piece] for piece in PIECES] + [pos.side]
+
+
+def stack(positions):
+    """Массивы пачки: коды фигур (N, 64) и сторона на ходу (N,)"""
+    return _stack_bitboards([_bitboards(pos) for pos in positions])
+
+
+def _stack_bitboards(rows):
+    data = np.array(rows, dtype=np.uint64)
+    bits = np.unpackbits(data[:, :-1].view(np.uint8), axis=1, bitorder='little').reshape(-1, len(PIECES), 64)
+    codes = (bits * _PIECE_WEIGHTS).sum(axis=1, dtype=np.uint8)
+    return codes, data[:, -1].astype(np.int32)
+
+
+def stack_packed(records):
+    """То же, что stack, по готовым двоичным записям serialize.pack"""
+    data = np.frombuffer(b''.join(records), dtype=np.uint8)
+    data = data.reshape(-1, PACKED_SIZE)
+    bits = np.unpackbits(data[:, :-1], axis=1, bitorder='little').reshape(-1, 64, 3).astype(np.int8)
+    codes = bits[:, :, 0] | bits[:, :, 1] << 1 | bits[:, :, 2] << 2
+    side = (data[:, -1] & 1).astype(np.int32)
+    return codes, side
+
+
+def _king_squares(codes, code):
+    """Клетка короля в каждой позиции; 64, если короля нет"""
+    present = codes == code
+    return np.where(present.any(axis=1), present.argmax(axis=1), 64)
+
+
+def evaluate_arrays(codes, side):
+    """Оценки пачки по массивам stack() с точки зрения стороны на ходу (int32, форма (N,))"""
+    white_king = _king_squares(codes, PIECE_CODES['K'])
+    black_king = _king_squares(codes, PIECE_CODES['k'])
+    score = _TABLE[codes, _SQUARES].sum(axis=1)
+
+    white_pawns = codes == PIECE_CODES['P']
+    black_pawns = codes == PIECE_CODES['p']
+    to_white = _DISTANCE[white_king]
+    to_black = _DISTANCE[black_king]
+    # Королям выгодно быть ближе к любой пешке: у обоих цветов слагаемое одного знака
+    kings_present = (white_king < 64) & (black_king < 64)
+    near = ((to_black - to_white) * (white_pawns | black_pawns)).sum(axis=1)
+    score += np.where(kings_present, KING_DISTANCE_WEIGHT * near, 0)
+
+    # Правило квадрата: король соперника не успевает к полю превращения
+    white_race = to_black[:, _COLS] - (side != WHITE)[:, None] > _ROWS
+    black_race = to_white[:, 56 + _COLS] - (side != BLACK)[:, None] > 7 - _ROWS
+    score += UNSTOPPABLE_PAWN * (
+        (white_race & white_pawns & (black_king < 64)[:, None]).sum(axis=1)
+        - (black_race & black_pawns & (white_king < 64)[:, None]).sum(axis=1))
+    return np.where(side == WHITE, score, -score).astype(np.int32)
+
+
+def evaluate_batch(positions):
+    """Оценки позиций (список int) с точки зрения стороны на ходу в каждой"""
+    if not HAVE_NUMPY:
+        return [evaluate(pos) for pos in positions]
+    if not positions:
+        return []
+    return evaluate_arrays(*stack(positions)).tolist()
+
+
+def evaluate_children(pos, moves):
+    """Оценки позиций после каждого хода из moves (список int, с точки зрения соперника,
+    который там ходит)"""
+    children = []
+    for move in moves:
+        pos.make_move(move)
+        children.append(_bitboards(pos) if HAVE_NUMPY else evaluate(pos))
+        pos.unmake_move()
+    if not HAVE_NUMPY:
+        return children
+    if not children:
+        return []
+    return evaluate_arrays(*_stack_bitboards(children)).tolist()
@@ -0,0 +1,270 @@
+"""Замеры скорости: perft, микрозамеры правил и задержка хода ИИ, сравнение с эталоном.
+
+Позиции берутся из фиксированного набора расстановок по правилам init_board, поэтому числа
+узлов perft одинаковы на любой машине и служат проверкой генератора ходов. Результат пишется
+в JSON; если указан эталон, каждая метрика сравнивается с ним, и при ухудшении больше порога
+программа завершается с кодом 1.
+
+Запуск: python bench.py [-o bench.json] [--baseline bench_baseline.json] [--save-baseline]
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+from bitboard import BLACK, WHITE, row_col
+from movegen import generate
+from engine import Engine, random_start
+from parallel import ParallelSearcher
+from serialize import to_fen
+from search import MAX_PLY
+from netstats import percentile
+
+CORPUS_SIZE = 8
+CORPUS_SEED = "bench"
+PERFT_DEPTH = 4
+AI_REPEATS = 5
+THRESHOLD = 0.10  # Допустимое ухудшение метрики относительно эталона
+
+
+def corpus(size=CORPUS_SIZE):
+    """Фиксированный набор стартовых позиций"""
+    return [random_start(random.Random("%s:%d" % (CORPUS_SEED, i))) for i in range(size)]
+
+
+def perft(pos, depth, buffers=None):
+    """Число листьев дерева псевдолегальных ходов глубины depth.
+    Позиция со взятым королем — конец партии: она не раскрывается и листом не считается"""
+    if buffers is None:
+        buffers = [[] for _ in range(depth + 1)]
+    if depth == 0:
+        return 1
+    if pos.kings[WHITE] is None or pos.kings[BLACK] is None:
+        return 0
+    moves = buffers[depth]
+    count = generate(pos, pos.side, moves)
+    if depth == 1:
+        return count
+    nodes = 0
+    for move in moves[:count]:
+        pos.make_move(move)
+        nodes += perft(pos, depth - 1, buffers)
+        pos.unmake_move()
+    return nodes
+
+
+def _best_time(func, min_time=0.2, rounds=5):
+    """Лучшее из rounds средних времен одного вызова func в секундах.
+    Минимум меньше всего зависит от шума соседних процессов"""
+    best = None
+    for _ in range(rounds):
+        calls = 0
+        started = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < min_time / rounds:
+            func()
+            calls += 1
+            elapsed = time.perf_counter() - started
+        if best is None or elapsed / calls < best:
+            best = elapsed / calls
+    return best
+
+
+def _load(engine, pos):
+    """Ставит на доску движка фигуры позиции pos"""
+    engine.reset()
+    for sq, piece in enumerate(pos.squares):
+        if piece:
+            engine.pos.put(piece, sq)
+
+
+def bench_perft(positions, depth=PERFT_DEPTH):
+    results = {}
+    for i, pos in enumerate(positions):
+        key = pos.key
+        nodes = perft(pos, depth)
+        elapsed = _best_time(lambda: perft(pos, depth))
+        if pos.key != key or pos.stack:
+            raise AssertionError("perft не вернул позицию %d в исходное состояние" % i)
+        results['pos%d' % i] = {
+            'start': to_fen(pos),
+            'depth': depth,
+            'nodes': nodes,
+            'nps': nodes / elapsed if elapsed else 0.0,
+        }
+    return results
+
+
+def bench_micro(positions):
+    """Микрозамеры правил движка: каждый вызов проходит по всем фигурам или клеткам позиции"""
+    engine = Engine(tablebase_dir=None)
+
+    def piece_count():
+        return sum(1 for color in (WHITE, BLACK) for _ in engine.pos.pieces(color))
+
+    # Имя, функция и число вызовов правила за один её запуск
+    cases = (
+        ('get_all_valid_moves', lambda: [
+            engine.get_all_valid_moves(piece, *row_col(sq))
+            for color in (WHITE, BLACK) for sq, piece in engine.pos.pieces(color)
+        ], piece_count),
+        ('is_under_attack', lambda: [engine.is_under_attack(r, c) for r in range(8) for c in range(8)],
+         lambda: 64),
+        ('is_safe_move', lambda: [engine.is_safe_move(r, c) for r in range(8) for c in range(8)],
+         lambda: 64),
+        ('is_check', lambda: (engine.is_check('white'), engine.is_check('black')), lambda: 2),
+        ('king_escape', engine.king_escape, lambda: 1),
+    )
+    results = {}
+    for name, func, calls in cases:
+        total = 0.0
+        for pos in positions:
+            _load(engine, pos)
+            total += _best_time(func, 0.1) * 1e9 / calls()
+        results[name] = {'ns': total / len(positions)}
+    return results
+
+
+def bench_ai(positions, repeats=AI_REPEATS, ai_time_ms=None, ai_depth=MAX_PLY, tablebase_dir=None, jobs=1):
+    """Задержка хода черных по каждой позиции; таблица транспозиций очищается перед каждым замером.
+    jobs > 1 — параллельный поиск (пул создается до замеров и в задержку не входит)"""
+    engine = Engine(ai_time_ms=ai_time_ms, ai_depth=ai_depth, tablebase_dir=tablebase_dir, ai_jobs=jobs)
+    try:
+        if isinstance(engine.searcher, ParallelSearcher):
+            engine.searcher.start()
+        return _bench_ai(engine, positions, repeats)
+    finally:
+        engine.close()
+
+
+def _bench_ai(engine, positions, repeats):
+    results = {}
+    for i, pos in enumerate(positions):
+        samples = []
+        for _ in range(repeats):
+            _load(engine, pos)
+            engine.searcher.tt.clear()
+            started = time.perf_counter()
+            engine.choose_move()
+            samples.append((time.perf_counter() - started) * 1000.0)
+        results['pos%d' % i] = {
+            'p50_ms': percentile(samples, 50),
+            'p95_ms': percentile(samples, 95),
+            'p99_ms': percentile(samples, 99),
+        }
+    return results
+
+
+def metrics(results):
+    """Плоский словарь метрик: имя -> (значение, направление).
+    Направление: -1 — меньше лучше, 1 — больше лучше, 0 — должно совпадать точно"""
+    flat = {}
+    for section in ('perft', 'micro', 'ai'):
+        for case, values in results.get(section, {}).items():
+            for name, value in values.items():
+                if name in ('start', 'depth'):
+                    continue
+                if name == 'nodes':
+                    direction = 0
+                elif name == 'nps':
+                    direction = 1
+                else:
+                    direction = -1
+                flat['%s.%s.%s' % (section, case, name)] = (value, direction)
+    return flat
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Список строк с описанием метрик, которые хуже эталона больше чем на threshold"""
+    current = metrics(results)
+    failures = []
+    for name, (expected, direction) in sorted(metrics(baseline).items()):
+        if name not in current:
+            continue
+        value = current[name][0]
+        if direction == 0:
+            if value != expected:
+                failures.append("%s: %r, в эталоне %r" % (name, value, expected))
+            continue
+        if not expected:
+            continue
+        change = (value - expected) / expected * direction
+        if change < -threshold:
+            failures.append("%s: %.4g, в эталоне %.4g (%+.1f%%)" % (name, value, expected, -change * 100))
+    return failures
+
+
+def run(size=CORPUS_SIZE, depth=PERFT_DEPTH, repeats=AI_REPEATS, ai_time_ms=None, ai_depth=4,
+        tablebase_dir=None, sections=('perft', 'micro', 'ai'), jobs=1):
+    positions = corpus(size)
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'corpus': size,
+            'perft_depth': depth,
+            'ai_repeats': repeats,
+            'ai_time_ms': ai_time_ms,
+            'ai_depth': ai_depth,
+            'ai_jobs': jobs,
+        },
+    }
+    if 'perft' in sections:
+        results['perft'] = bench_perft(positions, depth)
+    if 'micro' in sections:
+        results['micro'] = bench_micro(positions)
+    if 'ai' in sections:
+        results['ai'] = bench_ai(positions, repeats, ai_time_ms, ai_depth, tablebase_dir, jobs)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры perft, правил и задержки хода ИИ")
+    parser.add_argument('-o', '--output', default='-', help="файл для результата JSON (по умолчанию stdout)")
+    parser.add_argument('--baseline', help="эталонный JSON для сравнения")
+    parser.add_argument('--save-baseline', action='store_true', help="записать результат в файл эталона")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="допустимое ухудшение (0.1 — 10%%)")
+    parser.add_argument('--positions', type=int, default=CORPUS_SIZE, help="размер набора позиций")
+    parser.add_argument('--depth', type=int, default=PERFT_DEPTH, help="глубина perft")
+    parser.add_argument('--repeats', type=int, default=AI_REPEATS, help="замеров хода ИИ на позицию")
+    parser.add_argument('--ai-depth', type=int, default=4,
+                        help="глубина поиска ИИ (фиксированная глубина дает сравнимые задержки)")
+    parser.add_argument('--ai-time-ms', type=int, default=None, help="ограничение времени на ход ИИ")
+    parser.add_argument('--tablebases', default=None, help="каталог эндшпильных таблиц для ИИ")
+    parser.add_argument('--jobs', type=int, default=1, help="процессов поиска ИИ (0 — по числу ядер)")
+    parser.add_argument('--only', nargs='+', choices=('perft', 'micro', 'ai'), default=('perft', 'micro', 'ai'),
+                        help="какие замеры выполнить")
+    args = parser.parse_args(argv)
+
+    results = run(args.positions, args.depth, args.repeats, args.ai_time_ms, args.ai_depth,
+                  args.tablebases, args.only, args.jobs or None)
+    text = json.dumps(results, indent=2, ensure_ascii=False) + "\n"
+    if args.output == '-':
+        sys.stdout.write(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    if not args.baseline:
+        return 0
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print("эталон записан в %s" % args.baseline, file=sys.stderr)
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    failures = compare(results, baseline, args.threshold)
+    for line in failures:
+        print("регрессия: " + line, file=sys.stderr)
+    if failures:
+        return 1
+    print("регрессий нет", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
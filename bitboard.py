@@ -0,0 +1,335 @@
+"""Битовое представление позиции: по одному 64-битному числу на каждый вид фигуры"""
+
+import random
+
+# Клетка кодируется числом sq = row * 8 + col (row 0 — восьмая горизонталь, как в ChessGame.board)
+PIECES = ('K', 'P', 'Q', 'k', 'p', 'q')
+WHITE = 0
+BLACK = 1
+
+
+def square(row, col):
+    """Номер клетки по строке и столбцу"""
+    return row * 8 + col
+
+
+def row_col(sq):
+    """Строка и столбец по номеру клетки"""
+    return sq >> 3, sq & 7
+
+
+def square_name(sq):
+    """Обозначение клетки, например 'e4' (как подписи на доске: буквы A-H, цифры 8-1 сверху вниз)"""
+    return "abcdefgh"[sq & 7] + str(8 - (sq >> 3))
+
+
+def parse_square(name):
+    """Номер клетки по обозначению вида 'e4'"""
+    col = "abcdefgh".find(name[0].lower()) if name else -1
+    if len(name) != 2 or col < 0 or name[1] not in "12345678":
+        raise ValueError("Неверное обозначение клетки: %r" % name)
+    return square(8 - int(name[1]), col)
+
+
+def bit(sq):
+    """Маска из одной клетки"""
+    return 1 << sq
+
+
+def lsb(bb):
+    """Номер младшей занятой клетки (bb не должен быть пустым)"""
+    return (bb & -bb).bit_length() - 1
+
+
+def iter_bits(bb):
+    """Перебирает номера занятых клеток маски"""
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def popcount(bb):
+    """Количество занятых клеток маски"""
+    return bin(bb).count("1")
+
+
+def color_of(piece):
+    """Цвет фигуры: заглавные буквы — белые"""
+    return WHITE if piece.isupper() else BLACK
+
+
+# ===================== Предрасчитанные таблицы ходов =====================
+
+def _on_board(row, col):
+    return 0 <= row < 8 and 0 <= col < 8
+
+
+KING_DELTAS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+QUEEN_DIRECTIONS = KING_DELTAS
+
+# Шаги короля: список клеток и маска для каждой клетки
+KING_STEPS = [
+    tuple(square(r + dr, c + dc) for dr, dc in KING_DELTAS if _on_board(r + dr, c + dc))
+    for r, c in map(row_col, range(64))
+]
+KING_ATTACKS = [sum(1 << t for t in steps) for steps in KING_STEPS]
+
+# Шаг пешки вперед (-1, если его нет): белые идут к строке 0, черные — к строке 7
+PAWN_PUSH = (
+    [sq - 8 if sq >= 8 else -1 for sq in range(64)],
+    [sq + 8 if sq < 56 else -1 for sq in range(64)],
+)
+# Клетки, которые пешка бьет по диагонали
+PAWN_ATTACKS = tuple(
+    [
+        sum(1 << square(r + dr, c + dc) for dc in (-1, 1) if _on_board(r + dr, c + dc))
+        for r, c in map(row_col, range(64))
+    ]
+    for dr in (-1, 1)
+)
+
+# Лучи ферзя: для каждой клетки восемь кортежей клеток от ближней к дальней
+RAYS = [
+    tuple(
+        tuple(square(r + dr * i, c + dc * i) for i in range(1, 8) if _on_board(r + dr * i, c + dc * i))
+        for dr, dc in QUEEN_DIRECTIONS
+    )
+    for r, c in map(row_col, range(64))
+]
+
+
+def queen_attacks(sq, occupied):
+    """Клетки, которые бьет ферзь с клетки sq, включая первую занятую клетку на каждом луче"""
+    mask = 0
+    for ray in RAYS[sq]:
+        for t in ray:
+            mask |= 1 << t
+            if occupied >> t & 1:
+                break
+    return mask
+
+
+# Ключи Зобриста: по случайному 64-битному числу на фигуру и клетку и одно на ход черных.
+# Генератор с фиксированным зерном дает одинаковые ключи во всех процессах
+_zobrist_rng = random.Random(20240601)
+ZOBRIST = {piece: [_zobrist_rng.getrandbits(64) for _ in range(64)] for piece in PIECES}
+ZOBRIST_BLACK = _zobrist_rng.getrandbits(64)
+del _zobrist_rng
+
+# Материал в сотых долях пешки; король не считается
+PIECE_VALUES = {'K': 0, 'P': 100, 'Q': 900, 'k': 0, 'p': 100, 'q': 900}
+
+
+class Position:
+    """Позиция: битборды фигур, занятость по цветам, массив клеток для быстрого piece_at,
+    карты атак сторон, клетки королей, счетчики фигур и материал.
+
+    Ходы делаются через make_move/unmake_move: стек отката позволяет перебирать варианты
+    на любую глубину без копирования доски."""
+
+    def __init__(self):
+        self.bb = dict.fromkeys(PIECES, 0)
+        self.occ = [0, 0]  # Занятость белыми и черными
+        self.squares = [None] * 64
+        self.attacks_from = [0] * 64  # Клетки, которые бьет фигура с данной клетки
+        self.attacks = [0, 0]  # Карты атак белых и черных
+        self.kings = [None, None]  # Клетки королей (None — король взят)
+        self.counts = dict.fromkeys(PIECES, 0)  # Количество фигур каждого вида
+        self.material = [0, 0]
+        self.side = WHITE  # Чей ход
+        self.key = 0  # Ключ Зобриста, обновляется при каждом изменении
+        self.stack = []  # Записи для отката ходов
+
+    def clear(self):
+        """Очищает доску"""
+        self.__init__()
+
+    def copy(self):
+        """Независимая копия позиции (без стека отката)"""
+        other = Position()
+        other.bb = dict(self.bb)
+        other.occ = list(self.occ)
+        other.squares = list(self.squares)
+        other.attacks_from = list(self.attacks_from)
+        other.attacks = list(self.attacks)
+        other.kings = list(self.kings)
+        other.counts = dict(self.counts)
+        other.material = list(self.material)
+        other.side = self.side
+        other.key = self.key
+        return other
+
+    @property
+    def occupied(self):
+        return self.occ[WHITE] | self.occ[BLACK]
+
+    def piece_at(self, sq):
+        return self.squares[sq]
+
+    def _place(self, piece, sq):
+        mask = 1 << sq
+        color = color_of(piece)
+        self.bb[piece] |= mask
+        self.occ[color] |= mask
+        self.squares[sq] = piece
+        self.key ^= ZOBRIST[piece][sq]
+        self.counts[piece] += 1
+        self.material[color] += PIECE_VALUES[piece]
+        if piece in ('K', 'k'):
+            self.kings[color] = sq
+            self.attacks_from[sq] = KING_ATTACKS[sq]
+        elif piece in ('P', 'p'):
+            self.attacks_from[sq] = PAWN_ATTACKS[color][sq]
+
+    def _lift(self, sq):
+        piece = self.squares[sq]
+        if piece:
+            mask = ~(1 << sq)
+            color = color_of(piece)
+            self.bb[piece] &= mask
+            self.occ[color] &= mask
+            self.squares[sq] = None
+            self.key ^= ZOBRIST[piece][sq]
+            self.counts[piece] -= 1
+            self.material[color] -= PIECE_VALUES[piece]
+            self.attacks_from[sq] = 0
+            if piece in ('K', 'k'):
+                self.kings[color] = None
+        return piece
+
+    def _update_attacks(self, changed):
+        """Пересчитывает атаки ферзей, чьи лучи задевают измененные клетки, и карты атак сторон"""
+        attacks_from = self.attacks_from
+        occupied = self.occ[WHITE] | self.occ[BLACK]
+        for sq in iter_bits(self.bb['Q'] | self.bb['q']):
+            if attacks_from[sq] & changed or changed >> sq & 1:
+                attacks_from[sq] = queen_attacks(sq, occupied)
+        for color in (WHITE, BLACK):
+            union = 0
+            for sq in iter_bits(self.occ[color]):
+                union |= attacks_from[sq]
+            self.attacks[color] = union
+
+    def put(self, piece, sq):
+        """Ставит фигуру на клетку (клетка должна быть пустой)"""
+        self._place(piece, sq)
+        self._update_attacks(1 << sq)
+
+    def remove(self, sq):
+        """Убирает фигуру с клетки и возвращает её"""
+        piece = self._lift(sq)
+        if piece:
+            self._update_attacks(1 << sq)
+        return piece
+
+    def set_piece(self, sq, piece):
+        """Заменяет содержимое клетки (None — очистить)"""
+        self._lift(sq)
+        if piece:
+            self._place(piece, sq)
+        self._update_attacks(1 << sq)
+
+    def load(self, squares, side=WHITE):
+        """Заменяет всю доску: squares — 64 клетки (фигура или None). Карты атак строятся один раз"""
+        self.clear()
+        for sq, piece in enumerate(squares):
+            if piece:
+                self._place(piece, sq)
+        self._update_attacks(self.occ[WHITE] | self.occ[BLACK])
+        self.set_side(side)
+
+    def set_side(self, color):
+        """Назначает сторону, которая ходит, с обновлением ключа"""
+        if color != self.side:
+            self.side = color
+            self.key ^= ZOBRIST_BLACK
+
+    def make_move(self, move):
+        """Делает ход (from | to << 6) и кладет запись для отката в стек.
+        Пешка на последней горизонтали становится ферзем. Возвращает взятую фигуру"""
+        from_sq = move & 63
+        to_sq = move >> 6 & 63
+        side, key = self.side, self.key
+        saved_attacks = list(self.attacks_from)
+        white_attacks, black_attacks = self.attacks
+        piece = self._lift(from_sq)
+        captured = self._lift(to_sq)
+        promoted = False
+        if piece == 'P' and to_sq < 8:
+            piece, promoted = 'Q', True
+        elif piece == 'p' and to_sq >= 56:
+            piece, promoted = 'q', True
+        self._place(piece, to_sq)
+        self.stack.append((move, side, key, saved_attacks, white_attacks, black_attacks, captured, promoted))
+        self.set_side(color_of(piece) ^ 1)
+        self._update_attacks(1 << from_sq | 1 << to_sq)
+        return captured
+
+    def unmake_move(self):
+        """Откатывает последний ход из стека и возвращает его"""
+        move, side, key, attacks_from, white_attacks, black_attacks, captured, promoted = self.stack.pop()
+        from_sq = move & 63
+        to_sq = move >> 6 & 63
+        piece = self._lift(to_sq)
+        if promoted:
+            piece = 'P' if piece == 'Q' else 'p'
+        self._place(piece, from_sq)
+        if captured:
+            self._place(captured, to_sq)
+        self.attacks_from = attacks_from
+        self.attacks[WHITE] = white_attacks
+        self.attacks[BLACK] = black_attacks
+        self.side = side
+        self.key = key
+        return move
+
+    def is_attacked(self, sq, by_color):
+        """Бьет ли сторона by_color клетку sq"""
+        return bool(self.attacks[by_color] >> sq & 1)
+
+    def pieces(self, color):
+        """Перебирает (клетка, фигура) для фигур данного цвета"""
+        squares = self.squares
+        for sq in iter_bits(self.occ[color]):
+            yield sq, squares[sq]
+
+    def king_square(self, color):
+        """Клетка короля данного цвета или None, если короля нет"""
+        return self.kings[color]
+
+
+class _RowView:
+    """Строка доски поверх Position: board[row][col]"""
+
+    def __init__(self, pos, row):
+        self._pos = pos
+        self._base = row * 8
+
+    def __getitem__(self, col):
+        return self._pos.squares[self._base + col]
+
+    def __setitem__(self, col, piece):
+        self._pos.set_piece(self._base + col, piece)
+
+    def __iter__(self):
+        return iter(self._pos.squares[self._base:self._base + 8])
+
+    def __len__(self):
+        return 8
+
+
+class BoardView:
+    """Совместимый вид 8x8 (список строк) для кода, работающего с board[row][col]"""
+
+    def __init__(self, pos):
+        self._rows = [_RowView(pos, row) for row in range(8)]
+
+    def __getitem__(self, row):
+        return self._rows[row]
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return 8
@@ -0,0 +1,506 @@
+"""Игровой движок без интерфейса: правила, генерация ходов, расстановка и ход ИИ.
+
+Модуль не импортирует tkinter и Crypto, поэтому его можно использовать в процессах-воркерах,
+тестах и замерах без дисплея."""
+
+import queue
+import random
+import threading
+import time
+
+from bitboard import Position, BoardView, WHITE, BLACK, KING_STEPS, square, row_col
+from movegen import generate, piece_targets, targets_into, encode_move, move_from, move_to, move_name
+from search import Searcher, SearchResult, MAX_PLY
+from parallel import ParallelSearcher
+from tt import TranspositionTable
+from tablebase import Tablebase, TABLEBASE_DIR
+from startpos import default_sampler
+from serialize import to_fen, from_fen, pack, unpack
+from movecache import MoveCache
+from gamelog import open_log, SOURCE_SEARCH, SOURCE_PONDER, SOURCE_TABLE, SOURCE_CACHE
+
+AI_TIME_MS = 700  # Сколько миллисекунд ИИ может думать над ходом
+TT_SIZE_MB = 16  # Размер таблицы транспозиций ИИ
+AI_JOBS = 1  # Процессов поиска ИИ: 1 — в своем процессе, None — по числу ядер
+GUESS_DEPTH = 3  # Глубина поиска, которым угадывается ход человека, если поиск ИИ его не подсказал
+
+
+def random_start(rng=random):
+    """Случайная стартовая расстановка: белый король и две пешки против черного короля и пешки.
+    Выбирается равномерно среди всех допустимых расстановок (см. startpos)"""
+    return default_sampler().sample(rng)
+
+
+def best_move(pos, searcher, tablebase=None, time_ms=None, max_depth=MAX_PLY, on_progress=None, stop=None,
+              cache=None):
+    """Ход стороны pos.side: из эндшпильных таблиц, из кэша ходов, а без них — альфа-бета поиском
+    (его результат сохраняется в кэш). on_progress и stop передаются в Searcher.search.
+    Возвращает ход (from | to << 6) или None"""
+    return find_move(pos, searcher, tablebase, time_ms, max_depth, on_progress, stop, cache)[0]
+
+
+def find_move(pos, searcher, tablebase=None, time_ms=None, max_depth=MAX_PLY, on_progress=None, stop=None,
+              cache=None):
+    """То же, что best_move, но возвращает (ход или None, откуда ход — gamelog.SOURCE_TABLE,
+    SOURCE_CACHE или SOURCE_SEARCH, SearchResult поиска или None, если поиска не было)"""
+    if pos.kings[WHITE] is None or pos.kings[BLACK] is None:
+        return None, None, None
+    # Если для текущего материала есть эндшпильная таблица, ход берется из неё
+    if tablebase is not None:
+        known = tablebase.best_move(pos)
+        if known is not None:
+            return known[0], SOURCE_TABLE, None
+    if cache is not None:
+        cached = cache.probe(pos)
+        if cached is not None:
+            return cached[0], SOURCE_CACHE, None
+    result = searcher.search(pos, time_ms, max_depth, on_progress, stop)
+    # В кэш попадает только ход досчитанной итерации: у хода прерванной (по времени или stop)
+    # оценка неточна, а глубина result.depth относится к предыдущей итерации
+    interrupted = result.partial or stop is not None and stop.is_set()
+    if cache is not None and result.move is not None and not interrupted:
+        cache.store(pos, result.move, result.depth, result.score)
+    return result.move, SOURCE_SEARCH, result
+
+
+def search_timing(source, result):
+    """Замеры хода для записи партии (gamelog.GameLog.ai_move): (глубина, мс поиска, откуда,
+    узлы). Если поиск прерван, глубина — прерванная итерация, а узлы — сколько их было до
+    прерывания: поиск с такими max_depth и max_nodes повторяет его ход в ход"""
+    if result is None:
+        return 0, 0.0, source, None
+    if result.interrupted:
+        return result.depth + 1, result.time_ms, source, result.nodes
+    return result.depth, result.time_ms, source, None
+
+
+def timed_best_move(pos, searcher, tablebase=None, time_ms=None, max_depth=MAX_PLY, cache=None):
+    """best_move с замерами для записи партии: (ход или None, мс, глубина, мс поиска, откуда,
+    узлы) — см. search_timing"""
+    started = time.perf_counter()
+    move, source, result = find_move(pos, searcher, tablebase, time_ms, max_depth, cache=cache)
+    return (move, (time.perf_counter() - started) * 1000.0) + search_timing(source, result)
+
+
+class AiTask:
+    """Поиск хода черных в фоновом потоке на снимке позиции.
+
+    Поток не трогает ни исходную позицию, ни интерфейс: итоги итераций складываются в очередь,
+    а готовность проверяется через done(), поэтому окно может опрашивать задачу из своего цикла
+    событий. cancel() прерывает поиск в течение нескольких сотен узлов."""
+
+    side = BLACK  # Чей ход в снимке позиции
+
+    def __init__(self, pos, searcher, tablebase=None, time_ms=None, max_depth=MAX_PLY, cache=None):
+        self.pos = pos.copy()
+        self.pos.set_side(self.side)
+        self.move = None
+        self.error = None
+        self.cancelled = False
+        self.last = None  # Итог последней завершенной итерации (SearchResult)
+        self.source = None  # Откуда ход (см. find_move)
+        self.search = None  # Итог всего поиска (SearchResult) или None, если поиска не было
+        self.finished = None  # Когда поиск закончился (perf_counter)
+        self._stop = threading.Event()
+        self._progress = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, args=(searcher, tablebase, time_ms, max_depth, cache), name="ai-search", daemon=True)
+        self._thread.start()
+
+    def _run(self, searcher, tablebase, time_ms, max_depth, cache):
+        try:
+            self.move, self.source, self.search = find_move(self.pos, searcher, tablebase, time_ms, max_depth,
+                                                            self._on_progress, self._stop, cache)
+        except Exception as e:  # Ошибка передается потоку, который заберет результат
+            self.error = e
+        self.finished = time.perf_counter()
+
+    def _on_progress(self, result):
+        # Поиск меняет объект результата на следующих итерациях, в очередь кладется копия
+        self.last = SearchResult(result.move, result.score, result.depth, result.nodes, result.time_ms, result.pv)
+        self._progress.put(self.last)
+
+    def progress(self):
+        """Итоги итераций (SearchResult), завершившихся с прошлого вызова"""
+        updates = []
+        while True:
+            try:
+                updates.append(self._progress.get_nowait())
+            except queue.Empty:
+                return updates
+
+    def done(self):
+        return not self._thread.is_alive()
+
+    def cancel(self):
+        self.cancelled = True
+        self._stop.set()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def result(self):
+        """Найденный ход (откуда, куда) или None; вызывается после done()"""
+        if self.error is not None:
+            raise self.error
+        if self.move is None:
+            return None
+        return row_col(move_from(self.move)), row_col(move_to(self.move))
+
+
+class PonderTask(AiTask):
+    """Поиск во время хода человека: ответ черных на ход белых, который ИИ считает вероятным.
+
+    guess — предсказанный ход белых (обычно второй ход варианта из прошлого поиска ИИ); если его
+    нет, он выбирается коротким поиском за белых. Поиск идет без ограничения по времени. Если
+    человек сделал предсказанный ход, ponderhit() превращает задачу в обычный ход ИИ: поиск
+    продолжается с набранной глубины, а время, которое он уже шел, засчитывается в время на ход.
+    Иначе задачу отменяют: в таблице транспозиций остается всё, что она успела найти."""
+
+    side = WHITE
+
+    def __init__(self, pos, searcher, guess=None, tablebase=None, max_depth=MAX_PLY, cache=None):
+        self.guess = guess
+        self.target = None  # Двоичная запись позиции после предсказанного хода
+        self.hit = False
+        self.started = None  # Когда начался поиск после предсказанного хода (perf_counter)
+        self._timer = None
+        super().__init__(pos, searcher, tablebase, None, max_depth, cache)
+
+    def _run(self, searcher, tablebase, time_ms, max_depth, cache):
+        moves = []
+        generate(self.pos, WHITE, moves)
+        if self.guess not in moves:
+            self.guess = None
+        if self.guess is None:
+            try:
+                self.guess = searcher.search(self.pos, max_depth=GUESS_DEPTH, stop=self._stop).move
+            except Exception as e:
+                self.error = e
+                return
+        if self.guess is None or self._stop.is_set():
+            return
+        self.pos.make_move(self.guess)
+        if self.pos.kings[WHITE] is None or self.pos.kings[BLACK] is None:
+            return
+        self.started = time.perf_counter()
+        self.target = pack(self.pos)
+        super()._run(searcher, tablebase, time_ms, max_depth, cache)
+
+    def matches(self, pos):
+        """Совпадает ли pos (после хода человека) с позицией, в которой идет поиск"""
+        return self.target is not None and pos.side == BLACK and self.target == pack(pos)
+
+    def ponderhit(self, time_ms):
+        """Человек сделал предсказанный ход: поиск получает time_ms миллисекунд (None — без предела)
+        считая с начала размышлений, так что при долгом ходе человека ход ИИ готов сразу"""
+        self.hit = True
+        if time_ms is None or self.done():
+            return
+        left = time_ms / 1000.0 - (time.perf_counter() - self.started)
+        if left <= 0:
+            self._stop.set()
+            return
+        self._timer = threading.Timer(left, self._stop.set)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        super().cancel()
+
+
+class Engine:
+    """Партия без интерфейса: белые — человек или внешняя политика, черные — ИИ.
+    При ai_jobs больше одного поиск идет в пуле процессов (parallel.ParallelSearcher);
+    пул останавливает close(). ponder=True — после хода ИИ start_ponder() думает за время хода
+    человека, и start_ai() продолжает этот поиск, если человек сходил предсказанным ходом.
+    С log_dir каждая партия пишется в этот каталог (gamelog) вместе с замерами ходов ИИ"""
+
+    def __init__(self, ai_time_ms=AI_TIME_MS, tt_size_mb=TT_SIZE_MB, tablebase_dir=TABLEBASE_DIR,
+                 ai_depth=MAX_PLY, cache_path=None, ai_jobs=AI_JOBS, ponder=False, log_dir=None):
+        self.pos = Position()  # Битборды фигур
+        self.board = BoardView(self.pos)  # Вид 8x8: board[row][col]
+        self.game_over = False
+        self.ai_time_ms = ai_time_ms  # None — без ограничения по времени
+        self.ai_depth = ai_depth
+        self.tt_size_mb = tt_size_mb
+        if ai_jobs == 1:
+            self.searcher = Searcher(TranspositionTable(tt_size_mb))
+        else:
+            self.searcher = ParallelSearcher(ai_jobs, tt_size_mb)
+        self.tablebase = Tablebase(tablebase_dir) if tablebase_dir else None  # None — без таблиц
+        self.cache = MoveCache(cache_path) if cache_path else None  # Постоянный кэш ходов ИИ
+        self._targets = []  # Переиспользуемый буфер для get_all_valid_moves
+        self.ponder = ponder
+        self.ponder_hits = 0
+        self.ponder_misses = 0
+        self._ai_task = None  # Фоновый поиск, который сейчас пользуется searcher
+        self._ponder = None  # Поиск во время хода человека (PonderTask)
+        self._ai_asked = None  # Когда start_ai() запросил ход (perf_counter)
+        self._chosen = None  # (ход, мс, глубина, мс поиска, откуда, узлы) последнего choose_move()
+        self.log_dir = log_dir
+        self.log = None  # Запись текущей партии (gamelog.GameLog)
+
+    # ---------- Партия ----------
+
+    def new_game(self, rng=random):
+        """Очищает доску и расставляет случайную стартовую позицию.
+        Расстановка строится по зерну из rng, и зерно попадает в запись партии. Таблица
+        транспозиций очищается, чтобы ходы ИИ зависели только от этой партии (replay.py)"""
+        self.reset()
+        self.searcher.tt.clear()
+        seed = rng.getrandbits(32)
+        start = random_start(random.Random(seed))
+        for sq, piece in enumerate(start.squares):
+            if piece:
+                self.pos.put(piece, sq)
+        self._start_log(seed)
+        return self.pos
+
+    def reset(self):
+        """Очищает доску (объект позиции сохраняется, ссылки на него остаются действительными).
+        Незавершенный фоновый поиск отменяется, незаконченная партия записывается как брошенная"""
+        self.cancel_ai()
+        self._end_log('abandoned')
+        self.pos.clear()
+        self.game_over = False
+
+    def move_piece(self, from_pos, to_pos):
+        """Делает ход, если он допустим. Возвращает True, если ход сделан"""
+        from_row, from_col = from_pos
+        to_row, to_col = to_pos
+        piece = self.board[from_row][from_col]
+        if not piece or not self.is_valid_move(piece, from_row, from_col, to_row, to_col):
+            return False
+        # Позиция сама превращает пешку в ферзя и обновляет карты атак
+        move = encode_move(square(from_row, from_col), square(to_row, to_col))
+        self.pos.make_move(move)
+        if self.log is not None:
+            self._log_move(move)
+        winner = self.winner()
+        if winner:
+            self.game_over = True
+            self._end_log(winner)
+        return True
+
+    def fen(self):
+        """Текстовая запись позиции"""
+        return to_fen(self.pos)
+
+    def load_fen(self, text):
+        """Ставит позицию по текстовой записи (объект позиции сохраняется)"""
+        self.cancel_ai()
+        from_fen(text, self.pos)
+        self.game_over = self.winner() is not None
+        self._start_log()
+
+    def snapshot(self):
+        """Двоичная запись позиции вместе с признаком окончания партии"""
+        return pack(self.pos, self.game_over)
+
+    def restore(self, data):
+        """Восстанавливает позицию и признак окончания партии из snapshot()"""
+        self.cancel_ai()
+        _, self.game_over = unpack(data, self.pos)
+        self._start_log()
+
+    def winner(self):
+        """'white' или 'black', если король соперника взят, иначе None"""
+        if self.pos.kings[WHITE] is None:
+            return 'black'
+        if self.pos.kings[BLACK] is None:
+            return 'white'
+        return None
+
+    # ---------- Запись партии ----------
+
+    def _start_log(self, seed=None):
+        """Начинает запись партии с текущей позиции (если задан log_dir и партия не окончена)"""
+        self._end_log('abandoned')
+        if self.log_dir and not self.game_over and self.winner() is None:
+            self.log = open_log(self.log_dir, to_fen(self.pos), seed, time_ms=self.ai_time_ms,
+                                depth=self.ai_depth, ponder=self.ponder, tt_mb=self.tt_size_mb,
+                                jobs=getattr(self.searcher, 'jobs', 1))
+
+    def _end_log(self, result):
+        if self.log is not None:
+            self.log.finish(result)
+            self.log = None
+
+    def _log_move(self, move):
+        """Пишет сделанный ход; ход, который только что нашел ИИ, — вместе с его замерами"""
+        timing = self._ai_timing(move)
+        if timing is None:
+            self.log.move(move_name(move))
+        else:
+            self.log.ai_move(move_name(move), *timing)
+
+    def _ai_timing(self, move):
+        """(мс, глубина, мс поиска, откуда, узлы), если move — ход последнего поиска ИИ, иначе None.
+        Замеры отдаются один раз"""
+        chosen, self._chosen = self._chosen, None
+        if chosen is not None and chosen[0] == move:
+            return chosen[1:]
+        task = self._ai_task
+        if task is None or task.move != move or task.finished is None or self._ai_asked is None:
+            return None
+        ms = max(0.0, (task.finished - self._ai_asked) * 1000.0)
+        self._ai_asked = None
+        source = task.source
+        if source == SOURCE_SEARCH and isinstance(task, PonderTask):
+            source = SOURCE_PONDER
+        return (ms,) + search_timing(source, task.search)
+
+    # ---------- Правила ----------
+
+    def is_valid_move(self, piece, from_row, from_col, to_row, to_col):
+        """Проверяет, допустим ли ход"""
+        targets = piece_targets(self.pos, square(from_row, from_col), piece)
+        return bool(targets >> square(to_row, to_col) & 1)
+
+    def get_all_valid_moves(self, piece, row, col):
+        """Возвращает все допустимые ходы для данной фигуры.
+
+        Результат пишется в переиспользуемый буфер: до следующего вызова его нужно прочитать или скопировать.
+        """
+        buf = self._targets
+        targets_into(self.pos, square(row, col), buf, piece)
+        for i, sq in enumerate(buf):
+            buf[i] = row_col(sq)
+        return buf
+
+    def is_king_captured(self, player):
+        """Проверяет, захвачен ли король игрока (1 — белые, 2 — черные)"""
+        return self.pos.kings[WHITE if player == 1 else BLACK] is None
+
+    def find_king(self, color):
+        """Находит позицию короля на поле для данного цвета."""
+        sq = self.pos.king_square(BLACK if color == 'black' else WHITE)
+        if sq is None:
+            return None
+        return row_col(sq)
+
+    def is_check(self, color):
+        """Проверяет, находится ли король на текущем цвете под шахом."""
+        king_sq = self.pos.king_square(BLACK if color == 'black' else WHITE)
+        if king_sq is None:
+            return False
+        return self.pos.is_attacked(king_sq, WHITE if color == 'black' else BLACK)
+
+    def is_king_in_check(self, color):
+        """Проверяет, находится ли король указанного цвета ('w' или 'b') в шахе"""
+        return self.is_check('black' if color == 'b' else 'white')
+
+    def is_safe_move(self, row, col):
+        """Проверяет, безопасен ли ход на данную клетку для черного короля"""
+        if not (0 <= row < 8 and 0 <= col < 8):
+            return False
+        sq = square(row, col)
+        if self.pos.occ[BLACK] >> sq & 1:
+            return False
+        return not self.pos.is_attacked(sq, WHITE)
+
+    def is_under_attack(self, row, col):
+        """Проверяет, атакует ли клетку белая фигура."""
+        return self.pos.is_attacked(square(row, col), WHITE)
+
+    def king_escape(self):
+        """Ход черного короля, который уводит его из-под шаха: (откуда, куда) или None"""
+        king_sq = self.pos.kings[BLACK]
+        if king_sq is None:
+            return None
+        for to_sq in KING_STEPS[king_sq]:
+            if self.is_safe_move(*row_col(to_sq)):
+                self.pos.make_move(encode_move(king_sq, to_sq))
+                escaped = not self.is_check('black')
+                self.pos.unmake_move()
+                if escaped:
+                    return row_col(king_sq), row_col(to_sq)
+        return None
+
+    def simulate_move(self, from_row, from_col, to_row, to_col):
+        """Временный ход для проверки (вызовы можно вкладывать друг в друга)"""
+        self.pos.make_move(encode_move(square(from_row, from_col), square(to_row, to_col)))
+
+    def undo_move(self):
+        """Откат последнего временного хода"""
+        self.pos.unmake_move()
+
+    # ---------- ИИ ----------
+
+    def choose_move(self):
+        """Ход черных: из эндшпильных таблиц, а без них — альфа-бета поиском в пределах
+        ai_time_ms и ai_depth. Возвращает (откуда, куда) или None"""
+        self.pos.set_side(BLACK)
+        self._chosen = timed_best_move(self.pos, self.searcher, self.tablebase, self.ai_time_ms, self.ai_depth,
+                                       self.cache)
+        move = self._chosen[0]
+        if move is None:
+            return None
+        return row_col(move_from(move)), row_col(move_to(move))
+
+    def start_ai(self):
+        """Запускает поиск хода черных в фоновом потоке и возвращает AiTask.
+        Ход не делается: его забирают через result() и передают в move_piece.
+        Если человек сходил так, как предсказал start_ponder(), продолжается уже идущий поиск"""
+        ponder = self._ponder
+        self._ponder = None
+        self._ai_asked = time.perf_counter()
+        if ponder is not None:
+            if ponder.matches(self.pos):
+                self.ponder_hits += 1
+                self.cancel_ai()
+                ponder.ponderhit(self.ai_time_ms)
+                self._ai_task = ponder
+                return ponder
+            self.ponder_misses += 1
+            ponder.cancel()
+            ponder.join()
+        self.cancel_ai()
+        self._ai_task = AiTask(self.pos, self.searcher, self.tablebase, self.ai_time_ms, self.ai_depth,
+                               self.cache)
+        return self._ai_task
+
+    def start_ponder(self):
+        """После хода ИИ начинает думать над ответом на вероятный ход человека.
+        Возвращает PonderTask или None (ponder выключен или партия окончена)"""
+        task = self._ai_task
+        last = task.last if task is not None else None
+        self.cancel_ai()
+        if not self.ponder or self.game_over or self.winner() is not None:
+            return None
+        # Вариант прошлого поиска: сделанный ход ИИ, затем ожидаемый ответ белых
+        guess = None
+        if last is not None and len(last.pv) > 1 and last.pv[0] == task.move:
+            guess = last.pv[1]
+        self._ponder = PonderTask(self.pos, self.searcher, guess, self.tablebase, self.ai_depth, self.cache)
+        return self._ponder
+
+    def cancel_ai(self):
+        """Отменяет фоновый поиск (и поиск во время хода человека) и дожидается их остановки,
+        чтобы searcher снова был свободен"""
+        for task in (self._ai_task, self._ponder):
+            if task is not None:
+                task.cancel()
+                task.join()
+        self._ai_task = None
+        self._ponder = None
+
+    def ai_move(self):
+        """Выбирает и делает ход черных. Возвращает (откуда, куда) или None"""
+        move = self.choose_move()
+        if move is not None:
+            self.move_piece(*move)
+        return move
+
+    def close(self):
+        """Останавливает фоновый поиск, пул процессов поиска, закрывает кэш ходов и запись партии"""
+        self.cancel_ai()
+        self._end_log('abandoned')
+        if isinstance(self.searcher, ParallelSearcher):
+            self.searcher.close()
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
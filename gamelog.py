@@ -0,0 +1,177 @@
+"""Запись партий для воспроизведения: по файлу на партию, строки только дописываются.
+
+Файл пишется по мере игры, строка за строкой, и сбрасывается на диск после каждой, поэтому
+партия сохраняется, даже если окно закрыли или процесс упал посреди неё: оборванная
+последняя строка при чтении отбрасывается.
+
+Формат (текст, одна строка — одно событие):
+    {"v":2,"seed":123,"start":"4k3/8/8/8/8/3p1PP1/8/6K1 w","time_ms":700,"depth":99,...}
+    e2e4                      ход без замеров (человек или внешняя политика)
+    e7e6 412.3 7 388.1 s      ход ИИ: мс до готовности хода, глубина последней итерации
+                              поиска, мс поиска, откуда ход (s — поиск, p — поиск во время
+                              хода человека, t — эндшпильные таблицы, c — кэш ходов; у t и c
+                              глубина 0 и поиска не было)
+    e7e6 702.0 8 699.5 s 40448
+                              то же, но итерация 8 прервана после 40448 узлов: поиск с
+                              max_depth=8 и max_nodes=40448 повторяет её ход в ход
+    = white                   итог: white, black, draw или abandoned (партию бросили)
+
+Первая строка — заголовок JSON: зерно стартовой расстановки (если партия начата по зерну),
+стартовая позиция и настройки ИИ. Воспроизводит записи replay.py.
+"""
+
+import json
+import os
+import time
+
+LOG_VERSION = 2
+LOG_SUFFIX = '.log'
+GAME_LOG_DIR = 'games'
+
+SOURCE_SEARCH = 's'
+SOURCE_PONDER = 'p'
+SOURCE_TABLE = 't'
+SOURCE_CACHE = 'c'
+
+
+class Ply:
+    """Полуход записи; у ходов без замеров ms, depth, search_ms и source — None.
+    nodes — после скольких узлов прервана последняя итерация (None — не прерывалась)"""
+
+    __slots__ = ('move', 'ms', 'depth', 'search_ms', 'source', 'nodes')
+
+    def __init__(self, move, ms=None, depth=None, search_ms=None, source=None, nodes=None):
+        self.move = move
+        self.ms = ms
+        self.depth = depth
+        self.search_ms = search_ms
+        self.source = source
+        self.nodes = nodes
+
+    @property
+    def timed(self):
+        return self.ms is not None
+
+    def __repr__(self):
+        return "Ply(%r, ms=%r, depth=%r, source=%r)" % (self.move, self.ms, self.depth, self.source)
+
+
+class GameRecord:
+    """Прочитанная партия: заголовок, полуходы и итог (None — запись оборвана)"""
+
+    def __init__(self, header, plies, result=None):
+        self.header = header
+        self.plies = plies
+        self.result = result
+
+    @property
+    def seed(self):
+        return self.header.get('seed')
+
+    @property
+    def start(self):
+        return self.header['start']
+
+
+class GameLog:
+    """Запись одной партии в файл path. Файл открывается на дозапись: строки только добавляются.
+    keep_open=False — файл открывается заново на каждую строку: так сервер с тысячами партий
+    не держит по открытому файлу на каждую"""
+
+    def __init__(self, path, start, seed=None, keep_open=True, **settings):
+        self.path = path
+        self.finished = False
+        self._f = open(path, 'a', encoding='utf-8', buffering=1) if keep_open else None  # Построчный сброс
+        header = {'v': LOG_VERSION, 'seed': seed, 'start': start, 'created': round(time.time(), 3)}
+        header.update(settings)
+        self._write(json.dumps(header, ensure_ascii=False, separators=(',', ':')))
+
+    def _write(self, line):
+        if self._f is not None:
+            self._f.write(line + "\n")
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+
+    def move(self, name):
+        """Ход без замеров"""
+        self._write(name)
+
+    def ai_move(self, name, ms, depth, search_ms, source=SOURCE_SEARCH, nodes=None):
+        """Ход ИИ: ms — от запроса хода до готовности, depth — последняя итерация поиска,
+        search_ms — время самого поиска, nodes — узлы, если эта итерация прервана"""
+        line = "%s %.1f %d %.1f %s" % (name, ms, depth, search_ms, source)
+        self._write(line if nodes is None else "%s %d" % (line, nodes))
+
+    def finish(self, result):
+        """Записывает итог и закрывает файл (повторный вызов ничего не делает)"""
+        if self.finished:
+            return
+        self.finished = True
+        self._write("= %s" % result)
+        if self._f is not None:
+            self._f.close()
+
+    def close(self):
+        """Закрывает файл; незаконченная партия записывается как брошенная"""
+        self.finish('abandoned')
+
+
+_counter = 0  # Номер партии процесса в именах файлов
+
+
+def new_log_path(directory, prefix='game'):
+    """Имя нового файла в directory: время, процесс и счетчик, так что процессы не пересекаются"""
+    global _counter
+    _counter += 1
+    name = "%s-%s-%d-%d%s" % (prefix, time.strftime('%Y%m%d-%H%M%S'), os.getpid(), _counter, LOG_SUFFIX)
+    return os.path.join(directory, name)
+
+
+def open_log(directory, start, seed=None, prefix='game', keep_open=True, **settings):
+    """Создает каталог при необходимости и начинает в нем запись новой партии"""
+    os.makedirs(directory, exist_ok=True)
+    return GameLog(new_log_path(directory, prefix), start, seed, keep_open, **settings)
+
+
+def read_log(path):
+    """Читает запись партии. ValueError — файл не является записью партии"""
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    lines = text.split("\n")
+    if not text.endswith("\n"):
+        lines.pop()  # Последняя строка оборвана на записи
+    if not lines or not lines[0]:
+        raise ValueError("%s: пустая запись" % path)
+    try:
+        header = json.loads(lines[0])
+    except ValueError:
+        raise ValueError("%s: нет заголовка" % path) from None
+    if not isinstance(header, dict) or header.get('v') != LOG_VERSION or 'start' not in header:
+        raise ValueError("%s: неизвестный формат записи" % path)
+    plies = []
+    result = None
+    for line in lines[1:]:
+        if not line:
+            continue
+        if line.startswith('= '):
+            result = line[2:]
+            break
+        fields = line.split()
+        if len(fields) == 1:
+            plies.append(Ply(fields[0]))
+        elif len(fields) in (5, 6):
+            nodes = int(fields[5]) if len(fields) == 6 else None
+            plies.append(Ply(fields[0], float(fields[1]), int(fields[2]), float(fields[3]), fields[4], nodes))
+        else:
+            raise ValueError("%s: неверная строка %r" % (path, line))
+    return GameRecord(header, plies, result)
+
+
+def list_logs(directory):
+    """Пути записей в каталоге (вместе с подкаталогами) в порядке имен"""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.endswith(LOG_SUFFIX))
+    return paths
@@ -0,0 +1,292 @@
+"""Замеры внутри хода ИИ: счетчики, таймеры по фазам, память и трассировка для chrome://tracing.
+
+Выключенные замеры ничего не стоят: enable() подменяет функции и методы движка обертками,
+которые считают вызовы и время, а disable() возвращает исходные. Включать и выключать можно
+в любой момент, в том числе между ходами работающей партии.
+
+Мелкие фазы (генерация ходов, сортировка, оценка, карты атак, таблица транспозиций)
+копятся только в счетчиках и таймерах: событие на каждый вызов сделало бы трассировку
+огромной. Крупные (ход ИИ, поиск, каждая итерация углубления, эндшпильные таблицы, кэш
+ходов, правила окна вроде is_check и king_escape) попадают в трассировку отдельными
+событиями. С memory=True включается tracemalloc, и после каждого крупного события
+записывается занятая память.
+
+Воркеры параллельного поиска (parallel.py) — отдельные процессы, их работа видна только как
+время поиска главного процесса.
+
+Запуск: python instrument.py [--seed N | --fen TEXT] [--time-ms 700] [--depth N] [--memory]
+                            [-o trace.json] [--summary summary.json]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+import bitboard
+import engine
+import search
+import tablebase
+from movecache import MoveCache
+from parallel import ParallelSearcher
+from search import MAX_PLY
+from serialize import from_fen
+from tt import TranspositionTable
+
+MAX_EVENTS = 200000  # Предел событий трассировки, дальше события отбрасываются
+
+
+class Recorder:
+    """Накопленные замеры: счетчики, таймеры {фаза: [вызовы, секунды]} и события трассировки"""
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.counters = {}
+        self.timers = {}
+        self.events = []
+        self.dropped = 0
+        self.peak_memory = 0
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_time(self, name, seconds):
+        timer = self.timers.get(name)
+        if timer is None:
+            self.timers[name] = [1, seconds]
+        else:
+            timer[0] += 1
+            timer[1] += seconds
+
+    def span(self, name, started, finished, args=None):
+        """Событие трассировки от started до finished (моменты perf_counter)"""
+        if len(self.events) >= MAX_EVENTS:
+            self.dropped += 1
+            return
+        event = {
+            'name': name, 'ph': 'X', 'pid': self.pid, 'tid': threading.get_ident(),
+            'ts': (started - self.origin) * 1e6, 'dur': (finished - started) * 1e6,
+        }
+        if args:
+            event['args'] = args
+        self.events.append(event)
+        if self.memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            self.peak_memory = max(self.peak_memory, peak)
+            self.events.append({'name': 'memory', 'ph': 'C', 'pid': self.pid, 'ts': event['ts'] + event['dur'],
+                                'args': {'current': current, 'peak': peak}})
+
+    def summary(self):
+        """Словарь для JSON: счетчики и таймеры (вызовы, всего мс, мкс на вызов)"""
+        return {
+            'counters': dict(sorted(self.counters.items())),
+            'timers': {
+                name: {'calls': calls, 'total_ms': seconds * 1000.0, 'per_call_us': seconds * 1e6 / calls}
+                for name, (calls, seconds) in sorted(self.timers.items(), key=lambda item: -item[1][1])
+            },
+            'events': len(self.events),
+            'dropped_events': self.dropped,
+            'peak_memory': self.peak_memory if self.memory else None,
+        }
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2, ensure_ascii=False)
+
+    def write_trace(self, path):
+        """Файл формата Trace Event: открывается в chrome://tracing или ui.perfetto.dev"""
+        names = [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}}
+                 for tid, name in _thread_names(self.events)]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': names + self.events, 'displayTimeUnit': 'ms',
+                       'otherData': self.summary()}, f, ensure_ascii=False)
+
+
+def _thread_names(events):
+    known = {thread.ident: thread.name for thread in threading.enumerate()}
+    for tid in sorted({event['tid'] for event in events if 'tid' in event}):
+        yield tid, known.get(tid, 'thread-%d' % tid)
+
+
+# ---------- Обертки ----------
+
+_recorder = None
+_originals = []  # (объект, имя, исходное значение) для disable()
+
+
+def _timed(name, func, on_result=None):
+    """Обертка мелкой фазы: время и число вызовов; on_result(recorder, результат) — счетчики"""
+    perf_counter = time.perf_counter
+
+    def wrapper(*args, **kwargs):
+        recorder = _recorder
+        started = perf_counter()
+        result = func(*args, **kwargs)
+        recorder.add_time(name, perf_counter() - started)
+        if on_result is not None:
+            on_result(recorder, result)
+        return result
+    return wrapper
+
+
+def _spanned(name, func, describe=None, on_result=None):
+    """Обертка крупной фазы: таймер и событие трассировки; describe(результат) — его аргументы"""
+    def wrapper(*args, **kwargs):
+        recorder = _recorder
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        finished = time.perf_counter()
+        recorder.add_time(name, finished - started)
+        recorder.span(name, started, finished, describe(result) if describe is not None else None)
+        if on_result is not None:
+            on_result(recorder, result)
+        return result
+    return wrapper
+
+
+def _searched(func):
+    """Searcher.search: событие на весь поиск и на каждую итерацию углубления"""
+    def search_wrapper(searcher, pos, time_ms=None, max_depth=MAX_PLY, on_progress=None, stop=None,
+                       max_nodes=None):
+        if isinstance(searcher, ParallelSearcher) and searcher.jobs <= 1:
+            # Один процесс: поиск делает обычный Searcher, его обертка всё и запишет
+            return func(searcher, pos, time_ms, max_depth, on_progress, stop, max_nodes)
+        recorder = _recorder
+        started = last = time.perf_counter()
+
+        def progress(result):
+            nonlocal last
+            now = time.perf_counter()
+            recorder.span('iteration', last, now, {'depth': result.depth, 'nodes': result.nodes,
+                                                  'score': result.score})
+            last = now
+            if on_progress is not None:
+                on_progress(result)
+
+        result = func(searcher, pos, time_ms, max_depth, progress, stop, max_nodes)
+        finished = time.perf_counter()
+        recorder.add_time('search', finished - started)
+        recorder.count('searches')
+        recorder.count('nodes', result.nodes)
+        recorder.span('search', started, finished, {'depth': result.depth, 'nodes': result.nodes,
+                                                    'move': result.move, 'score': result.score})
+        return result
+    return search_wrapper
+
+
+def _generated(recorder, count):
+    recorder.count('moves.generated', count)
+
+
+def _probed(prefix):
+    def on_result(recorder, found):
+        recorder.count(prefix + ('.misses' if found is None else '.hits'))
+    return on_result
+
+
+def _targets():
+    """(объект, имя, обертка) всего, что подменяется при enable()"""
+    return [
+        (search, 'generate', lambda f: _timed('movegen', f, _generated)),
+        (search, 'evaluate', lambda f: _timed('evaluate', f)),
+        (search.Searcher, '_order', lambda f: _timed('order', f)),
+        (search.Searcher, 'search', _searched),
+        (ParallelSearcher, 'search', _searched),
+        (TranspositionTable, 'probe', lambda f: _timed('tt.probe', f, _probed('tt'))),
+        (bitboard.Position, 'make_move', lambda f: _timed('make_move', f)),
+        (bitboard.Position, '_update_attacks', lambda f: _timed('attack.update', f)),
+        (bitboard.Position, 'is_attacked', lambda f: _timed('attack.query', f)),
+        (tablebase.Tablebase, 'best_move', lambda f: _spanned('tablebase', f, _hit_args, _probed('tablebase'))),
+        (MoveCache, 'probe', lambda f: _spanned('movecache', f, _hit_args, _probed('movecache'))),
+        (engine, 'find_move', lambda f: _spanned('best_move', f, _found_args)),
+        (engine.Engine, 'is_check', lambda f: _spanned('is_check', f)),
+        (engine.Engine, 'king_escape', lambda f: _spanned('king_escape', f)),
+    ]
+
+
+def _hit_args(found):
+    return {'hit': found is not None}
+
+
+def _found_args(found):
+    move, source, _ = found
+    return {'move': move, 'source': source}
+
+
+def enable(memory=False):
+    """Включает замеры и возвращает новый Recorder (повторный вызов начинает замеры заново)"""
+    global _recorder
+    disable()
+    _recorder = Recorder(memory)
+    for owner, name, wrap in _targets():
+        original = owner.__dict__[name] if isinstance(owner, type) else getattr(owner, name)
+        _originals.append((owner, name, original))
+        setattr(owner, name, wrap(original))
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return _recorder
+
+
+def disable():
+    """Возвращает исходные функции. Возвращает последний Recorder (или None)"""
+    while _originals:
+        owner, name, original = _originals.pop()
+        setattr(owner, name, original)
+    recorder = _recorder
+    if recorder is not None and recorder.memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return recorder
+
+
+def enabled():
+    return bool(_originals)
+
+
+class recording:
+    """with recording(memory=False) as recorder: ... — замеры только внутри блока"""
+
+    def __init__(self, memory=False):
+        self.memory = memory
+
+    def __enter__(self):
+        return enable(self.memory)
+
+    def __exit__(self, *exc):
+        disable()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры одного хода ИИ с трассировкой")
+    parser.add_argument('--seed', type=int, default=0, help="стартовая расстановка по зерну")
+    parser.add_argument('--fen', default=None, help="позиция текстом (вместо --seed)")
+    parser.add_argument('--time-ms', type=int, default=engine.AI_TIME_MS, help="время на ход ИИ")
+    parser.add_argument('--depth', type=int, default=MAX_PLY, help="предельная глубина")
+    parser.add_argument('--tablebases', default=None, help="каталог эндшпильных таблиц")
+    parser.add_argument('--memory', action='store_true', help="записывать память через tracemalloc")
+    parser.add_argument('-o', '--output', default='trace.json', help="файл трассировки")
+    parser.add_argument('--summary', default=None, help="файл JSON со счетчиками и таймерами")
+    args = parser.parse_args(argv)
+
+    game = engine.Engine(ai_time_ms=args.time_ms, ai_depth=args.depth, tablebase_dir=args.tablebases)
+    if args.fen:
+        from_fen(args.fen, game.pos)
+    else:
+        game.pos.load(engine.random_start(random.Random(args.seed)).squares)
+    with recording(args.memory) as recorder:
+        game.is_check('black')
+        game.choose_move()
+    recorder.write_trace(args.output)
+    if args.summary:
+        recorder.write_json(args.summary)
+    print(json.dumps(recorder.summary(), indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
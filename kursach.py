@@ -1,65 +1,25 @@
 import tkinter as tk
 from tkinter import messagebox
-import json
 import os
-import random
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import pad, unpad
-from Crypto.Random import get_random_bytes
-import base64
+from bitboard import BLACK, square, row_col
+from engine import Engine
+from gamelog import GAME_LOG_DIR
+from userstore import open_user_store, DB_FILE
+from accounts import register_user, check_login
 
 
 
 # ===================== Функции работы с пользователями =====================
-KEY_FILE = "encryption_key.key"  # Файл для хранения ключа шифрования
-DB_FILE = 'users.json'  # Файл для хранения данных пользователей
-incorrect = ('!@#$%^&*+_-=|/?><~`[]±§')
-# Проверяем, существует ли ключ и загружаем его, если нет — создаём новый
-def load_or_create_key():
-    if os.path.exists(KEY_FILE):
-        with open(KEY_FILE, "rb") as f:
-            return f.read()  
-    else:
-        key = get_random_bytes(16)  # 16 байт для AES-128
-        with open(KEY_FILE, "wb") as f:
-            f.write(key)
-        return key
-
-KEY = load_or_create_key()  
-
-# Шифруем пароль с помощью AES
-def encrypt_password(password):
-    cipher = AES.new(KEY, AES.MODE_CBC)
-    ct_bytes = cipher.encrypt(pad(password.encode(), AES.block_size))  # шифруем пароль
-    iv = base64.b64encode(cipher.iv).decode('utf-8')  
-    ct = base64.b64encode(ct_bytes).decode('utf-8')  
-    return iv + ":" + ct  
-
-# Расшифровываем пароль с помощью AES
-def decrypt_password(encrypted_password):
-    try:
-        iv, ct = encrypted_password.split(":")  
-    except ValueError:
-        raise ValueError("Неверный формат зашифрованного пароля.")
-    
-    iv = base64.b64decode(iv)
-    ct = base64.b64decode(ct)
-    cipher = AES.new(KEY, AES.MODE_CBC, iv)  
-    pt = unpad(cipher.decrypt(ct), AES.block_size)  
-    return pt.decode('utf-8')
-
-# Загружаем пользователей из файла
-def load_users():
-    """Загружаем пользователей как список словарей"""
-    if os.path.exists(DB_FILE):
-        with open(DB_FILE, "r") as f:
-            return json.load(f)
-    return [] 
-
-# Сохраняем пользователей в файл
-def save_users(users):
-    with open(DB_FILE, "w") as f:
-        json.dump(users, f)
+USER_BACKEND = 'sqlite'  # Хранилище пользователей: 'sqlite', 'journal' или прежний 'json'
+_store = None
+
+def get_user_store():
+    """Хранилище пользователей открывается при первом обращении и остается открытым.
+    При первом запуске в него переносятся пользователи из прежнего users.json"""
+    global _store
+    if _store is None:
+        _store = open_user_store(USER_BACKEND, migrate_from=DB_FILE)
+    return _store
 
 # ===================== Функции регистрации и авторизации =====================
 
@@ -67,41 +27,11 @@ def register():
     """Регистрация пользователя с проверками"""
     username = entry_username.get()
     password = entry_password.get()
-    
-    if len(username) < 5:
-        messagebox.showerror("Ошибка", "Логин должен быть не менее 5 символов!")
-        return
-    
-    if '@' not in username:
-        messagebox.showerror("Ошибка", "Логин должен содержать символ '@'!")
-        return
-    
-    if len(password) < 5:
-        messagebox.showerror("Ошибка", "Пароль должен быть не менее 5 символов!")
-        return
-    
-    for char in username:
-        if char in incorrect and char != '@':  
-            messagebox.showerror("Ошибка", f"Недопустимый символ в логине: {char}")
-            return
-    
-    for char in password:
-        if char in incorrect:
-            messagebox.showerror("Ошибка", f"Недопустимый символ в пароле: {char}")
-            return
-    
-    if '@' in password:
-        messagebox.showerror("Ошибка", "Пароль не должен содержать символ '@'!")
-        return
-    
-    users = load_users()
-    if any(user['login'] == username for user in users):
-        messagebox.showerror("Ошибка", "Пользователь с таким логином уже существует!")
+
+    error = register_user(get_user_store(), username, password)
+    if error is not None:
+        messagebox.showerror("Ошибка", error)
         return
-    
-    encrypted_password = encrypt_password(password)
-    users.append({'login': username, 'password': encrypted_password})
-    save_users(users)
     messagebox.showinfo("Успех", "Регистрация успешна! Теперь войдите.")
 
 def login():
@@ -113,27 +43,56 @@ def login():
         messagebox.showerror("Ошибка", "Все поля должны быть заполнены!")
         return
     
-    users = load_users()
-
-    for user in users:
-        if user['login'] == username:  
-            try:
-                if decrypt_password(user['password']) == password:
-                    messagebox.showinfo("Успех", "Вход выполнен!")
-                    root.destroy()  
-                    start_game()  
-                    break
-            except ValueError:
-                messagebox.showinfo("Ошибка", "Неверный формат зашифрованного пароля.")
-                break
-    else:
-        messagebox.showinfo("Ошибка", "Неверный логин или пароль!")
+    try:
+        if check_login(get_user_store(), username, password):
+            messagebox.showinfo("Успех", "Вход выполнен!")
+            root.destroy()  
+            start_game()  
+            return
+    except ValueError:
+        messagebox.showinfo("Ошибка", "Неверный формат зашифрованного пароля.")
+        return
+    messagebox.showinfo("Ошибка", "Неверный логин или пароль!")
+
+# ===================== Изображения фигур =====================
+SPRITE_FILES = {
+    'K': "w_king.png", 'k': "b_king.png",
+    'Q': "w_queen.png", 'q': "b_queen.png",
+    'P': "w_pawn.png", 'p': "b_pawn.png",
+}
+
+_sprites = {}  # Интерпретатор Tk -> {фигура: PhotoImage}
+
+def get_sprites(master):
+    """Изображения фигур: каждый PNG читается и декодируется один раз на процесс
+    (на интерпретатор Tk, которому принадлежит окно) и общий для всех окон партии"""
+    interp = master.tk
+    sprites = _sprites.get(interp)
+    if sprites is None:
+        sprites = {piece: tk.PhotoImage(master=master, file=name) for piece, name in SPRITE_FILES.items()}
+        _sprites[interp] = sprites
+    return sprites
 
 # ===================== Игровая логика =====================
 
+MOVE_CACHE_FILE = "movecache.bin"  # Кэш ходов ИИ между запусками
+SAVE_FILE = "savegame.bin"  # Сохраненная партия (двоичная запись позиции)
+AI_POLL_MS = 30  # Как часто окно проверяет, готов ли ход ИИ
+AI_JOBS = None  # Процессов поиска ИИ: None — по числу ядер, на одном ядре поиск в этом процессе
+
+
 class ChessGame:
-    def __init__(self, master):
-        self.game_over = False
+    """Окно партии: отрисовка и клики поверх движка engine.Engine.
+
+    Ход ИИ считается в фоновом потоке, окно забирает его через after(). on_ai_progress(result),
+    если задан, вызывается в потоке интерфейса с итогом каждой итерации поиска (SearchResult:
+    глубина, узлы, лучший ход на данный момент). Пока человек выбирает ход, движок думает над
+    ответом на самый вероятный из них (Engine.start_ponder)."""
+
+    def __init__(self, master, on_ai_progress=None):
+        self.engine = Engine(cache_path=MOVE_CACHE_FILE, ai_jobs=AI_JOBS, ponder=True, log_dir=GAME_LOG_DIR)
+        self.pos = self.engine.pos  # Битборды фигур (объект не меняется при сбросе)
+        self.board = self.engine.board  # Вид 8x8 для отрисовки и кликов
         self.master = master
         self.master.title("Эндшпиль: Король и пешки")
         self.master.geometry("500x550")  
@@ -143,17 +102,35 @@ class ChessGame:
         self.canvas = tk.Canvas(master, width=400, height=500, bg='#006363')  
         self.canvas.pack(side=tk.TOP, padx=20, pady=20)  
 
-        self.reset_button = tk.Button(master, text="Сбросить игру", command=self.reset_game, 
+        buttons = tk.Frame(master, bg='#009999')
+        buttons.pack(side=tk.BOTTOM, padx=20, pady=20)
+        self.reset_button = tk.Button(buttons, text="Сбросить игру", command=self.reset_game, 
                                     bg='#006363', fg='white', font=("Arial", 12, "bold"))
-        self.reset_button.pack(side=tk.BOTTOM, padx=20, pady=20)  
+        self.reset_button.pack(side=tk.LEFT, padx=5)  
+        self.save_button = tk.Button(buttons, text="Сохранить", command=self.save_game,
+                                     bg='#006363', fg='white', font=("Arial", 12, "bold"))
+        self.save_button.pack(side=tk.LEFT, padx=5)
+        self.load_button = tk.Button(buttons, text="Продолжить", command=self.load_game,
+                                     bg='#006363', fg='white', font=("Arial", 12, "bold"))
+        self.load_button.pack(side=tk.LEFT, padx=5)
 
-        self.board = [[None for _ in range(8)] for _ in range(8)]
         self.selected_piece = None  
+        self.on_ai_progress = on_ai_progress
+        self.ai_task = None  # Незавершенный поиск хода ИИ
+        self._ai_poll = None  # id отложенного вызова _poll_ai
+        self.piece_items = {}  # Клетка -> (фигура, id изображения на холсте)
         self.init_board()
 
         self.canvas.bind("<Button-1>", self.on_click)
+        self.master.protocol("WM_DELETE_WINDOW", self.close)
 
+    @property
+    def game_over(self):
+        return self.engine.game_over
 
+    @game_over.setter
+    def game_over(self, value):
+        self.engine.game_over = value
 
     def init_board(self):
         """Создаем шахматную доску и добавляем координаты"""
@@ -163,6 +140,18 @@ class ChessGame:
 
         self.canvas.config(width=board_size + offset, height=board_size + offset)
 
+        # Клетки и подписи рисуются один раз; при сбросе меняются только фигуры
+        if not self.canvas.find_withtag("grid"):
+            self.draw_grid(cell_size, board_size, offset)
+
+        self.engine.new_game()
+        self.draw_pieces()
+
+
+
+
+    def draw_grid(self, cell_size, board_size, offset):
+        """Клетки доски и координаты"""
         colors = ["white", "gray"]
         for row in range(8):
             for col in range(8):
@@ -170,7 +159,7 @@ class ChessGame:
                 self.canvas.create_rectangle(
                     col * cell_size, row * cell_size,
                     (col + 1) * cell_size, (row + 1) * cell_size,
-                    fill=color
+                    fill=color, tags="grid"
                 )
 
         #координаты (цифры 1-8)
@@ -178,7 +167,7 @@ class ChessGame:
             self.canvas.create_text(
                 offset // 2, row * cell_size + cell_size // 2,
                 text=str(8 - row), font=("Arial", 14, "bold"),
-                anchor="center"
+                anchor="center", tags="grid"
             )
 
         #координаты (буквы A-H)
@@ -186,138 +175,71 @@ class ChessGame:
             self.canvas.create_text(
                 col * cell_size + cell_size // 2, board_size + offset // 2,
                 text=chr(65 + col), font=("Arial", 14, "bold"),
-                anchor="center"
+                anchor="center", tags="grid"
             )
 
-        positions = set()
-
-        def get_random_empty_position(for_pawn=False, is_white=False, is_king=False):
-            """Выбирает случайную пустую клетку на доске"""
-            while True:
-                row = random.randint(0, 7)
-                col = random.randint(0, 7)
-
-                if for_pawn:
-                    if row == 0 or row == 7 or row == 1 or row == 6:  
-                        continue
-
-                if is_king:
-                    if is_white:
-                        if row < 4:  
-                            continue
-                    else:
-                        if row > 3:  
-                            continue
-
-                if (row, col) not in positions:
-                    positions.add((row, col))
-                    return row, col
-
-        self.wk_pos = get_random_empty_position(is_king=True, is_white=True)  # Белый король
-
-        self.bk_pos = get_random_empty_position(is_king=True, is_white=False)  # Черный король
-
-        king_row, king_col = self.bk_pos
-        attack_positions = [
-            (king_row - 1, king_col - 1), (king_row - 1, king_col), (king_row - 1, king_col + 1),  
-            (king_row, king_col - 1),                    (king_row, king_col + 1),  
-            (king_row + 1, king_col - 1), (king_row + 1, king_col), (king_row + 1, king_col + 1)   
-        ]
-
-        attack_positions = [
-            (r, c) for r, c in attack_positions if 0 <= r < 8 and 0 <= c < 8
-        ]
-
-        self.wp1_pos = get_random_empty_position(for_pawn=True, is_white=True)
-        while self.wp1_pos in attack_positions:
-            self.wp1_pos = get_random_empty_position(for_pawn=True, is_white=True)
-
-        self.wp2_pos = get_random_empty_position(for_pawn=True, is_white=True)
-        while self.wp2_pos in attack_positions:
-            self.wp2_pos = get_random_empty_position(for_pawn=True, is_white=True)
-
-        self.wk_pos = get_random_empty_position(is_king=True, is_white=True)
-        while self.wk_pos in attack_positions:
-            self.wk_pos = get_random_empty_position(is_king=True, is_white=True)
-
-        self.bp_pos = get_random_empty_position(for_pawn=True, is_white=False)  
-
-        self.board[self.wk_pos[0]][self.wk_pos[1]] = "K"
-        self.board[self.wp1_pos[0]][self.wp1_pos[1]] = "P"
-        self.board[self.wp2_pos[0]][self.wp2_pos[1]] = "P"
-        self.board[self.bk_pos[0]][self.bk_pos[1]] = "k"
-        self.board[self.bp_pos[0]][self.bp_pos[1]] = "p"
-
-        self.draw_pieces()
-
-
-
-
     def draw_pieces(self):
-        """Рисуем фигуры на доске с использованием изображений"""
-        self.canvas.delete("piece")  
-
-        self.images = {
-            "wK": tk.PhotoImage(file="w_king.png"),
-            "bK": tk.PhotoImage(file="b_king.png"),
-            "wQ": tk.PhotoImage(file="w_queen.png"),
-            "bQ": tk.PhotoImage(file="b_queen.png"),
-            "wP": tk.PhotoImage(file="w_pawn.png"),
-            "bP": tk.PhotoImage(file="b_pawn.png")
-        }
-
+        """Приводит изображения фигур на холсте к текущей позиции.
+        Элементы холста переиспользуются: меняются только клетки, содержимое которых изменилось"""
+        sprites = get_sprites(self.master)
+        items = self.piece_items
         cell_size = 50
 
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
+        for sq, piece in enumerate(self.pos.squares):
+            drawn = items.get(sq)
+            if drawn is not None and drawn[0] == piece:
+                continue
+            if drawn is not None:
                 if piece:
-                    img = None
-                    if piece == "K":  
-                        img = self.images["wK"]
-                    elif piece == "k":  
-                        img = self.images["bK"]
-                    elif piece == "Q":  
-                        img = self.images["wQ"]
-                    elif piece == "q":  
-                        img = self.images["bQ"]
-                    elif piece == "P":  
-                        img = self.images["wP"]
-                    elif piece == "p":  
-                        img = self.images["bP"]
-
-                    if img:
-                        x = col * cell_size + cell_size // 2
-                        y = row * cell_size + cell_size // 2
-                        self.canvas.create_image(x, y, image=img, tags="piece")
-
-
-
+                    self.canvas.itemconfigure(drawn[1], image=sprites[piece])
+                    items[sq] = (piece, drawn[1])
+                else:
+                    self.canvas.delete(drawn[1])
+                    del items[sq]
+            elif piece:
+                row, col = row_col(sq)
+                x = col * cell_size + cell_size // 2
+                y = row * cell_size + cell_size // 2
+                items[sq] = (piece, self.canvas.create_image(x, y, image=sprites[piece], tags="piece"))
+
+    def redraw_move(self, from_pos, to_pos):
+        """Переносит изображение сходившей фигуры: взятая фигура удаляется, при превращении меняется картинка"""
+        items = self.piece_items
+        from_sq = square(*from_pos)
+        to_sq = square(*to_pos)
+        moved = items.pop(from_sq, None)
+        if moved is None:
+            self.draw_pieces()
+            return
+        captured = items.pop(to_sq, None)
+        if captured is not None:
+            self.canvas.delete(captured[1])
+        cell_size = 50
+        to_row, to_col = to_pos
+        piece = self.board[to_row][to_col]
+        item = moved[1]
+        self.canvas.coords(item, to_col * cell_size + cell_size // 2, to_row * cell_size + cell_size // 2)
+        if piece != moved[0]:
+            self.canvas.itemconfigure(item, image=get_sprites(self.master)[piece])
+        items[to_sq] = (piece, item)
 
     def is_king_captured(self, player):
         """Проверяет, захвачен ли король указанного игрока"""
-        if player == 1:  
-            for row in range(8):
-                for col in range(8):
-                    if self.board[row][col] == 'K':  
-                        return False  
-        elif player == 2:  
-            for row in range(8):
-                for col in range(8):
-                    if self.board[row][col] == 'k':  
-                        print("Король белых на доске")  
-                        return False  
+        if not self.engine.is_king_captured(player):
+            return False
         print("Король захвачен!")  
         return True  
 
 
     def on_click(self, event):
         """Обрабатываем клик по доске"""
-        if self.game_over:
+        if self.game_over or self.ai_task is not None:
             return  
 
         col = event.x // 50
         row = event.y // 50
+        if not (0 <= row < 8 and 0 <= col < 8):
+            return
         clicked_piece = self.board[row][col]
 
         if self.selected_piece:
@@ -331,15 +253,8 @@ class ChessGame:
                 self.selected_piece = None
                 return
 
-            self.move_piece(self.selected_piece, (row, col))
             self.selected_piece = None
-
-            # Проверяем, не потерял ли игрок своего короля
-            if self.is_king_captured(1):  
-                self.game_over = True
-                self.winner_label.config(text="Черные победили!")  
-                self.restart_button.pack()
-                self.resize_and_center(640, 690)
+            if self.move_piece((from_row, from_col), (row, col)):
                 return
 
             self.ai_move()
@@ -352,92 +267,53 @@ class ChessGame:
 
     
     def move_piece(self, from_pos, to_pos):
-        """Перемещает фигуру и сразу проверяет победу"""
-        from_row, from_col = from_pos
-        to_row, to_col = to_pos
-        piece = self.board[from_row][from_col]
-
-        if self.is_valid_move(piece, from_row, from_col, to_row, to_col):
-            self.board[to_row][to_col] = piece
-            self.board[from_row][from_col] = None
-            if piece == "P" and to_row == 0:
-                self.board[to_row][to_col] = "Q"  
-            elif piece == "p" and to_row == 7:
-                self.board[to_row][to_col] = "q"  
-            self.draw_pieces()
-
-            if self.check_victory():
-                return
-
-
-
+        """Перемещает фигуру и сразу проверяет победу. Возвращает True, если партия закончилась"""
+        if self.engine.move_piece(from_pos, to_pos):
+            self.redraw_move(from_pos, to_pos)
+            return self.check_victory()
+        return False
 
 
     def is_valid_move(self, piece, from_row, from_col, to_row, to_col):
         """Проверяет, допустим ли ход"""
-        target_piece = self.board[to_row][to_col]
-
-        # Нельзя ходить на свою фигуру
-        if target_piece and (piece.isupper() == target_piece.isupper()):
-            return False  
-
-        # Король – ходит на 1 клетку во всех направлениях
-        if piece in ("K", "k"):
-            return abs(from_row - to_row) <= 1 and abs(from_col - to_col) <= 1
-
-        # Белая пешка – ходит вперед, бьет по диагонали
-        if piece == "P":
-            if from_col == to_col and from_row - to_row == 1 and target_piece is None:
-                return True  
-
-            if abs(from_col - to_col) == 1 and from_row - to_row == 1 and target_piece and target_piece.islower():
-                return True  
-
-        # Черная пешка
-        if piece == "p":
-            if from_col == to_col and to_row - from_row == 1 and target_piece is None:
-                return True  
-
-            if abs(from_col - to_col) == 1 and to_row - from_row == 1 and target_piece and target_piece.isupper():
-                return True  
-
-
-
-        # Ферзь – ходит как король, но по вертикали, горизонтали и диагоналям на любое количество клеток
-        if piece in ("Q", "q"):
-            if from_row == to_row:  
-                for col in range(min(from_col, to_col) + 1, max(from_col, to_col)):
-                    if self.board[from_row][col] is not None:
-                        return False  
-                return True
-            elif from_col == to_col:  
-                for row in range(min(from_row, to_row) + 1, max(from_row, to_row)):
-                    if self.board[row][from_col] is not None:
-                        return False  
-                return True
-            elif abs(from_row - to_row) == abs(from_col - to_col):
-                row_step = 1 if to_row > from_row else -1
-                col_step = 1 if to_col > from_col else -1
-                row, col = from_row + row_step, from_col + col_step
-                while row != to_row and col != to_col:
-                    if self.board[row][col] is not None:
-                        return False  
-                    row += row_step
-                    col += col_step
-                return True
-
-        return False
-
+        return self.engine.is_valid_move(piece, from_row, from_col, to_row, to_col)
 
 
     
     def reset_game(self):
         """Сбрасывает игру, создавая новую доску"""
-        self.board = [[None for _ in range(8)] for _ in range(8)]  
+        self.cancel_ai()
+        self.engine.reset()  
         self.selected_piece = None
-        self.game_over = False  
         self.init_board()
 
+    def save_game(self):
+        """Сохраняет позицию в SAVE_FILE (пока ИИ думает, сохранять нечего — ход не завершен)"""
+        if self.ai_task is not None:
+            return
+        with open(SAVE_FILE, "wb") as f:
+            f.write(self.engine.snapshot())
+        messagebox.showinfo("Сохранение", "Партия сохранена.")
+
+    def load_game(self):
+        """Продолжает партию из SAVE_FILE"""
+        if not os.path.exists(SAVE_FILE):
+            messagebox.showerror("Ошибка", "Сохраненной партии нет!")
+            return
+        with open(SAVE_FILE, "rb") as f:
+            data = f.read()
+        self.cancel_ai()
+        self.selected_piece = None
+        try:
+            self.engine.restore(data)
+        except ValueError:
+            messagebox.showerror("Ошибка", "Файл сохранения поврежден.")
+            self.engine.new_game()
+        self.draw_pieces()
+        # Партия сохранена после хода белых — ход за ИИ
+        if not self.game_over and self.pos.side == BLACK:
+            self.ai_move()
+
     def show_victory_message(self, message):
         """Показывает всплывающее окно с сообщением о победе и перезапускает игру"""
         self.game_over = True 
@@ -446,22 +322,14 @@ class ChessGame:
     
     def check_victory(self):
         """Проверяет, остался ли на доске хотя бы один король"""
-        white_king_alive = False
-        black_king_alive = False
-
-        for row in self.board:
-            for piece in row:
-                if piece == "K":
-                    white_king_alive = True
-                elif piece == "k":
-                    black_king_alive = True
+        winner = self.engine.winner()
 
-        if not white_king_alive:
+        if winner == 'black':
             messagebox.showinfo("Игра окончена", "Черные победили!")
             self.game_over = True
             self.reset_game()
             return True
-        elif not black_king_alive:
+        elif winner == 'white':
             messagebox.showinfo("Игра окончена", "Белые победили!")
             self.game_over = True
             self.reset_game()
@@ -470,269 +338,80 @@ class ChessGame:
         return False
     
     def get_all_valid_moves(self, piece, row, col):
-        """Возвращает все допустимые ходы для данной фигуры"""
-        valid_moves = []
-        
-        for r in range(8):
-            for c in range(8):
-                if self.is_valid_move(piece, row, col, r, c):
-                    valid_moves.append((r, c))
-        
-        return valid_moves
+        """Возвращает все допустимые ходы для данной фигуры (в переиспользуемом буфере движка)"""
+        return self.engine.get_all_valid_moves(piece, row, col)
+
     def is_check(self, color):
         """Проверяет, находится ли король на текущем цвете под шахом."""
-        king_pos = self.find_king(color)  
-        if not king_pos:
-            return False 
+        return self.engine.is_check(color)
 
-        king_row, king_col = king_pos
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and piece.isupper() if color == 'black' else piece.islower():
-                    valid_moves = self.get_all_valid_moves(piece, row, col)
-                    for move in valid_moves:
-                        to_row, to_col = move
-                        if to_row == king_row and to_col == king_col:
-                            return True  
-        return False
     def find_king(self, color):
         """Находит позицию короля на поле для данного цвета."""
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if (piece == 'k' and color == 'black') or (piece == 'K' and color == 'white'):
-                    return row, col  
-        return None
-
+        return self.engine.find_king(color)
 
     def is_safe_move(self, row, col):
         """Проверяет, безопасен ли ход на данную клетку для короля, включая атаки со стороны вражеских фигур."""
-        if not (0 <= row < 8 and 0 <= col < 8):
-            return False  
-
-        target_piece = self.board[row][col]
-        if target_piece and target_piece.islower():
-            return False  
-
-        if self.is_under_attack(row, col):  
-            return False  
-
-        return True
-
+        return self.engine.is_safe_move(row, col)
 
     def is_under_attack(self, row, col):
         """Проверяет, атакует ли клетку вражеская фигура."""
-        for r in range(8):
-            for c in range(8):
-                piece = self.board[r][c]
-                if piece and piece.isupper():  
-                    valid_moves = self.get_all_valid_moves(piece, r, c)
-                    for move in valid_moves:
-                        to_row, to_col = move
-                        if to_row == row and to_col == col:
-                            return True  
-        return False
-
+        return self.engine.is_under_attack(row, col)
 
     def king_escape(self):
-        """Логика ухода короля от шаха, проверяет, не окажется ли король под шахом после хода и не подставится ли он под рубку от вражеских фигур."""
-        king_pos = self.find_king('black')  
-        if not king_pos:
-            return False  
-
-        king_row, king_col = king_pos
-        possible_moves = [
-            (king_row - 1, king_col - 1), (king_row - 1, king_col), (king_row - 1, king_col + 1),
-            (king_row, king_col - 1),                       (king_row, king_col + 1),
-            (king_row + 1, king_col - 1), (king_row + 1, king_col), (king_row + 1, king_col + 1)
-        ]
-
-        for row, col in possible_moves:
-            if self.is_safe_move(row, col) and not self.is_under_attack(row, col):
-                self.move_piece((king_row, king_col), (row, col))
-                if not self.is_check('black'): 
-                    return True 
-
-                self.move_piece((row, col), (king_row, king_col))
-
-        return False
+        """Уводит черного короля из-под шаха, если есть безопасная клетка"""
+        escape = self.engine.king_escape()
+        if escape is None:
+            return False
+        self.move_piece(*escape)
+        return True
 
     def simulate_move(self, from_row, from_col, to_row, to_col):
-        """Временный ход для проверки безопасности"""
-        self.temp_piece = self.board[to_row][to_col]  
-        self.board[to_row][to_col] = self.board[from_row][from_col]
-        self.board[from_row][from_col] = None
+        """Временный ход для проверки безопасности (вызовы можно вкладывать друг в друга)"""
+        self.engine.simulate_move(from_row, from_col, to_row, to_col)
 
     def undo_move(self, from_row, from_col, to_row, to_col):
         """Откат хода после проверки"""
-        self.board[from_row][from_col] = self.board[to_row][to_col]
-        self.board[to_row][to_col] = self.temp_piece
-        self.temp_piece = None
+        self.engine.undo_move()
 
     def ai_move(self):
-        """ИИ делает ход по приоритетам: взятие короля, рубка, ферзь, продвижение пешки, обычное движение и уход от шаха."""
-        ai_moves = []  # Обычные ходы
-        pawn_moves = []  # Ходы пешек
-        capture_moves = []  # Обычные взятия
-        queen_moves = []  # Ходы ферзя
-        king_moves = []  # Ходы короля (избегает шаха)
-        safe_king_moves = []  # Безопасные ходы короля
-        king_capture = []  # Самый приоритетный ход – взятие короля
-
-        #  Проверяем, можно ли сразу взять короля
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and piece.islower():  
-                    valid_moves = self.get_all_valid_moves(piece, row, col)
-
-                    for move in valid_moves:
-                        to_row, to_col = move
-                        target_piece = self.board[to_row][to_col]
-
-                        if target_piece == "K":  
-                            king_capture.append((row, col, to_row, to_col, 999))
-
-        # Если можно сразу взять короля, делаем это
-        if king_capture:
-            from_row, from_col, to_row, to_col, _ = king_capture[0]
-            self.move_piece((from_row, from_col), (to_row, to_col))
-            return  
-
-        # Если король под шахом, ищем безопасный ход или рубку
-        if self.is_check('black'):
-            print("Король под шахом! Ищем безопасный ход...")
-            
-            # Проверим, может ли король взять фигуру
-            king_row, king_col = self.find_king('black')
-            valid_king_moves = self.get_all_valid_moves('k', king_row, king_col)
-            for move in valid_king_moves:
-                to_row, to_col = move
-                target_piece = self.board[to_row][to_col]
-                if target_piece and target_piece.isupper():  
-                    capture_moves.append((king_row, king_col, to_row, to_col, 3))
-
-            if capture_moves:  
-                capture_moves.sort(key=lambda x: x[4], reverse=True)
-                from_row, from_col, to_row, to_col, _ = capture_moves[0]
-                self.move_piece((from_row, from_col), (to_row, to_col))
-                return  
-
-            #  Если король не может рубить, пытаемся найти безопасные ходы.
-            if self.king_escape():  
-                return 
-
-        
-
-        king_under_check = self.is_check('black')  
-
-        # Перебираем все фигуры ИИ
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and piece.islower():  # Черные фигуры
-                    valid_moves = self.get_all_valid_moves(piece, row, col)
-
-                    for move in valid_moves:
-                        to_row, to_col = move
-                        target_piece = self.board[to_row][to_col]
-
-                        # Взятие короля
-                        if target_piece == "K":  
-                            king_capture.append((row, col, to_row, to_col, 999))
-
-                        if king_under_check and piece == "k":
-                            if not self.is_under_attack(to_row, to_col):
-                                safe_king_moves.append((row, col, to_row, to_col, 10))  
-                            continue  
-
-                        # Взятие любой белой фигуры 
-                        if target_piece and target_piece.isupper() and piece != "k":  
-                            capture_moves.append((row, col, to_row, to_col, 3))
-
-                        # Ход ферзя
-                        elif piece == "q":
-                            queen_moves.append((row, col, to_row, to_col, 2))
-
-                        # Продвижение пешки
-                        elif piece == "p" and to_row == 7:
-                            pawn_moves.append((row, col, to_row, to_col, 2))
-                        elif piece == "p" and not target_piece:
-                            pawn_moves.append((row, col, to_row, to_col, 1))
-
-                        # Обычный ход короля 
-                        elif piece == "k" and not self.is_under_attack(to_row, to_col):
-                            if to_row in (0, 7) or to_col in (0, 7):
-                                king_moves.append((row, col, to_row, to_col, 0))  
-                            else:
-                                king_moves.append((row, col, to_row, to_col, 1))
-
-                        elif not target_piece:
-                            ai_moves.append((row, col, to_row, to_col, 1))
-
-
-
-
-        # Если можно рубить фигуру, делаем это
-        if capture_moves:
-            capture_moves.sort(key=lambda x: x[4], reverse=True)
-            from_row, from_col, to_row, to_col, _ = capture_moves[0]
-            self.move_piece((from_row, from_col), (to_row, to_col))
-            return  
-
-        # Ход ферзя
-        if queen_moves:
-            queen_moves.sort(key=lambda x: x[4], reverse=True)
-            from_row, from_col, to_row, to_col, _ = queen_moves[0]
-            self.move_piece((from_row, from_col), (to_row, to_col))
-            return  
-
-        # Продвижение пешки
-        if pawn_moves:
-            pawn_moves.sort(key=lambda x: x[4], reverse=True)
-            from_row, from_col, to_row, to_col, _ = pawn_moves[0]
-            self.move_piece((from_row, from_col), (to_row, to_col))
-            return  
-
-        # Обычный ход короля
-        if king_moves:
-            king_moves.sort(key=lambda x: x[4], reverse=True)
-            from_row, from_col, to_row, to_col, _ = king_moves[0]
-            self.move_piece((from_row, from_col), (to_row, to_col))
-            return  
-
-        # Обычный ход
-        if ai_moves:
-            ai_moves.sort(key=lambda x: x[4], reverse=True)
-            from_row, from_col, to_row, to_col, _ = ai_moves[0]
-            self.move_piece((from_row, from_col), (to_row, to_col))
-        
-
+        """Ход ИИ: движок ищет ход в фоне, окно проверяет готовность через after() и делает ход"""
+        self.ai_task = self.engine.start_ai()
+        self._poll_ai()
+
+    def _poll_ai(self):
+        self._ai_poll = None
+        task = self.ai_task
+        if task is None:
+            return
+        for result in task.progress():
+            if self.on_ai_progress is not None:
+                self.on_ai_progress(result)
+        if not task.done():
+            self._ai_poll = self.master.after(AI_POLL_MS, self._poll_ai)
+            return
+        self.ai_task = None
+        move = task.result()
+        if move is not None and not self.move_piece(*move):
+            # Пока человек выбирает ход, ИИ думает над ответом на самый вероятный из них
+            self.engine.start_ponder()
+
+    def cancel_ai(self):
+        """Отменяет незавершенный поиск хода ИИ"""
+        if self._ai_poll is not None:
+            self.master.after_cancel(self._ai_poll)
+            self._ai_poll = None
+        self.ai_task = None
+        self.engine.cancel_ai()
+
+    def close(self):
+        """Закрытие окна: сначала останавливаем поиск и его процессы, затем уничтожаем окно"""
+        self.cancel_ai()
+        self.engine.close()
+        self.master.destroy()
 
     def is_king_in_check(self, color):
         """Проверяет, находится ли король указанного цвета в шахе"""
-        king_position = None
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if (color == "b" and piece == "k") or (color == "w" and piece == "K"):
-                    king_position = (row, col)
-                    break
-
-        if not king_position:
-            return False  
-
-        opponent_color = "w" if color == "b" else "b"
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and piece.islower() if opponent_color == "b" else piece.isupper():
-                    valid_moves = self.get_all_valid_moves(piece, row, col)
-                    if king_position in valid_moves:
-                        return True  
-
-        return False
+        return self.engine.is_king_in_check(color)
 
 def start_game():
     """Запуск игры"""
@@ -742,30 +421,36 @@ def start_game():
 
 # ===================== Интерфейс авторизации =====================
 
-root = tk.Tk()
-root.title('Вход/регистрация')
-root.geometry("400x200")
-root.resizable(width=False, height=False)
-root.configure(bg='#009999')
-
-# Логин
-log_label = tk.Label(root, bg='#009999', text='Логин', font=('Arial', 12))
-log_label.pack(pady=5)
-entry_username = tk.Entry(root, bg='#006363',fg='white', font=('Arial', 12))
-entry_username.pack(pady=5)
-
-# Пароль
-password_label = tk.Label(root, bg='#009999', text='Пароль', font=('Arial', 12))
-password_label.pack(pady=5)
-entry_password = tk.Entry(root, bg='#006363',fg='white', font=('Arial', 12), show="*")
-entry_password.pack(pady=5)
-
-# Кнопка "Вход"
-btn_log = tk.Button(root, text='Войти', bg='#006363', fg='white', font=('Arial', 12), command=login)
-btn_log.pack()
-
-# Кнопка "Зарегистрироваться"
-btn_reg = tk.Button(root, text='Зарегестрироваться', bg='#006363', fg='white', font=('Arial', 12), command=register)
-btn_reg.pack()
-
-root.mainloop()
+def build_login_window():
+    """Создает окно входа и регистрации"""
+    global root, entry_username, entry_password
+    root = tk.Tk()
+    root.title('Вход/регистрация')
+    root.geometry("400x200")
+    root.resizable(width=False, height=False)
+    root.configure(bg='#009999')
+
+    # Логин
+    log_label = tk.Label(root, bg='#009999', text='Логин', font=('Arial', 12))
+    log_label.pack(pady=5)
+    entry_username = tk.Entry(root, bg='#006363',fg='white', font=('Arial', 12))
+    entry_username.pack(pady=5)
+
+    # Пароль
+    password_label = tk.Label(root, bg='#009999', text='Пароль', font=('Arial', 12))
+    password_label.pack(pady=5)
+    entry_password = tk.Entry(root, bg='#006363',fg='white', font=('Arial', 12), show="*")
+    entry_password.pack(pady=5)
+
+    # Кнопка "Вход"
+    btn_log = tk.Button(root, text='Войти', bg='#006363', fg='white', font=('Arial', 12), command=login)
+    btn_log.pack()
+
+    # Кнопка "Зарегистрироваться"
+    btn_reg = tk.Button(root, text='Зарегестрироваться', bg='#006363', fg='white', font=('Arial', 12), command=register)
+    btn_reg.pack()
+
+
+if __name__ == "__main__":
+    build_login_window()
+    root.mainloop()
@@ -0,0 +1,149 @@
+"""Нагрузочный клиент для server.py: тысячи игроков, каждый в своем соединении.
+
+Игрок регистрируется (если нужно), входит, открывает партию и делает случайные допустимые
+ходы за белых, дожидаясь ответа ИИ; окончившаяся партия сменяется новой. Задержка хода —
+от отправки move до ответа сервера. В конце печатается JSON: число ходов, ходы в секунду
+и процентили задержки.
+
+Логины игроков — load00000@test, load00001@test, ...; с --register они создаются в хранилище
+сервера (уже существующие просто используются).
+
+Запуск: python loadgen.py [--players 1000] [--moves 20] [--port 8765 | --unix PATH] [--register]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from bitboard import WHITE
+from movegen import generate, move_name
+from serialize import from_fen
+from netstats import percentile, PORT
+
+
+class LoadStats:
+    def __init__(self, players):
+        self.latencies = []
+        self.games = 0
+        self.errors = 0
+        self.started = None
+        self.finished = None
+        self.waiting = players  # Игроки, которые ещё не вошли
+        self.ready = asyncio.Event()  # Все вошли (или отказали): можно начинать ходы
+
+    def arrived(self):
+        self.waiting -= 1
+        if not self.waiting:
+            self.started = time.perf_counter()
+            self.ready.set()
+
+
+async def _connect(args):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+
+async def _call(reader, writer, line):
+    writer.write((line + "\n").encode('utf-8'))
+    await writer.drain()
+    reply = await reader.readline()
+    if not reply:
+        raise ConnectionError("сервер закрыл соединение")
+    return reply.decode('utf-8').rstrip("\n")
+
+
+async def player(index, args, stats):
+    """Один игрок: вход, затем args.moves ходов в одной или нескольких партиях"""
+    login = "load%05d@test" % index
+    password = "pass%05d" % index
+    rng = random.Random("%d:%d" % (args.seed, index))
+    try:
+        reader, writer = await _connect(args)
+    except Exception:
+        stats.arrived()
+        raise
+    try:
+        try:
+            if args.register:
+                await _call(reader, writer, "register %s %s" % (login, password))
+            reply = await _call(reader, writer, "login %s %s" % (login, password))
+            if reply != "ok":
+                raise RuntimeError("вход %s: %s" % (login, reply))
+        finally:
+            stats.arrived()
+        await stats.ready.wait()  # Ходы начинаются, когда вошли все игроки
+        game_id = fen = None
+        moves = []
+        for _ in range(args.moves):
+            if game_id is None:
+                _, game_id, fen = (await _call(reader, writer, "new %d" % rng.getrandbits(32))).split(' ', 2)
+                stats.games += 1
+            generate(from_fen(fen), WHITE, moves)
+            sent = time.perf_counter()
+            reply = await _call(reader, writer, "move %s %s" % (game_id, move_name(rng.choice(moves))))
+            stats.latencies.append((time.perf_counter() - sent) * 1000.0)
+            kind, _, rest = reply.split(' ', 2)
+            if kind == 'moved':
+                fen = rest.split(' ', 1)[1]
+            elif kind == 'over':
+                await _call(reader, writer, "close %s" % game_id)
+                game_id = None
+            else:
+                stats.errors += 1
+                game_id = None
+        writer.write(b"quit\n")
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def run(args):
+    stats = LoadStats(args.players)
+    results = await asyncio.gather(*(player(i, args, stats) for i in range(args.players)),
+                                   return_exceptions=True)
+    stats.finished = time.perf_counter()
+    return stats, [r for r in results if isinstance(r, Exception)]
+
+
+def report(stats, failures, players):
+    elapsed = stats.finished - (stats.started or stats.finished)
+    latencies = stats.latencies
+    result = {
+        'players': players,
+        'failed_players': len(failures),
+        'games': stats.games,
+        'moves': len(latencies),
+        'errors': stats.errors,
+        'seconds': round(elapsed, 3),
+        'moves_per_s': len(latencies) / elapsed if elapsed else 0.0,
+    }
+    if latencies:
+        result.update({'p50_ms': percentile(latencies, 50), 'p95_ms': percentile(latencies, 95),
+                       'p99_ms': percentile(latencies, 99), 'max_ms': max(latencies)})
+    if failures:
+        result['first_failure'] = repr(failures[0])
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный клиент игрового сервера")
+    parser.add_argument('--host', default='127.0.0.1', help="адрес TCP")
+    parser.add_argument('--port', type=int, default=PORT, help="порт TCP")
+    parser.add_argument('--unix', default=None, help="путь Unix-сокета вместо TCP")
+    parser.add_argument('--players', type=int, default=1000, help="число игроков (соединений)")
+    parser.add_argument('--moves', type=int, default=20, help="ходов на игрока")
+    parser.add_argument('--seed', type=int, default=0, help="зерно выбора ходов")
+    parser.add_argument('--register', action='store_true', help="зарегистрировать игроков перед входом")
+    args = parser.parse_args(argv)
+
+    stats, failures = asyncio.run(run(args))
+    print(json.dumps(report(stats, failures, args.players), indent=2, ensure_ascii=False))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
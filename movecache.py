@@ -0,0 +1,299 @@
+"""Постоянный кэш ходов ИИ: позиция -> выбранный ход, глубина и оценка поиска.
+
+Файл открывается через mmap и живет между запусками. Это хеш-таблица фиксированного размера
+из корзин по BUCKET_SLOTS записей: корзина выбирается по ключу Зобриста, а в записи хранится
+точная двоичная запись позиции (serialize.pack), так что совпадение ключей проверяется
+полностью. Когда корзина заполнена, запись вытесняется по часовому алгоритму: попадание
+ставит записи бит обращения, а стрелка корзины пропускает записи с битом, сбрасывая его.
+
+Читать файл могут сколько угодно процессов; запись проходит под flock. Запись помечается
+недействительной на время изменения, поэтому читатель не примет наполовину записанный ход.
+
+Запуск:
+    python movecache.py prewarm games.jsonl [--cache movecache.bin] [--depth 6] [--jobs N]
+    python movecache.py stats [--cache movecache.bin]
+"""
+
+import argparse
+import json
+import mmap
+import multiprocessing
+import os
+import struct
+import sys
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: запись из нескольких процессов не согласуется
+    fcntl = None
+
+from bitboard import BLACK
+from movegen import parse_move
+from serialize import pack, to_fen, from_fen, PACKED_SIZE
+from search import Searcher, MATE_BOUND
+from tt import TranspositionTable
+
+MAGIC = b'KMC1'
+HEADER = struct.Struct('<4sII')  # Сигнатура, число корзин, записей в корзине
+HEADER_SIZE = 64
+SLOT = struct.Struct('<%dsHBhBB' % PACKED_SIZE)  # Позиция, ход, глубина, оценка, флаги, стрелка
+SLOT_SIZE = 32
+BUCKET_SLOTS = 8
+BUCKET_SIZE = SLOT_SIZE * BUCKET_SLOTS
+MOVE_CACHE_FILE = 'movecache.bin'
+MIN_DEPTH = 6  # Более мелкий поиск не заменяет поиск ИИ в окне
+
+_VALID = 1
+_REFERENCED = 2
+_FLAGS_OFFSET = PACKED_SIZE + 5  # Смещение байта флагов внутри записи
+_HAND_OFFSET = _FLAGS_OFFSET + 1  # Стрелка часов корзины хранится в первой записи корзины
+
+
+def buckets_for_size(size_mb):
+    """Число корзин (степень двойки), умещающихся в size_mb мегабайт"""
+    buckets = max(1, int(size_mb * 1024 * 1024) // BUCKET_SIZE)
+    return 1 << (buckets.bit_length() - 1)
+
+
+class MoveCache:
+    """Кэш ходов в файле path; если файла нет, он создается размером size_mb.
+    readonly=True — только чтение (биты обращения не ставятся, store недоступен)"""
+
+    def __init__(self, path=MOVE_CACHE_FILE, size_mb=16, readonly=False, min_depth=MIN_DEPTH):
+        self.path = path
+        self.readonly = readonly
+        self.min_depth = min_depth
+        if not os.path.exists(path):
+            if readonly:
+                raise FileNotFoundError(path)
+            self._create(path, buckets_for_size(size_mb))
+        self.file = open(path, 'rb' if readonly else 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE)
+        magic, self.buckets, slots = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or slots != BUCKET_SLOTS or len(self.map) != HEADER_SIZE + self.buckets * BUCKET_SIZE:
+            self.close()
+            raise ValueError("Поврежденный файл кэша ходов: %s" % path)
+        self.mask = self.buckets - 1
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _create(path, buckets):
+        # Временный файл и переименование: другой процесс не увидит файл без заголовка
+        tmp = path + '.%d.tmp' % os.getpid()
+        with open(tmp, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, buckets, BUCKET_SLOTS).ljust(HEADER_SIZE, b'\0'))
+            f.truncate(HEADER_SIZE + buckets * BUCKET_SIZE)
+        os.replace(tmp, path)
+
+    def _bucket(self, pos):
+        return HEADER_SIZE + (pos.key & self.mask) * BUCKET_SIZE
+
+    def probe(self, pos):
+        """(ход, глубина, оценка) для позиции или None. Записи мельче min_depth не возвращаются,
+        кроме найденного форсированного взятия короля — оно верно на любой глубине"""
+        key = pack(pos)
+        data = self.map
+        base = self._bucket(pos)
+        for offset in range(base, base + BUCKET_SIZE, SLOT_SIZE):
+            if data[offset:offset + PACKED_SIZE] != key:
+                continue
+            stored, move, depth, score, flags, _ = SLOT.unpack_from(data, offset)
+            # Ключ проверяется повторно: запись могла измениться между двумя чтениями
+            if not flags & _VALID or stored != key or depth < self.min_depth and abs(score) < MATE_BOUND:
+                break
+            if not self.readonly and not flags & _REFERENCED:
+                data[offset + _FLAGS_OFFSET] = flags | _REFERENCED
+            self.hits += 1
+            return move, depth, score
+        self.misses += 1
+        return None
+
+    def store(self, pos, move, depth, score):
+        """Сохраняет ход; запись той же позиции заменяется, только если новая не мельче"""
+        key = pack(pos)
+        data = self.map
+        base = self._bucket(pos)
+        self._lock()
+        try:
+            target = None
+            for offset in range(base, base + BUCKET_SIZE, SLOT_SIZE):
+                flags = data[offset + _FLAGS_OFFSET]
+                if flags & _VALID and data[offset:offset + PACKED_SIZE] == key:
+                    if data[offset + PACKED_SIZE + 2] > depth:
+                        return
+                    target = offset
+                    break
+                if target is None and not flags & _VALID:
+                    target = offset
+            if target is None:
+                target = self._evict(base)
+            hand = data[target + _HAND_OFFSET]
+            data[target + _FLAGS_OFFSET] = 0
+            SLOT.pack_into(data, target, key, move, min(depth, 255), max(-32768, min(score, 32767)), 0, hand)
+            data[target + _FLAGS_OFFSET] = _VALID
+        finally:
+            self._unlock()
+
+    def _evict(self, base):
+        """Часовой алгоритм по корзине: возвращает смещение вытесняемой записи"""
+        data = self.map
+        hand = data[base + _HAND_OFFSET] % BUCKET_SLOTS
+        while True:
+            offset = base + hand * SLOT_SIZE
+            hand = (hand + 1) % BUCKET_SLOTS
+            flags = data[offset + _FLAGS_OFFSET]
+            if flags & _REFERENCED:
+                data[offset + _FLAGS_OFFSET] = flags & ~_REFERENCED
+                continue
+            data[base + _HAND_OFFSET] = hand
+            return offset
+
+    def _lock(self):
+        if self.readonly:
+            raise ValueError("Кэш ходов открыт только для чтения")
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+
+    def _unlock(self):
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+    def __len__(self):
+        data = self.map
+        return sum(
+            1 for offset in range(HEADER_SIZE + _FLAGS_OFFSET, len(data), SLOT_SIZE) if data[offset] & _VALID
+        )
+
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            'path': self.path,
+            'size_mb': len(self.map) / (1024 * 1024),
+            'slots': self.buckets * BUCKET_SLOTS,
+            'used': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / probes if probes else 0.0,
+        }
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+# ===================== Прогрев по партиям самоигры =====================
+
+_searcher = None
+_depth = None
+
+
+def _init_worker(depth, tt_size_mb):
+    global _searcher, _depth
+    _searcher = Searcher(TranspositionTable(tt_size_mb))
+    _depth = depth
+
+
+def _search_positions(fens):
+    """Ищет ход в каждой позиции: [(fen, ход, глубина, оценка)]"""
+    result = []
+    for fen in fens:
+        found = _searcher.search(from_fen(fen), max_depth=_depth)
+        if found.move is not None:
+            result.append((fen, found.move, found.depth, found.score))
+    return result
+
+
+def corpus_positions(lines):
+    """Позиции с ходом черных из записей партий selfplay (по одной записи JSON в строке)"""
+    for line in lines:
+        if not line.strip():
+            continue
+        game = json.loads(line)
+        pos = from_fen(game['start'])
+        for name in game['moves']:
+            if pos.side == BLACK:
+                yield pos
+            pos.make_move(parse_move(name))
+
+
+def prewarm(cache, lines, depth=MIN_DEPTH, jobs=None, batch=64, tt_size_mb=4, log=None):
+    """Заполняет кэш ходами для позиций с ходом черных из корпуса партий.
+    Позиции, для которых уже есть запись не мельче depth, пропускаются. Возвращает число записей"""
+    jobs = jobs or os.cpu_count() or 1
+    saved_min_depth = cache.min_depth
+    cache.min_depth = depth
+    seen = set()
+
+    def tasks():
+        chunk = []
+        for pos in corpus_positions(lines):
+            key = pack(pos)
+            if key in seen or cache.probe(pos) is not None:
+                continue
+            seen.add(key)
+            chunk.append(to_fen(pos))
+            if len(chunk) >= batch:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    pool = multiprocessing.Pool(jobs, _init_worker, (depth, tt_size_mb)) if jobs > 1 else None
+    if pool is None:
+        _init_worker(depth, tt_size_mb)
+        results = map(_search_positions, tasks())
+    else:
+        results = pool.imap_unordered(_search_positions, tasks())
+    stored = 0
+    started = time.perf_counter()
+    try:
+        for chunk in results:
+            for fen, move, found_depth, score in chunk:
+                cache.store(from_fen(fen), move, found_depth, score)
+                stored += 1
+            if log is not None:
+                elapsed = time.perf_counter() - started
+                log("%d позиций, %.0f позиций/с" % (stored, stored / elapsed if elapsed else 0.0))
+    finally:
+        cache.min_depth = saved_min_depth
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return stored
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Постоянный кэш ходов ИИ")
+    parser.add_argument('--cache', default=MOVE_CACHE_FILE, help="файл кэша")
+    parser.add_argument('--size-mb', type=float, default=16, help="размер нового файла кэша")
+    commands = parser.add_subparsers(dest='command', required=True)
+    warm = commands.add_parser('prewarm', help="заполнить кэш по партиям selfplay")
+    warm.add_argument('games', help="файл JSONL от selfplay ('-' — stdin)")
+    warm.add_argument('--depth', type=int, default=MIN_DEPTH, help="глубина поиска")
+    warm.add_argument('--jobs', type=int, default=None, help="число процессов (по умолчанию все ядра)")
+    warm.add_argument('-q', '--quiet', action='store_true', help="не печатать прогресс")
+    commands.add_parser('stats', help="заполненность кэша")
+    args = parser.parse_args(argv)
+
+    cache = MoveCache(args.cache, args.size_mb)
+    try:
+        if args.command == 'prewarm':
+            log = None if args.quiet else (lambda message: print(message, file=sys.stderr, flush=True))
+            f = sys.stdin if args.games == '-' else open(args.games, encoding='utf-8')
+            try:
+                stored = prewarm(cache, f, args.depth, args.jobs, log=log)
+            finally:
+                if f is not sys.stdin:
+                    f.close()
+            print("записано %d позиций" % stored, file=sys.stderr)
+        else:
+            print(json.dumps(cache.stats(), indent=2, ensure_ascii=False))
+    finally:
+        cache.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
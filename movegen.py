@@ -0,0 +1,75 @@
+"""Генератор псевдолегальных ходов по таблицам шагов короля и пешек и лучам ферзя"""
+
+from bitboard import (
+    WHITE, BLACK, KING_ATTACKS, PAWN_PUSH, PAWN_ATTACKS, queen_attacks, iter_bits, color_of,
+    square_name, parse_square,
+)
+
+# Ход кодируется числом from | to << 6; превращение пешки в ферзя подразумевается
+
+
+def encode_move(from_sq, to_sq):
+    return from_sq | to_sq << 6
+
+
+def move_from(move):
+    return move & 63
+
+
+def move_to(move):
+    return move >> 6 & 63
+
+
+def move_name(move):
+    """Запись хода вида 'e2e3'"""
+    return square_name(move & 63) + square_name(move >> 6 & 63)
+
+
+def parse_move(text):
+    """Ход по записи вида 'e2e3' (суффикс превращения 'q' допускается и игнорируется)"""
+    text = text.strip()
+    if len(text) not in (4, 5) or len(text) == 5 and text[4].lower() != 'q':
+        raise ValueError("Неверная запись хода: %r" % text)
+    return encode_move(parse_square(text[:2]), parse_square(text[2:4]))
+
+
+def piece_targets(pos, sq, piece=None):
+    """Маска клеток, на которые может пойти фигура с клетки sq"""
+    if piece is None:
+        piece = pos.squares[sq]
+    color = color_of(piece)
+    own = pos.occ[color]
+    kind = piece.upper()
+
+    if kind == 'K':
+        return KING_ATTACKS[sq] & ~own
+
+    if kind == 'P':
+        targets = PAWN_ATTACKS[color][sq] & pos.occ[color ^ 1]
+        push = PAWN_PUSH[color][sq]
+        if push >= 0 and pos.squares[push] is None:
+            targets |= 1 << push
+        return targets
+
+    if kind == 'Q':
+        return queen_attacks(sq, pos.occ[WHITE] | pos.occ[BLACK]) & ~own
+
+    return 0
+
+
+def targets_into(pos, sq, out, piece=None):
+    """Заполняет буфер out клетками назначения фигуры и возвращает их количество"""
+    del out[:]
+    out.extend(iter_bits(piece_targets(pos, sq, piece)))
+    return len(out)
+
+
+def generate(pos, color, out):
+    """Заполняет буфер out всеми ходами стороны color и возвращает их количество"""
+    del out[:]
+    append = out.append
+    squares = pos.squares
+    for from_sq in iter_bits(pos.occ[color]):
+        for to_sq in iter_bits(piece_targets(pos, from_sq, squares[from_sq])):
+            append(from_sq | to_sq << 6)
+    return len(out)
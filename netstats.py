@@ -0,0 +1,13 @@
+"""Общее для игрового сервера, нагрузочного клиента и замеров: порт по умолчанию и процентили.
+
+Модуль ничего не импортирует, поэтому loadgen.py и bench.py не тянут за собой сервер,
+хранилище пользователей и Crypto."""
+
+PORT = 8765  # Порт TCP игрового сервера по умолчанию
+
+
+def percentile(values, p):
+    """Процентиль по ближайшему рангу"""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(p / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
@@ -0,0 +1,248 @@
+"""Параллельный поиск в постоянном пуле процессов: упрощенный ABDADA над общей таблицей
+транспозиций.
+
+Каждый воркер ведет то же итеративное углубление, что и Searcher.search, по всему дереву.
+Таблица транспозиций у всех процессов одна, в общей памяти: запись таблицы проверяется
+по ключу, поэтому блокировки не нужны. Работа делится ниже корня: в узле глубины не меньше
+SPLIT_DEPTH первый ход считают все процессы (как в young brothers wait), а каждый следующий
+ход процесс помечает в общей таблице «занятых» ходов, и ход, который сейчас считает другой
+процесс, откладывается в конец перебора. К отложенному ходу процесс возвращается, когда его
+оценка обычно уже лежит в таблице транспозиций. Так процессы расходятся по разным ветвям
+на любой глубине дерева, и первый ход корня больше не считается одним процессом.
+
+Поиск заканчивается, когда первый воркер досчитал предельную глубину или нашел взятие
+короля; с пределом времени каждый воркер, как и Searcher.search, не начинает итерацию после
+половины времени, а недосчитанную прерывает по времени. Берется итог самой глубокой
+итерации (при равенстве — пришедший первым). Это альфа-бета той же глубины, что и у
+Searcher.search, но таблицу заполняли несколько процессов в другом порядке, поэтому оценка
+и ход могут отличаться, как отличаются у одного процесса с другим содержимым таблицы:
+на 40 позициях bench.corpus до глубины 9 совпали 36-38 оценок и 38-40 ходов из 40. Предел
+max_nodes — общий: каждый воркер раз в 512 узлов пишет свое число узлов в общую память
+и сверяет сумму, так что перебор — не больше 512 узлов на воркер.
+
+На тех же позициях 2, 4 и 8 процессов вместе считают 1,16, 1,31 и 1,53 узла на узел
+последовательного поиска, то есть ускорение на стольких же ядрах не больше 1,7, 3,1 и 5,2
+раза (при корневом делении с первым ходом в одном процессе было не больше 2 раз). Замер
+сделан на одном ядре, которое процессы делят по времени; само ускорение на нескольких ядрах
+здесь не измерялось.
+
+С одним процессом (jobs=1 или одно ядро) пул не создается и работает обычный Searcher.
+"""
+
+import multiprocessing
+import os
+import time
+
+from search import Searcher, SearchResult, SearchTimeout, MAX_PLY, MATE_BOUND
+from serialize import pack, unpack
+from tt import TranspositionTable, shared_buffer
+
+POLL_SECONDS = 0.005  # Как часто главный процесс проверяет stop, время и итерации воркеров
+SPLIT_DEPTH = 3  # С какой оставшейся глубины узла ходы делятся между процессами
+BUSY_ENTRIES = 1 << 15  # Записей в таблице занятых ходов
+_MOVE_MIX = 0x9E3779B97F4A7C15  # Перемешивает ход с ключом позиции
+_MASK64 = (1 << 64) - 1
+PROGRESS_FIELDS = 3  # Глубина, ход и оценка последней итерации воркера
+
+
+class SharedMoves:
+    """Таблица занятых ходов (ключ позиции и ход) в общей памяти.
+
+    Запись не защищена блокировкой: гонка лишь теряет или оставляет пометку, и ход
+    будет посчитан дважды или позже, но никогда не пропущен"""
+
+    min_depth = SPLIT_DEPTH
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.table = memoryview(buffer).cast('B').cast('Q')
+        self.mask = len(self.table) - 1
+
+    def clear(self):
+        self.table.cast('B')[:] = bytes(len(self.table) * 8)
+
+    def moves(self, key, moves):
+        """Перебирает moves: первый ход сразу, занятые другими процессами — в конце"""
+        table = self.table
+        mask = self.mask
+        deferred = []
+        for i, move in enumerate(moves):
+            tag = (key ^ move * _MOVE_MIX) & _MASK64 | 1
+            slot = tag >> 1 & mask
+            if i and table[slot] == tag:
+                deferred.append(move)
+                continue
+            table[slot] = tag
+            try:
+                yield move
+            finally:
+                if table[slot] == tag:
+                    table[slot] = 0
+        yield from deferred
+
+
+# ---------- Воркеры ----------
+
+class _WorkerSearcher(Searcher):
+    """Searcher воркера: ходы узлов делит через SharedMoves, свои узлы и итерации пишет
+    в общую память, а предел узлов сверяет с суммой по всем воркерам"""
+
+    def __init__(self, tt, split, slot, nodes, progress):
+        super().__init__(tt)
+        self.split = split
+        self.slot = slot
+        self.shared_nodes = nodes
+        self.progress = progress
+        self.total_nodes = None  # Общий предел узлов всех воркеров
+
+    def publish(self, result):
+        """on_progress: последняя досчитанная итерация (глубина пишется последней)"""
+        base = self.slot * PROGRESS_FIELDS
+        self.progress[base + 1] = result.move or 0
+        self.progress[base + 2] = result.score
+        self.progress[base] = result.depth
+
+    def _check_time(self):
+        super()._check_time()
+        self.shared_nodes[self.slot] = self.nodes
+        if self.total_nodes is not None and sum(self.shared_nodes) >= self.total_nodes:
+            raise SearchTimeout()
+
+
+_searcher = None
+_stop = None
+
+
+def _init_worker(tt_buffer, busy_buffer, nodes, progress, slots, stop):
+    global _searcher, _stop
+    with slots.get_lock():
+        slot = slots.value
+        slots.value += 1
+    _searcher = _WorkerSearcher(TranspositionTable(buffer=tt_buffer), SharedMoves(busy_buffer), slot,
+                                nodes, progress)
+    _stop = stop
+
+
+def _search_task(task):
+    """Поиск одного воркера: SearchResult или None, если поиск уже остановлен"""
+    data, time_ms, max_depth, generation, max_nodes = task
+    searcher = _searcher
+    if _stop.is_set():
+        return None
+    searcher.tt.generation = (generation - 1) & 255  # search() сам перейдет к поколению generation
+    searcher.total_nodes = max_nodes
+    pos, _ = unpack(data)
+    result = searcher.search(pos, time_ms, max_depth, searcher.publish, _stop)
+    searcher.shared_nodes[searcher.slot] = searcher.nodes
+    return result
+
+
+# ---------- Главный процесс ----------
+
+class ParallelSearcher:
+    """Поиск с тем же интерфейсом, что у Searcher, на jobs процессах (None — все ядра).
+    Пул создается при первом поиске; close() его останавливает"""
+
+    def __init__(self, jobs=None, tt_size_mb=16):
+        self.jobs = jobs or os.cpu_count() or 1
+        if self.jobs > 1:
+            self.tt = TranspositionTable(buffer=shared_buffer(tt_size_mb))
+        else:
+            self.tt = TranspositionTable(tt_size_mb)
+        self.searcher = Searcher(self.tt)  # При одном процессе — весь поиск
+        self.nodes = 0
+        self._pool = None
+        self._stop = None
+        self._busy = None
+        self._nodes = None
+        self._progress = None
+
+    def start(self):
+        """Запускает пул заранее, чтобы первый поиск не ждал создания процессов"""
+        if self._pool is None and self.jobs > 1:
+            self._stop = multiprocessing.Event()
+            self._busy = SharedMoves(multiprocessing.RawArray('Q', BUSY_ENTRIES))
+            self._nodes = multiprocessing.RawArray('q', self.jobs)
+            self._progress = multiprocessing.RawArray('q', self.jobs * PROGRESS_FIELDS)
+            slots = multiprocessing.Value('i', 0)
+            self._pool = multiprocessing.Pool(self.jobs, _init_worker, (
+                self.tt.buffer, self._busy.buffer, self._nodes, self._progress, slots, self._stop))
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._stop.set()
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def search(self, pos, time_ms=None, max_depth=MAX_PLY, on_progress=None, stop=None, max_nodes=None):
+        """То же, что Searcher.search: ход для pos.side в пределах time_ms, max_depth и max_nodes
+        (предел узлов — на все процессы вместе)"""
+        if self.jobs <= 1:
+            result = self.searcher.search(pos, time_ms, max_depth, on_progress, stop, max_nodes)
+            self.nodes = self.searcher.nodes
+            return result
+
+        pool = self.start()
+        start = time.perf_counter()
+        deadline = None if time_ms is None else start + time_ms / 1000.0
+        max_depth = min(max_depth, MAX_PLY - 1)
+        self.tt.new_search()
+        self._stop.clear()
+        self._busy.clear()
+        for i in range(self.jobs):
+            self._nodes[i] = 0
+        for i in range(self.jobs * PROGRESS_FIELDS):
+            self._progress[i] = 0
+        task = (pack(pos), time_ms, max_depth, self.tt.generation, max_nodes)
+        pending = [pool.apply_async(_search_task, (task,)) for _ in range(self.jobs)]
+
+        results = []
+        reported = 0
+        while pending:
+            if stop is not None and stop.is_set() or deadline is not None and time.perf_counter() >= deadline:
+                self._stop.set()
+            pending[0].wait(POLL_SECONDS)
+            for task_result in [r for r in pending if r.ready()]:
+                # Ответы дочитываются и после остановки: к следующему поиску пул должен быть свободен
+                pending.remove(task_result)
+                result = task_result.get()
+                if result is None:
+                    continue
+                results.append(result)
+                if not result.interrupted and (result.depth >= max_depth or result.move is None
+                                               or abs(result.score) >= MATE_BOUND):
+                    self._stop.set()  # Остальные считают ту же глубину — ждать их незачем
+            reported = self._report(on_progress, reported, start)
+
+        self.nodes = sum(self._nodes)
+        # max берет первый из равных, то есть пришедший раньше
+        best = max(results, key=lambda r: (r.depth, r.partial)) if results else SearchResult(interrupted=True)
+        best.nodes = self.nodes
+        best.time_ms = (time.perf_counter() - start) * 1000.0
+        return best
+
+    def _report(self, on_progress, reported, start):
+        """Вызывает on_progress, если какой-нибудь воркер досчитал итерацию глубже reported.
+        Возвращает глубину, о которой уже сообщено"""
+        if on_progress is None:
+            return reported
+        progress = self._progress
+        best = None
+        for base in range(0, self.jobs * PROGRESS_FIELDS, PROGRESS_FIELDS):
+            depth, move, score = progress[base:base + PROGRESS_FIELDS]
+            if depth > reported and progress[base] == depth and (best is None or depth > best.depth):
+                best = SearchResult(move or None, score, depth, pv=[move] if move else ())
+        if best is None:
+            return reported
+        best.nodes = sum(self._nodes)
+        best.time_ms = (time.perf_counter() - start) * 1000.0
+        on_progress(best)
+        return best.depth
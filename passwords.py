@@ -0,0 +1,52 @@
+"""Шифрование паролей AES-128-CBC: формат записи 'iv:ct' (обе части в base64).
+
+Модуль не импортирует tkinter, поэтому его используют и окно входа, и консольные утилиты."""
+
+import os
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad, unpad
+from Crypto.Random import get_random_bytes
+import base64
+
+KEY_FILE = "encryption_key.key"  # Файл для хранения ключа шифрования
+
+# Проверяем, существует ли ключ и загружаем его, если нет — создаём новый
+def load_or_create_key(path=KEY_FILE):
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()  
+    else:
+        key = get_random_bytes(16)  # 16 байт для AES-128
+        with open(path, "wb") as f:
+            f.write(key)
+        return key
+
+_key = None
+
+def get_key():
+    """Ключ шифрования: читается (или создается) при первом обращении, а не при импорте"""
+    global _key
+    if _key is None:
+        _key = load_or_create_key()
+    return _key
+
+# Шифруем пароль с помощью AES
+def encrypt_password(password, key=None):
+    cipher = AES.new(key or get_key(), AES.MODE_CBC)
+    ct_bytes = cipher.encrypt(pad(password.encode(), AES.block_size))  # шифруем пароль
+    iv = base64.b64encode(cipher.iv).decode('utf-8')  
+    ct = base64.b64encode(ct_bytes).decode('utf-8')  
+    return iv + ":" + ct  
+
+# Расшифровываем пароль с помощью AES
+def decrypt_password(encrypted_password, key=None):
+    try:
+        iv, ct = encrypted_password.split(":")  
+    except ValueError:
+        raise ValueError("Неверный формат зашифрованного пароля.")
+    
+    iv = base64.b64decode(iv)
+    ct = base64.b64decode(ct)
+    cipher = AES.new(key or get_key(), AES.MODE_CBC, iv)  
+    pt = unpad(cipher.decrypt(ct), AES.block_size)  
+    return pt.decode('utf-8')
@@ -0,0 +1,287 @@
+"""Текстовый протокол в духе UCI: движок без окна, команды построчно через stdin и stdout.
+
+Процесс запускается один раз, дальше каждая команда — одна строка, поэтому на команду нет
+затрат на запуск. Поиск идет в отдельном потоке, пока главный поток читает команды: stop
+прерывает его, isready отвечает сразу, а go и команды, меняющие позицию, сначала останавливают
+текущий поиск (как stop, с выводом bestmove), так что чтение команд не ждет бесконечного поиска.
+В конце входного потока go infinite (или go без пределов) останавливается, а поиск с пределом
+досчитывается.
+
+Команды:
+    uci                                     -> id name ..., uciok
+    isready                                 -> readyok
+    ucinewgame                              очистить таблицу транспозиций
+    position fen <запись> [moves <ходы>]    позиция по текстовой записи (см. serialize)
+    position startpos [<зерно>] [moves ...] стартовая расстановка по зерну (как в selfplay)
+    moves <ходы>                            сделать ходы в текущей позиции
+    go [depth N] [movetime MS] [nodes N] [infinite]
+                                            -> info depth ... pv ..., bestmove <ход>
+    stop                                    прервать поиск (bestmove печатается как обычно)
+    fen                                     -> fen <запись текущей позиции>
+    stats                                   -> stats <JSON со счетчиками>
+    quit
+
+Ход записывается как 'e2e4' (превращение в ферзя неявное); нет хода — 'bestmove 0000'.
+Ошибки в команде не прерывают работу: на них отвечает строка 'info string ошибка: ...'.
+Ошибка во время поиска тоже: после такой строки go всё равно отвечает 'bestmove 0000'.
+
+Запуск: python protocol.py [--tt-mb 16] [--jobs 1] [--tablebases DIR | --no-tablebases]
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+
+from bitboard import WHITE, BLACK
+from movegen import generate, move_name, parse_move
+from engine import random_start, TT_SIZE_MB
+from parallel import ParallelSearcher
+from search import Searcher, MATE, MATE_BOUND, MAX_PLY
+from serialize import to_fen, from_fen
+from tt import TranspositionTable
+from tablebase import Tablebase, TABLEBASE_DIR
+
+ENGINE_NAME = "kursovichok"
+
+
+def score_text(score):
+    """Оценка в записи UCI: 'cp N' или 'mate N' (N — ходы до взятия короля, у проигрывающего < 0)"""
+    if score >= MATE_BOUND:
+        return "mate %d" % ((MATE - score + 1) // 2)
+    if score <= -MATE_BOUND:
+        return "mate -%d" % ((MATE + score + 1) // 2)
+    return "cp %d" % score
+
+
+class Protocol:
+    """Разбор команд и ответы в поток out. Один экземпляр обслуживает весь сеанс"""
+
+    def __init__(self, out, searcher, tablebase=None):
+        self.out = out
+        self.searcher = searcher
+        self.tablebase = tablebase
+        self.pos = random_start(random.Random(0))
+        self._lock = threading.Lock()  # Строки поиска и главного потока не перемешиваются
+        self._search = None  # Поток текущего go
+        self._stop = threading.Event()
+        self._infinite = False  # Текущий go без пределов: сам он не закончится
+        self.commands = 0
+        self.searches = 0
+        self.nodes = 0
+        self.search_ms = 0.0
+        self.started = time.perf_counter()
+        self.handlers = {
+            'uci': self.cmd_uci,
+            'isready': self.cmd_isready,
+            'ucinewgame': self.cmd_newgame,
+            'position': self.cmd_position,
+            'moves': self.cmd_moves,
+            'go': self.cmd_go,
+            'stop': self.cmd_stop,
+            'fen': self.cmd_fen,
+            'stats': self.cmd_stats,
+        }
+
+    def send(self, *lines):
+        with self._lock:
+            for line in lines:
+                self.out.write(line + "\n")
+            self.out.flush()
+
+    def run(self, f):
+        """Читает команды из f до quit или конца потока"""
+        for line in f:
+            if not self.handle(line):
+                break
+        if self._infinite:
+            self._stop.set()
+        self.wait()
+
+    def handle(self, line):
+        """Выполняет одну команду. Возвращает False на quit"""
+        words = line.split()
+        if not words:
+            return True
+        self.commands += 1
+        name = words[0]
+        if name == 'quit':
+            self.cmd_stop(())
+            return False
+        handler = self.handlers.get(name)
+        if handler is None:
+            self.send("info string ошибка: неизвестная команда %r" % name)
+            return True
+        try:
+            handler(words[1:])
+        except ValueError as e:
+            self.send("info string ошибка: %s" % e)
+        return True
+
+    def wait(self):
+        """Дожидается окончания текущего поиска"""
+        if self._search is not None:
+            self._search.join()
+            self._search = None
+
+    def interrupt(self):
+        """Останавливает текущий поиск и дожидается его bestmove: поиск проверяет stop
+        каждые 512 узлов, поэтому ожидание короткое"""
+        if self._search is not None:
+            self._stop.set()
+        self.wait()
+
+    # ---------- Команды ----------
+
+    def cmd_uci(self, args):
+        self.send("id name %s" % ENGINE_NAME, "uciok")
+
+    def cmd_isready(self, args):
+        self.send("readyok")
+
+    def cmd_newgame(self, args):
+        self.interrupt()
+        self.searcher.tt.clear()
+
+    def cmd_position(self, args):
+        self.interrupt()
+        args = list(args)
+        moves = []
+        if 'moves' in args:
+            index = args.index('moves')
+            args, moves = args[:index], args[index + 1:]
+        if not args:
+            raise ValueError("position: нужен fen или startpos")
+        if args[0] == 'fen':
+            pos = from_fen(' '.join(args[1:]))
+        elif args[0] == 'startpos':
+            pos = random_start(random.Random(int(args[1]) if len(args) > 1 else 0))
+        else:
+            raise ValueError("position: нужен fen или startpos, а не %r" % args[0])
+        for sq, piece in enumerate(pos.squares):
+            # Пешка на крайней горизонтали в игре невозможна: она уже стала бы ферзем
+            if piece in ('P', 'p') and (sq < 8 or sq >= 56):
+                raise ValueError("position: пешка на крайней горизонтали")
+        self._apply(pos, moves)
+        self.pos = pos
+
+    def cmd_moves(self, args):
+        self.interrupt()
+        pos = self.pos.copy()
+        self._apply(pos, args)
+        self.pos = pos
+
+    @staticmethod
+    def _apply(pos, names):
+        """Делает ходы по записям; недопустимый ход — ValueError, позиция тогда не годится"""
+        legal = []
+        for name in names:
+            move = parse_move(name)
+            if pos.kings[WHITE] is None or pos.kings[BLACK] is None:
+                raise ValueError("ход %s после окончания партии" % name)
+            generate(pos, pos.side, legal)
+            if move not in legal:
+                raise ValueError("недопустимый ход %s" % name)
+            pos.make_move(move)
+
+    def cmd_go(self, args):
+        self.interrupt()
+        limits = {'depth': MAX_PLY, 'movetime': None, 'nodes': None}
+        args = list(args)
+        infinite = False
+        while args:
+            word = args.pop(0)
+            if word == 'infinite':
+                infinite = True
+                continue
+            if word not in limits or not args:
+                raise ValueError("go: неизвестный параметр %r" % word)
+            limits[word] = int(args.pop(0))
+        self._infinite = infinite or limits == {'depth': MAX_PLY, 'movetime': None, 'nodes': None}
+        self._stop.clear()
+        self._search = threading.Thread(
+            target=self._go, args=(self.pos.copy(), limits['depth'], limits['movetime'], limits['nodes']),
+            name="protocol-search", daemon=True)
+        self._search.start()
+
+    def _go(self, pos, depth, movetime, nodes):
+        # bestmove отправляется всегда, иначе клиент ждал бы его вечно
+        try:
+            move = self._think(pos, depth, movetime, nodes)
+        except Exception as e:
+            self.send("info string ошибка: поиск: %s" % e)
+            move = None
+        self.send("bestmove %s" % (move_name(move) if move is not None else "0000"))
+
+    def _think(self, pos, depth, movetime, nodes):
+        if pos.kings[WHITE] is None or pos.kings[BLACK] is None:
+            return None
+        if self.tablebase is not None:
+            known = self.tablebase.best_move(pos)
+            if known is not None:
+                self.send("info string tablebase")
+                return known[0]
+        started = time.perf_counter()
+        result = self.searcher.search(pos, movetime, depth, self._info, self._stop, nodes)
+        self.searches += 1
+        self.nodes += result.nodes
+        self.search_ms += (time.perf_counter() - started) * 1000.0
+        return result.move
+
+    def _info(self, result):
+        elapsed = max(result.time_ms, 0.001)
+        self.send("info depth %d score %s nodes %d time %d nps %d pv %s" % (
+            result.depth, score_text(result.score), result.nodes, int(result.time_ms),
+            int(result.nodes * 1000.0 / elapsed), ' '.join(move_name(move) for move in result.pv)))
+
+    def cmd_stop(self, args):
+        self.interrupt()
+
+    def cmd_fen(self, args):
+        self.send("fen %s" % to_fen(self.pos))
+
+    def cmd_stats(self, args):
+        elapsed = time.perf_counter() - self.started
+        stats = {
+            'commands': self.commands,
+            'commands_per_s': self.commands / elapsed if elapsed else 0.0,
+            'searches': self.searches,
+            'nodes': self.nodes,
+            'search_ms': round(self.search_ms, 3),
+            'nps': self.nodes * 1000.0 / self.search_ms if self.search_ms else 0.0,
+            'searching': self._search is not None and self._search.is_alive(),
+            'tt': self.searcher.tt.stats(),
+        }
+        self.send("stats %s" % json.dumps(stats, ensure_ascii=False, separators=(',', ':')))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Текстовый протокол в духе UCI через stdin/stdout")
+    parser.add_argument('--tt-mb', type=float, default=TT_SIZE_MB, help="размер таблицы транспозиций")
+    parser.add_argument('--jobs', type=int, default=1, help="процессов поиска (0 — по числу ядер)")
+    tables = parser.add_mutually_exclusive_group()
+    tables.add_argument('--tablebases', default=TABLEBASE_DIR, help="каталог эндшпильных таблиц")
+    tables.add_argument('--no-tablebases', action='store_true', help="не использовать эндшпильные таблицы")
+    args = parser.parse_args(argv)
+
+    if args.jobs == 1:
+        searcher = Searcher(TranspositionTable(args.tt_mb))
+    else:
+        searcher = ParallelSearcher(args.jobs or None, args.tt_mb)
+        # Пул создается до чтения stdin: процесс, порожденный из потока поиска, пока главный
+        # поток ждет строку, наследует занятую блокировку stdin и зависает, закрывая его
+        searcher.start()
+    tablebase = None if args.no_tablebases else Tablebase(args.tablebases)
+    protocol = Protocol(sys.stdout, searcher, tablebase)
+    try:
+        protocol.run(sys.stdin)
+    finally:
+        if isinstance(searcher, ParallelSearcher):
+            searcher.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
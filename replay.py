@@ -0,0 +1,257 @@
+"""Воспроизведение записанных партий (gamelog) на текущем движке: расхождения ходов и
+замедления ходов ИИ.
+
+Партия проигрывается с начальной позиции записи. Каждый ход ИИ из поиска ищется заново с
+теми пределами, которые записаны: до той же итерации и, если она была прервана, до того же
+числа узлов. Поиск проверяет время, stop и предел узлов в одних и тех же точках, поэтому
+прерванная по времени итерация повторяется ход в ход без всякого предела по времени, и итог
+не зависит от загрузки машины. Затем он сравнивается с записью:
+    другой ход — расхождение (партия всё равно продолжается записанным ходом), если только
+    записанный ход не оценивается на той же глубине так же, как найденный: такой равноценный
+    ход лишь считается (ties);
+    время поиска — по всей партии: если сумма больше записанной в --slower раз и на --min-ms
+    мс, партия отмечается как замедлившаяся (отдельный ход слишком шумный для этого).
+Ходы из эндшпильных таблиц (t) переигрываются через таблицы; ходы из кэша ходов (c) и из
+таблиц, когда таблиц нет, не проверяются (unchecked).
+
+Перед каждой партией таблица транспозиций очищается (её размер берется из записи, а без
+него — --tt-mb), поэтому итог не зависит от того, какой процесс воспроизводил партию и что
+он делал до неё. Движок тоже очищает её в начале партии, так что его партии без поиска во
+время хода человека и на одном процессе воспроизводятся ход в ход. Остальные записи точно не
+повторить (в отчете inexact — почему): с поиском во время хода человека (ponder, так играет
+окно) и с параллельным поиском (jobs) таблицу заполняли поиски, которых в записи нет или
+которые шли в другом порядке, а процесс ИИ сервера (shared_tt) делит таблицу между партиями
+и не очищает её. Ходы поиска в таких партиях не проверяются и не сравниваются по времени
+(unchecked), проверяются только ходы из таблиц.
+
+Записи раздаются пулу процессов порциями, в выходной JSONL попадает строка на каждую партию
+с расхождениями, замедлением или ошибкой (--all — на каждую), сводка печатается в stderr.
+Код возврата 1 при ошибках и расхождениях; замедления — только с --fail-slow.
+
+Запуск: python replay.py DIR_OR_FILE... [--jobs N] [--slower 1.5] [--min-ms 50] [--fail-slow]
+                         [--all] [-o report.jsonl] [--tablebases DIR]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from bitboard import WHITE, BLACK, color_of
+from movegen import move_name, parse_move
+from engine import TT_SIZE_MB
+from gamelog import read_log, list_logs, SOURCE_TABLE, SOURCE_CACHE
+from search import Searcher
+from serialize import from_fen
+from tt import TranspositionTable
+from tablebase import Tablebase, TABLEBASE_DIR
+
+SLOWER = 1.5  # Во сколько раз дольше записанного поиск партии — уже замедление
+MIN_MS = 50.0  # ... и не меньше чем на столько миллисекунд за партию (шум таймера и планировщика)
+SCORE_TT_MB = 1  # Таблица транспозиций для оценки ходов при расхождении
+CHUNK = 16  # Записей в одной порции воркера
+
+
+class _WorkerState:
+    def __init__(self, tt_size_mb, tablebase_dir, slower, min_ms):
+        self.tt_size_mb = tt_size_mb
+        self.searchers = {}  # Размер таблицы транспозиций -> Searcher
+        # Оценки расходящихся ходов считаются отдельно: поиск воспроизведения не должен видеть
+        # в своей таблице ничего, чего не было в записанной партии
+        self.scorer = Searcher(TranspositionTable(SCORE_TT_MB))
+        self.tablebase = Tablebase(tablebase_dir) if tablebase_dir else None
+        self.slower = slower
+        self.min_ms = min_ms
+
+
+_state = None
+
+
+def _init_worker(*args):
+    global _state
+    _state = _WorkerState(*args)
+
+
+def inexact_reason(header):
+    """Почему записанные ходы поиска нельзя повторить ход в ход: 'ponder', 'jobs', 'shared_tt'
+    или None, если можно"""
+    if header.get('ponder'):
+        return 'ponder'
+    if (header.get('jobs') or 1) > 1:
+        return 'jobs'
+    # У ранних записей сервера нет shared_tt, но пользователя пишет только сервер
+    if header.get('shared_tt') or 'user' in header:
+        return 'shared_tt'
+    return None
+
+
+def replay_game(record, state):
+    """Воспроизводит партию (gamelog.GameRecord) и возвращает отчет о ней"""
+    # Вытеснение из таблицы зависит от её размера, поэтому он берется тот же, что был в партии
+    tt_size_mb = record.header.get('tt_mb') or state.tt_size_mb
+    searcher = state.searchers.get(tt_size_mb)
+    if searcher is None:
+        searcher = state.searchers[tt_size_mb] = Searcher(TranspositionTable(tt_size_mb))
+    searcher.tt.clear()
+    searcher.reset_heuristics()
+    pos = from_fen(record.start)
+    report = {
+        'seed': record.seed, 'result': record.result, 'ponder': bool(record.header.get('ponder')),
+        'inexact': inexact_reason(record.header),
+        'plies': len(record.plies),
+        'ai_moves': 0, 'checked': 0, 'unchecked': 0, 'ties': 0, 'logged_ms': 0.0, 'replay_ms': 0.0,
+        'divergent': [], 'slower': False,
+    }
+    slowest = None
+    for index, ply in enumerate(record.plies):
+        move = parse_move(ply.move)
+        piece = pos.squares[move & 63]
+        if not piece or pos.kings[WHITE] is None or pos.kings[BLACK] is None:
+            raise ValueError("ход %d (%s) невозможен в позиции записи" % (index + 1, ply.move))
+        pos.set_side(color_of(piece))
+        if ply.timed:
+            report['ai_moves'] += 1
+            replay_ms = _check(pos, index, ply, move, searcher, state, report)
+            if replay_ms is not None and (slowest is None or replay_ms - ply.search_ms > slowest[0]):
+                slowest = (replay_ms - ply.search_ms, index + 1, ply.search_ms, replay_ms)
+        pos.make_move(move)
+    logged_ms, replay_ms = report['logged_ms'], report['replay_ms']
+    if replay_ms > logged_ms * state.slower and replay_ms - logged_ms >= state.min_ms:
+        report['slower'] = True
+        report['slowest'] = {'ply': slowest[1], 'logged_ms': slowest[2], 'replay_ms': round(slowest[3], 1)}
+    report['logged_ms'] = round(logged_ms, 1)
+    report['replay_ms'] = round(replay_ms, 1)
+    return report
+
+
+def _check(pos, index, ply, move, searcher, state, report):
+    """Повторяет ход ИИ и записывает в report расхождение. Возвращает время повторного поиска
+    для сравнения с записью или None, если сравнивать нечего"""
+    if ply.source in (SOURCE_TABLE, SOURCE_CACHE):
+        known = state.tablebase.best_move(pos) if ply.source == SOURCE_TABLE and state.tablebase else None
+        if known is None:
+            report['unchecked'] += 1  # Содержимого кэша ходов в записи нет
+            return None
+        replayed, result = known[0], None
+    elif report['inexact']:
+        report['unchecked'] += 1  # Таблица транспозиций партии неизвестна
+        return None
+    else:
+        result = searcher.search(pos, None, ply.depth, max_nodes=ply.nodes)
+        replayed = result.move
+    report['checked'] += 1
+    if replayed != move:
+        divergence = {'ply': index + 1, 'logged': ply.move,
+                      'replayed': move_name(replayed) if replayed is not None else None}
+        if result is not None and replayed is not None:
+            depth = result.depth + 1 if result.partial else result.depth
+            scorer = state.scorer
+            scorer.tt.clear()
+            divergence['depth'] = depth
+            divergence['score'] = scorer.search_root_move(pos, replayed, depth)[0]
+            divergence['logged_score'] = scorer.search_root_move(pos, move, depth)[0]
+        if 'score' in divergence and divergence['score'] == divergence['logged_score']:
+            report['ties'] += 1
+        else:
+            report['divergent'].append(divergence)
+    if result is None:
+        return None
+    report['logged_ms'] += ply.search_ms
+    report['replay_ms'] += result.time_ms
+    return result.time_ms
+
+
+def _replay_file(path):
+    """Воспроизводит одну запись; ошибка записи или воспроизведения попадает в отчет"""
+    try:
+        report = replay_game(read_log(path), _state)
+    except (OSError, ValueError) as e:
+        report = {'error': str(e)}
+    report['log'] = path
+    return report
+
+
+def run(paths, out, jobs=None, tt_size_mb=TT_SIZE_MB, tablebase_dir=TABLEBASE_DIR, slower=SLOWER,
+        min_ms=MIN_MS, report_all=False, chunk=CHUNK, log=None):
+    """Воспроизводит записи paths и пишет отчеты в поток out. Возвращает сводку (словарь)"""
+    jobs = jobs or os.cpu_count() or 1
+    init_args = (tt_size_mb, tablebase_dir, slower, min_ms)
+    totals = {'games': 0, 'errors': 0, 'plies': 0, 'ai_moves': 0, 'checked': 0, 'unchecked': 0, 'ties': 0,
+              'divergent': 0, 'slower_games': 0, 'inexact_games': 0, 'logged_ms': 0.0, 'replay_ms': 0.0}
+    started = time.perf_counter()
+
+    pool = multiprocessing.Pool(jobs, _init_worker, init_args) if jobs > 1 else None
+    if pool is None:
+        _init_worker(*init_args)
+        results = map(_replay_file, paths)
+    else:
+        # Каждый отчет несет путь записи, так что порядок не важен
+        results = pool.imap_unordered(_replay_file, paths, chunk)
+    try:
+        for report in results:
+            totals['games'] += 1
+            if 'error' in report:
+                totals['errors'] += 1
+            else:
+                for key in ('plies', 'ai_moves', 'checked', 'unchecked', 'ties', 'logged_ms', 'replay_ms'):
+                    totals[key] += report[key]
+                totals['divergent'] += len(report['divergent'])
+                totals['slower_games'] += report['slower']
+                totals['inexact_games'] += report['inexact'] is not None
+            if report_all or 'error' in report or report['divergent'] or report['slower']:
+                out.write(json.dumps(report, ensure_ascii=False, separators=(',', ':')) + "\n")
+            if log is not None and totals['games'] % 100 == 0:
+                elapsed = time.perf_counter() - started
+                log("%d/%d партий, %.0f партий/с, расхождений %d, замедлившихся партий %d" % (
+                    totals['games'], len(paths), totals['games'] / elapsed if elapsed else 0.0,
+                    totals['divergent'], totals['slower_games']))
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    totals['seconds'] = round(time.perf_counter() - started, 3)
+    totals['logged_ms'] = round(totals['logged_ms'], 1)
+    totals['replay_ms'] = round(totals['replay_ms'], 1)
+    totals['time_ratio'] = totals['replay_ms'] / totals['logged_ms'] if totals['logged_ms'] else None
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных партий на текущем движке")
+    parser.add_argument('paths', nargs='+', help="записи партий или каталоги с ними")
+    parser.add_argument('-o', '--output', default='-', help="файл JSONL с отчетами (по умолчанию stdout)")
+    parser.add_argument('--jobs', type=int, default=None, help="число процессов (по умолчанию все ядра)")
+    parser.add_argument('--slower', type=float, default=SLOWER, help="порог замедления партии, во сколько раз")
+    parser.add_argument('--min-ms', type=float, default=MIN_MS, help="порог замедления партии, миллисекунд")
+    parser.add_argument('--fail-slow', action='store_true', help="код возврата 1 и при замедлениях")
+    parser.add_argument('--tt-mb', type=float, default=TT_SIZE_MB, help="размер таблицы транспозиций воркера")
+    parser.add_argument('--chunk', type=int, default=CHUNK, help="записей в одной порции воркера")
+    parser.add_argument('--all', action='store_true', help="отчет по каждой партии, а не только по найденному")
+    tables = parser.add_mutually_exclusive_group()
+    tables.add_argument('--tablebases', default=TABLEBASE_DIR, help="каталог эндшпильных таблиц")
+    tables.add_argument('--no-tablebases', action='store_true', help="не использовать эндшпильные таблицы")
+    parser.add_argument('-q', '--quiet', action='store_true', help="не печатать прогресс")
+    args = parser.parse_args(argv)
+
+    def log(message):
+        print(message, file=sys.stderr, flush=True)
+
+    paths = []
+    for path in args.paths:
+        paths.extend(list_logs(path) if os.path.isdir(path) else [path])
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        totals = run(paths, out, args.jobs, args.tt_mb, None if args.no_tablebases else args.tablebases,
+                     args.slower, args.min_ms, args.all, args.chunk, None if args.quiet else log)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    log(json.dumps(totals, ensure_ascii=False))
+    failed = totals['errors'] or totals['divergent'] or args.fail_slow and totals['slower_games']
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
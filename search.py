@@ -0,0 +1,357 @@
+"""Поиск хода: negamax с альфа-бета отсечением, форсированный вариант на взятиях и превращениях
+и итеративное углубление с ограничением по времени"""
+
+import time
+
+from bitboard import WHITE, BLACK, PIECE_VALUES, row_col
+from movegen import generate
+from tt import TranspositionTable, EXACT, LOWER, UPPER
+
+MATE = 30000  # Оценка взятия короля; ближе к победе — больше
+INFINITY = 32000
+MAX_PLY = 64
+MATE_BOUND = MATE - MAX_PLY  # Оценки выше этой — форсированное взятие короля
+
+# Бонус пешке по числу шагов до превращения (индекс — шаги)
+PAWN_ADVANCE = (0, 160, 90, 50, 25, 10, 5, 0)
+# Штраф королю за удаленность от центра: 0 в центре, 3 в углу
+CENTER_DISTANCE = [
+    max(3 - min(r, 7 - r), 3 - min(c, 7 - c)) for r, c in map(row_col, range(64))
+]
+EDGE_PENALTY = 10
+KING_DISTANCE_WEIGHT = 6
+# Пешка вне «квадрата» вражеского короля: король не успевает к полю превращения
+UNSTOPPABLE_PAWN = 400
+
+
+def score_to_tt(score, ply):
+    """Оценки взятия короля хранятся относительно узла, а не корня"""
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+def distance(a, b):
+    """Расстояние между клетками в ходах короля"""
+    return max(abs((a >> 3) - (b >> 3)), abs((a & 7) - (b & 7)))
+
+
+def evaluate(pos):
+    """Статическая оценка с точки зрения стороны, которая ходит"""
+    score = pos.material[WHITE] - pos.material[BLACK]
+    kings = pos.kings
+    for color, sign in ((WHITE, 1), (BLACK, -1)):
+        own_king = kings[color]
+        enemy_king = kings[color ^ 1]
+        if own_king is not None:
+            score -= sign * EDGE_PENALTY * CENTER_DISTANCE[own_king]
+        pawns = pos.bb['P' if color == WHITE else 'p']
+        while pawns:
+            low = pawns & -pawns
+            sq = low.bit_length() - 1
+            pawns ^= low
+            steps = (sq >> 3) if color == WHITE else 7 - (sq >> 3)
+            bonus = PAWN_ADVANCE[steps]
+            # Своему королю выгодно быть рядом с пешкой, чужому — тоже, чтобы её остановить
+            if own_king is not None and enemy_king is not None:
+                bonus += KING_DISTANCE_WEIGHT * (distance(enemy_king, sq) - distance(own_king, sq))
+            # Правило квадрата: если соперник на ходу, у его короля на шаг больше
+            if enemy_king is not None:
+                promotion = (sq & 7) if color == WHITE else 56 + (sq & 7)
+                if distance(enemy_king, promotion) - (pos.side != color) > steps:
+                    bonus += UNSTOPPABLE_PAWN
+            score += sign * bonus
+    return score if pos.side == WHITE else -score
+
+
+class SearchTimeout(Exception):
+    """Время на поиск истекло"""
+
+
+class SearchResult:
+    """Итог поиска: лучший ход, его оценка, достигнутая глубина и статистика.
+    interrupted=True — итерация глубины depth + 1 прервана (по времени, stop или max_nodes)
+    после nodes узлов; partial=True — ход и оценка взяты из этой прерванной итерации"""
+
+    def __init__(self, move=None, score=0, depth=0, nodes=0, time_ms=0.0, pv=(), partial=False,
+                 interrupted=False):
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.time_ms = time_ms
+        self.pv = list(pv)
+        self.partial = partial
+        self.interrupted = interrupted
+
+    def __repr__(self):
+        return "SearchResult(move=%r, score=%r, depth=%r, nodes=%r)" % (
+            self.move, self.score, self.depth, self.nodes)
+
+
+class Searcher:
+    """Альфа-бета поиск с итеративным углублением.
+
+    Работает прямо на переданной позиции через make_move/unmake_move и возвращает её в исходное
+    состояние. Буферы ходов, killer-ходы, история и таблица транспозиций переиспользуются
+    между вызовами."""
+
+    def __init__(self, tt=None):
+        self.tt = tt if tt is not None else TranspositionTable()
+        self.nodes = 0
+        self.deadline = None
+        self.stop = None
+        self.max_nodes = None
+        self.split = None  # Деление ходов узла между процессами (parallel.SharedMoves)
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.history = [0] * 4096
+        self._buffers = [[] for _ in range(MAX_PLY + 1)]
+        self._pv = [[] for _ in range(MAX_PLY + 2)]
+
+    def search(self, pos, time_ms=None, max_depth=MAX_PLY, on_progress=None, stop=None, max_nodes=None):
+        """Ищет ход для стороны pos.side.
+
+        time_ms — ограничение по времени в миллисекундах (None — без ограничения), max_depth —
+        предельная глубина, max_nodes — предел числа узлов (проверяется раз в 512 узлов).
+        on_progress(result) вызывается после каждой завершенной итерации.
+        stop — threading.Event: когда оно установлено, поиск прерывается так же, как по времени.
+        При нехватке времени возвращается лучший ход последней итерации."""
+        start = time.perf_counter()
+        self.deadline = None if time_ms is None else start + time_ms / 1000.0
+        self.stop = stop
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.reset_heuristics()
+        self.tt.new_search()
+        result = SearchResult()
+        root_depth = len(pos.stack)
+        max_depth = min(max_depth, MAX_PLY - 1)
+
+        for depth in range(1, max_depth + 1):
+            self._root_best = None
+            try:
+                score = self._negamax(pos, depth, -INFINITY, INFINITY, 0, result.move)
+            except SearchTimeout:
+                while len(pos.stack) > root_depth:
+                    pos.unmake_move()
+                result.interrupted = True
+                # Первым на каждой итерации считается прежний лучший ход, поэтому
+                # найденный в недосчитанной итерации ход не хуже прежнего
+                if self._root_best is not None:
+                    result.move, result.score = self._root_best
+                    result.pv = [result.move]
+                    result.partial = True
+                break
+            result.move = self._pv[0][0] if self._pv[0] else None
+            result.score = score
+            result.depth = depth
+            result.pv = list(self._pv[0])
+            result.nodes = self.nodes
+            result.time_ms = (time.perf_counter() - start) * 1000.0
+            if on_progress is not None:
+                on_progress(result)
+            if result.move is None or abs(score) >= MATE_BOUND:
+                break
+            # Следующая итерация обычно в несколько раз дольше — не начинаем её впустую
+            if self.deadline is not None and time.perf_counter() > start + (self.deadline - start) * 0.5:
+                break
+
+        result.nodes = self.nodes
+        result.time_ms = (time.perf_counter() - start) * 1000.0
+        return result
+
+    def search_root_move(self, pos, move, depth, alpha=-INFINITY, deadline=None, stop=None, max_nodes=None):
+        """Оценка хода move из корня pos на глубине depth и вариант после него. Оценка выше alpha
+        точная, иначе это лишь верхняя граница (как для хода корня в search после первого).
+
+        Так replay.py сравнивает записанный ход с найденным. deadline — момент perf_counter,
+        stop — событие остановки, max_nodes — предел узлов этого вызова; по ним бросается
+        SearchTimeout. Позиция возвращается в исходное состояние"""
+        self.deadline = deadline
+        self.stop = stop
+        self.nodes = 0
+        self.max_nodes = max_nodes
+        root_depth = len(pos.stack)
+        pos.make_move(move)
+        try:
+            score = -self._negamax(pos, depth - 1, -INFINITY, -alpha, 1)
+        finally:
+            while len(pos.stack) > root_depth:
+                pos.unmake_move()
+        return score, [move] + self._pv[1]
+
+    def reset_heuristics(self):
+        """Сбрасывает killer-ходы и историю (search делает это сам в начале каждого поиска)"""
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.history = [0] * 4096
+
+    def _check_time(self):
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchTimeout()
+        if self.stop is not None and self.stop.is_set():
+            raise SearchTimeout()
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise SearchTimeout()
+
+    def _order(self, pos, moves, ply, hash_move):
+        """Сортирует ходы: ход из прошлой итерации, взятия (MVV-LVA), превращения, killer-ходы, история"""
+        squares = pos.squares
+        killers = self.killers[ply]
+        history = self.history
+
+        def key(move):
+            if move == hash_move:
+                return -10000000
+            from_sq = move & 63
+            to_sq = move >> 6 & 63
+            piece = squares[from_sq]
+            victim = squares[to_sq]
+            score = 0
+            if victim in ('K', 'k'):
+                return -1000000
+            if victim:
+                score = 100000 + PIECE_VALUES[victim] * 10 - PIECE_VALUES[piece] // 10
+            if piece in ('P', 'p') and (to_sq < 8 or to_sq >= 56):
+                score += 90000
+            if not score:
+                if move == killers[0] or move == killers[1]:
+                    score = 50000
+                else:
+                    score = history[move & 4095]
+            return -score
+
+        moves.sort(key=key)
+
+    def _negamax(self, pos, depth, alpha, beta, ply, hash_move=0):
+        self.nodes += 1
+        if not self.nodes & 511:
+            self._check_time()
+        self._pv[ply] = []
+
+        side = pos.side
+        if pos.kings[side] is None:
+            return -MATE + ply
+        enemy_king = pos.kings[side ^ 1]
+        if enemy_king is None:
+            return MATE - ply
+        # Взятие короля заканчивает партию; в корне нужен сам ход, поэтому там ищем обычным порядком
+        if ply and pos.attacks[side] >> enemy_king & 1:
+            return MATE - ply - 1
+        if depth <= 0 or ply >= MAX_PLY - 1:
+            return self._quiesce(pos, alpha, beta, ply)
+
+        key = pos.key
+        entry = self.tt.probe(key)
+        if entry is not None:
+            tt_move, tt_depth, bound, tt_score = entry
+            if ply and tt_depth >= depth:
+                tt_score = score_from_tt(tt_score, ply)
+                if (bound == EXACT or bound == LOWER and tt_score >= beta
+                        or bound == UPPER and tt_score <= alpha):
+                    return tt_score
+            if not hash_move:
+                hash_move = tt_move
+
+        moves = self._buffers[ply]
+        if not generate(pos, side, moves):
+            return 0
+        self._order(pos, moves, ply, hash_move)
+
+        alpha_orig = alpha
+        best = -INFINITY
+        best_move = 0
+        squares = pos.squares
+        split = self.split
+        if split is not None and depth >= split.min_depth:
+            moves = split.moves(key, moves)
+        for move in moves:
+            quiet = squares[move >> 6 & 63] is None
+            pos.make_move(move)
+            score = -self._negamax(pos, depth - 1, -beta, -alpha, ply + 1)
+            pos.unmake_move()
+            if score > best:
+                best = score
+                best_move = move
+                if ply == 0:
+                    self._root_best = (move, score)
+                if score > alpha:
+                    alpha = score
+                    self._pv[ply] = [move] + self._pv[ply + 1]
+                    if alpha >= beta:
+                        if quiet:
+                            killers = self.killers[ply]
+                            if killers[0] != move:
+                                killers[1] = killers[0]
+                                killers[0] = move
+                            self.history[move & 4095] += depth * depth
+                        break
+
+        if best >= beta:
+            bound = LOWER
+        elif best > alpha_orig:
+            bound = EXACT
+        else:
+            bound = UPPER
+        self.tt.store(key, best_move, depth, bound, score_to_tt(best, ply))
+        return best
+
+    def _quiesce(self, pos, alpha, beta, ply):
+        """Форсированный вариант: только взятия и превращения"""
+        self.nodes += 1
+        if not self.nodes & 511:
+            self._check_time()
+        self._pv[ply] = []
+
+        stand_pat = evaluate(pos)
+        if stand_pat >= beta or ply >= MAX_PLY - 1:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        side = pos.side
+        moves = self._buffers[ply]
+        generate(pos, side, moves)
+        squares = pos.squares
+        enemies = pos.occ[side ^ 1]
+        pawn = 'P' if side == WHITE else 'p'
+        promotion_rank = (0, 7)[side]
+        moves[:] = [
+            m for m in moves
+            if enemies >> (m >> 6 & 63) & 1 or squares[m & 63] == pawn and (m >> 9 & 7) == promotion_rank
+        ]
+        if not moves:
+            return alpha
+        self._order(pos, moves, ply, 0)
+
+        for move in moves:
+            pos.make_move(move)
+            score = -self._negamax_tactical(pos, alpha, beta, ply + 1)
+            pos.unmake_move()
+            if score > alpha:
+                alpha = score
+                self._pv[ply] = [move] + self._pv[ply + 1]
+                if alpha >= beta:
+                    break
+        return alpha
+
+    def _negamax_tactical(self, pos, alpha, beta, ply):
+        """Узел форсированного варианта: проверка взятия короля и продолжение взятий"""
+        side = pos.side
+        if pos.kings[side] is None:
+            self._pv[ply] = []
+            return -MATE + ply
+        enemy_king = pos.kings[side ^ 1]
+        if pos.attacks[side] >> enemy_king & 1:
+            self._pv[ply] = []
+            return MATE - ply - 1
+        return self._quiesce(pos, -beta, -alpha, ply)
@@ -0,0 +1,215 @@
+"""Пакетные партии без интерфейса: белые играют выбранной политикой, черные — ИИ движка.
+
+Стартовые позиции строятся по тем же правилам, что и в init_board. Партии делятся на пачки
+и раздаются пулу процессов: воркер один раз создает поиск, таблицу транспозиций и эндшпильные
+таблицы, а в главный процесс возвращает уже готовый текст пачки в формате JSONL, так что на
+партию не приходится ни одной упаковки объектов между процессами.
+
+Запуск: python selfplay.py -n 1000 [--white random|greedy|search] [--jobs N] [-o games.jsonl]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from bitboard import WHITE, BLACK
+from movegen import generate, move_name
+from engine import random_start, best_move
+from serialize import to_fen
+from search import Searcher
+from batcheval import evaluate_children
+from tt import TranspositionTable
+from tablebase import Tablebase, TABLEBASE_DIR
+
+POLICIES = ('random', 'greedy', 'search')
+MAX_PLIES = 200  # Партия длиннее считается ничьей
+BATCH = 64  # Партий в одной пачке воркера
+
+
+def random_policy(pos, moves, state):
+    """Случайный псевдолегальный ход"""
+    return state.rng.choice(moves)
+
+
+def greedy_policy(pos, moves, state):
+    """Взятие короля, если оно есть, иначе ход с лучшей статической оценкой через полуход.
+    Все ответные позиции оцениваются одним вызовом evaluate_children"""
+    enemy_king = pos.kings[pos.side ^ 1]
+    for move in moves:
+        if move >> 6 & 63 == enemy_king:
+            return move
+    scores = evaluate_children(pos, moves)
+    # Оценка дочерней позиции — с точки зрения соперника, лучший ход её минимизирует
+    return moves[min(range(len(moves)), key=scores.__getitem__)]
+
+
+def search_policy(pos, moves, state):
+    """Альфа-бета поиск тех же настроек, что и у черных, но со своей таблицей транспозиций"""
+    return best_move(pos, state.white_searcher, state.tablebase, state.time_ms, state.depth)
+
+
+_POLICY_FUNCS = {'random': random_policy, 'greedy': greedy_policy, 'search': search_policy}
+
+
+class _WorkerState:
+    """Всё, что воркер создает один раз и переиспользует во всех своих партиях"""
+
+    def __init__(self, white, seed, depth, time_ms, tt_size_mb, tablebase_dir, max_plies):
+        self.policy = _POLICY_FUNCS[white]
+        self.white = white
+        self.seed = seed
+        self.depth = depth
+        self.time_ms = time_ms
+        self.max_plies = max_plies
+        self.searcher = Searcher(TranspositionTable(tt_size_mb))
+        self.white_searcher = Searcher(TranspositionTable(tt_size_mb)) if white == 'search' else None
+        self.tablebase = Tablebase(tablebase_dir)
+        self.rng = random.Random()
+        self.moves = []
+
+
+_state = None
+
+
+def _init_worker(*args):
+    global _state
+    _state = _WorkerState(*args)
+
+
+def play_game(index, state):
+    """Играет партию номер index и возвращает её запись.
+
+    При поиске до глубины (без time_ms) партия зависит только от зерна и номера, поэтому любую
+    из них можно переиграть отдельно, в каком бы воркере она ни была сыграна: таблицы
+    транспозиций и эвристики поиска, оставшиеся от прошлых партий воркера, очищаются. С time_ms
+    итеративное углубление останавливается по часам, и ходы зависят от загрузки машины."""
+    for searcher in (state.searcher, state.white_searcher):
+        if searcher is not None:
+            searcher.tt.clear()
+            searcher.reset_heuristics()
+    state.rng.seed("%d:%d" % (state.seed, index))
+    pos = random_start(state.rng)
+    start = to_fen(pos)
+    moves, times = [], []
+    buf = state.moves
+    result = 'draw'
+    while len(moves) < state.max_plies:
+        if not generate(pos, pos.side, buf):
+            break  # Ходов нет — ничья, как и в поиске
+        started = time.perf_counter()
+        if pos.side == WHITE:
+            move = state.policy(pos, buf, state)
+        else:
+            move = best_move(pos, state.searcher, state.tablebase, state.time_ms, state.depth)
+        times.append(round((time.perf_counter() - started) * 1000.0, 3))
+        if move is None:
+            break
+        moves.append(move_name(move))
+        pos.make_move(move)
+        if pos.kings[BLACK] is None:
+            result = 'white'
+            break
+        if pos.kings[WHITE] is None:
+            result = 'black'
+            break
+    return {
+        'game': index,
+        'seed': state.seed,
+        'white': state.white,
+        'start': start,
+        'moves': moves,
+        'result': result,
+        'plies': len(moves),
+        'ms': times,
+    }
+
+
+def _play_batch(task):
+    """Играет пачку партий и возвращает (число партий по исходам, текст JSONL)"""
+    start, count = task
+    state = _state
+    tally = {'white': 0, 'black': 0, 'draw': 0}
+    lines = []
+    for index in range(start, start + count):
+        record = play_game(index, state)
+        tally[record['result']] += 1
+        lines.append(json.dumps(record, separators=(',', ':')))
+    lines.append('')
+    return tally, "\n".join(lines)
+
+
+def run(games, out, white='random', seed=0, jobs=None, depth=2, time_ms=None, tt_size_mb=1,
+        tablebase_dir=TABLEBASE_DIR, max_plies=MAX_PLIES, batch=BATCH, log=None):
+    """Играет games партий и пишет их в поток out по мере готовности пачек.
+    Возвращает число побед белых, черных и ничьих"""
+    if white not in _POLICY_FUNCS:
+        raise ValueError("Неизвестная политика белых: %r" % white)
+    jobs = jobs or os.cpu_count() or 1
+    init_args = (white, seed, depth, time_ms, tt_size_mb, tablebase_dir, max_plies)
+    tasks = [(start, min(batch, games - start)) for start in range(0, games, batch)]
+    totals = {'white': 0, 'black': 0, 'draw': 0}
+    started = time.perf_counter()
+
+    pool = multiprocessing.Pool(jobs, _init_worker, init_args) if jobs > 1 else None
+    if pool is None:
+        _init_worker(*init_args)
+        results = map(_play_batch, tasks)
+    else:
+        # Порядок пачек в файле не важен: каждая запись несет свой номер партии
+        results = pool.imap_unordered(_play_batch, tasks)
+    try:
+        done = 0
+        for tally, text in results:
+            out.write(text)
+            for key, value in tally.items():
+                totals[key] += value
+            done += sum(tally.values())
+            if log is not None:
+                elapsed = time.perf_counter() - started
+                log("%d/%d партий, %.0f партий/с, белые %d, черные %d, ничьи %d" % (
+                    done, games, done / elapsed if elapsed else 0.0,
+                    totals['white'], totals['black'], totals['draw']))
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетные партии: политика белых против ИИ черных")
+    parser.add_argument('-n', '--games', type=int, default=100, help="число партий")
+    parser.add_argument('-o', '--output', default='-', help="файл JSONL (по умолчанию stdout)")
+    parser.add_argument('--white', choices=POLICIES, default='random', help="политика белых")
+    parser.add_argument('--seed', type=int, default=0, help="зерно; без --time-ms партия N зависит только от зерна и N")
+    parser.add_argument('--jobs', type=int, default=None, help="число процессов (по умолчанию все ядра)")
+    parser.add_argument('--depth', type=int, default=2, help="глубина поиска ИИ")
+    parser.add_argument('--time-ms', type=int, default=None, help="ограничение времени на ход ИИ (партии перестают повторяться)")
+    parser.add_argument('--tt-mb', type=float, default=1, help="размер таблицы транспозиций воркера")
+    parser.add_argument('--max-plies', type=int, default=MAX_PLIES, help="предел длины партии")
+    parser.add_argument('--batch', type=int, default=BATCH, help="партий в одной пачке воркера")
+    parser.add_argument('--tablebases', default=TABLEBASE_DIR, help="каталог эндшпильных таблиц")
+    parser.add_argument('-q', '--quiet', action='store_true', help="не печатать прогресс")
+    args = parser.parse_args(argv)
+
+    def log(message):
+        print(message, file=sys.stderr, flush=True)
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        totals = run(args.games, out, args.white, args.seed, args.jobs, args.depth, args.time_ms,
+                     args.tt_mb, args.tablebases, args.max_plies, args.batch,
+                     None if args.quiet else log)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    log("белые %d, черные %d, ничьи %d" % (totals['white'], totals['black'], totals['draw']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
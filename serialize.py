@@ -0,0 +1,105 @@
+"""Запись позиции: текстовая в духе FEN и упакованная двоичная фиксированной длины.
+
+Текст — восемь горизонталей сверху вниз через '/', цифры — пустые клетки, затем сторона на
+ходу: 'k1p5/8/8/8/2P5/8/3P4/4K3 w'. Двоичная запись — 25 байт: по 3 бита на клетку и байт
+флагов (сторона на ходу, партия окончена). Она однозначна для позиции и служит ключом кэшей.
+"""
+
+from bitboard import Position, WHITE, BLACK, iter_bits
+
+PACKED_SIZE = 25
+_BOARD_BYTES = 24
+
+# Код фигуры в двоичной записи; 0 — пустая клетка
+PIECE_CODES = {'K': 1, 'P': 2, 'Q': 3, 'k': 4, 'p': 5, 'q': 6}
+_CODE_PIECES = (None, 'K', 'P', 'Q', 'k', 'p', 'q', None)
+_FLAG_BLACK = 1
+_FLAG_GAME_OVER = 2
+
+
+def to_fen(pos):
+    """Текстовая запись позиции"""
+    squares = pos.squares
+    rows = []
+    for row in range(8):
+        text = ''
+        empty = 0
+        for piece in squares[row * 8:row * 8 + 8]:
+            if piece:
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                text += piece
+            else:
+                empty += 1
+        if empty:
+            text += str(empty)
+        rows.append(text)
+    return '/'.join(rows) + (' w' if pos.side == WHITE else ' b')
+
+
+def parse_fen(text):
+    """Клетки и сторона на ходу по текстовой записи: (список из 64 клеток, сторона)"""
+    fields = text.split()
+    if not 1 <= len(fields) <= 2 or len(fields) == 2 and fields[1] not in ('w', 'b'):
+        raise ValueError("Неверная запись позиции: %r" % text)
+    rows = fields[0].split('/')
+    squares = []
+    for row in rows:
+        width = 0
+        for ch in row:
+            if ch in '12345678':
+                squares.extend([None] * int(ch))
+                width += int(ch)
+            elif ch in PIECE_CODES:
+                squares.append(ch)
+                width += 1
+            else:
+                raise ValueError("Неверный символ %r в записи позиции: %r" % (ch, text))
+        if width != 8:
+            raise ValueError("В горизонтали не 8 клеток: %r" % text)
+    if len(rows) != 8:
+        raise ValueError("В записи позиции не 8 горизонталей: %r" % text)
+    side = BLACK if len(fields) == 2 and fields[1] == 'b' else WHITE
+    return squares, side
+
+
+def from_fen(text, pos=None):
+    """Позиция по текстовой записи; если передан pos, он заполняется на месте"""
+    squares, side = parse_fen(text)
+    if pos is None:
+        pos = Position()
+    pos.load(squares, side)
+    return pos
+
+
+def pack(pos, game_over=False):
+    """Двоичная запись позиции (PACKED_SIZE байт)"""
+    squares = pos.squares
+    board = 0
+    for sq in iter_bits(pos.occ[WHITE] | pos.occ[BLACK]):
+        board |= PIECE_CODES[squares[sq]] << 3 * sq
+    flags = (_FLAG_BLACK if pos.side == BLACK else 0) | (_FLAG_GAME_OVER if game_over else 0)
+    return board.to_bytes(_BOARD_BYTES, 'little') + bytes((flags,))
+
+
+def unpack(data, pos=None):
+    """Позиция и признак окончания партии по двоичной записи: (pos, game_over).
+    Если передан pos, он заполняется на месте"""
+    if len(data) != PACKED_SIZE:
+        raise ValueError("Двоичная запись позиции должна быть %d байт, а не %d" % (PACKED_SIZE, len(data)))
+    board = int.from_bytes(data[:_BOARD_BYTES], 'little')
+    squares = [None] * 64
+    while board:
+        low = board & -board
+        sq = (low.bit_length() - 1) // 3
+        piece = _CODE_PIECES[board >> 3 * sq & 7]
+        if piece is None:
+            raise ValueError("Неверный код фигуры в двоичной записи позиции")
+        squares[sq] = piece
+        board &= ~(7 << 3 * sq)
+    flags = data[_BOARD_BYTES]
+    if pos is None:
+        pos = Position()
+    pos.load(squares, BLACK if flags & _FLAG_BLACK else WHITE)
+    return pos, bool(flags & _FLAG_GAME_OVER)
@@ -0,0 +1,427 @@
+"""Игровой сервер на asyncio: много партий с ИИ в одном процессе.
+
+Клиенты подключаются по TCP или к Unix-сокету и обмениваются строками текста. Вход — через
+то же хранилище пользователей и те же правила, что у окна входа. После входа клиент открывает
+партии (до --max-sessions на соединение) и ходит в них за белых; ход черных ищется в пуле
+процессов, а вход и регистрация (хранилище, fsync, шифрование пароля) идут в нескольких
+отдельных потоках, так что цикл событий занят только разбором команд.
+
+Ходы ИИ проходят через общую очередь ограниченной длины. У партии в очереди не больше одного
+хода (пока ИИ думает, следующий ход в этой партии отклоняется), поэтому очередь обслуживает
+партии по кругу и одна партия не может занять весь пул. Когда очередь заполнена, сервер
+перестает читать команды соединения, которое прислало ход, и TCP сам притормаживает клиента.
+
+Команды (ответ — одна строка):
+    register <логин> <пароль>   -> ok | error <текст>
+    login <логин> <пароль>      -> ok | error <текст>
+    new [<зерно>]               -> game <id> <позиция>
+    move <id> <ход>             -> moved <id> <ход ИИ> <позиция> | over <id> <итог> <ход ИИ или -> <позиция>
+    fen <id>                    -> fen <id> <позиция>
+    close <id>                  -> ok
+    stats                       -> stats <JSON>
+    quit
+
+Позиция — текстовая запись serialize ('4k3/8/8/8/8/3p1PP1/8/6K1 w'), ход — 'e2e4',
+итог — white, black или draw. Ответ на move приходит, когда сходил ИИ; пока он думает,
+соединение может слать команды в другие партии.
+
+С --log-dir каждая партия пишется в отдельный файл этого каталога (gamelog) вместе с замерами
+ходов ИИ, сделанными в процессе ИИ. replay.py проигрывает такие записи, но ходы поиска в них
+не проверяет: процесс ИИ делит таблицу транспозиций между партиями.
+
+Запуск: python server.py [--port 8765 | --unix PATH] [--jobs N] [--queue 256] [--ai-depth 3]
+                         [--log-dir DIR]
+"""
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import json
+import os
+import random
+import sys
+import time
+
+from bitboard import WHITE, BLACK
+from movegen import generate, move_name, parse_move
+from engine import random_start, timed_best_move
+from search import Searcher
+from serialize import to_fen, pack, unpack
+from tt import TranspositionTable
+from tablebase import Tablebase, TABLEBASE_DIR
+from userstore import open_user_store, BACKENDS
+from accounts import register_user, check_login
+from netstats import percentile, PORT
+from gamelog import open_log
+
+QUEUE_SIZE = 256  # Ходов ИИ, ждущих своей очереди
+MAX_SESSIONS = 64  # Партий на одно соединение
+MAX_PLIES = 200  # Партия длиннее считается ничьей
+LATENCY_SAMPLES = 10000  # Последние задержки ходов для stats
+AUTH_THREADS = 4  # Потоков входа и регистрации (у хранилища journal; у остальных — один)
+
+# ---------- Воркеры ИИ ----------
+
+_searcher = None
+_tablebase = None
+_limits = None
+
+
+def _init_worker(time_ms, depth, tt_size_mb, tablebase_dir):
+    global _searcher, _tablebase, _limits
+    _searcher = Searcher(TranspositionTable(tt_size_mb))
+    _tablebase = Tablebase(tablebase_dir) if tablebase_dir else None
+    _limits = (time_ms, depth)
+
+
+def _think(data):
+    """Ход стороны на ходу в позиции из двоичной записи (None — хода нет) с замерами поиска:
+    (ход, мс, глубина, мс поиска, откуда, узлы) — см. engine.timed_best_move"""
+    pos, _ = unpack(data)
+    return timed_best_move(pos, _searcher, _tablebase, *_limits)
+
+
+class AiQueue:
+    """Очередь ходов ИИ ограниченной длины перед пулом из jobs процессов"""
+
+    def __init__(self, jobs, size, time_ms, depth, tt_size_mb, tablebase_dir):
+        self.jobs = jobs
+        self.time_ms = time_ms
+        self.depth = depth
+        self.tt_size_mb = tt_size_mb
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            jobs, initializer=_init_worker, initargs=(time_ms, depth, tt_size_mb, tablebase_dir))
+        self.queue = asyncio.Queue(size)
+        self.busy = 0
+        self.done = 0
+        self._workers = [asyncio.ensure_future(self._work()) for _ in range(jobs)]
+
+    async def submit(self, data):
+        """Ставит позицию в очередь (ждет места, если очередь полна) и возвращает future с ходом
+        и замерами (см. _think)"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((data, future))
+        return future
+
+    async def _work(self):
+        # В пуле не больше jobs задач одновременно, остальные ждут в очереди по порядку
+        loop = asyncio.get_running_loop()
+        while True:
+            data, future = await self.queue.get()
+            self.busy += 1
+            try:
+                move = await loop.run_in_executor(self.executor, _think, data)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(move)
+            finally:
+                self.busy -= 1
+                self.done += 1
+
+    def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ---------- Партии и соединения ----------
+
+class GameSession:
+    """Партия одного соединения: белые — клиент, черные — ИИ"""
+
+    def __init__(self, game_id, pos, log=None):
+        self.id = game_id
+        self.pos = pos
+        self.log = log  # Запись партии (gamelog.GameLog) или None
+        self.plies = 0
+        self.result = None  # 'white', 'black' или 'draw', когда партия окончена
+        self.thinking = False  # Ход ИИ в очереди или в пуле
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+
+
+class Connection:
+    def __init__(self, writer):
+        self.writer = writer
+        self.user = None
+        self.sessions = {}
+        self.next_id = 1
+        self.closed = False
+
+    def send(self, line):
+        if not self.closed:
+            self.writer.write((line + "\n").encode('utf-8'))
+
+
+class GameServer:
+    """Команды клиентов, партии и общая очередь ходов ИИ"""
+
+    def __init__(self, store, ai, auth, max_sessions=MAX_SESSIONS, max_plies=MAX_PLIES, log_dir=None):
+        self.store = store
+        self.ai = ai
+        self.auth = auth  # Потоки, в которых идут обращения к store (ThreadPoolExecutor)
+        self.log_dir = log_dir
+        self.max_sessions = max_sessions
+        self.max_plies = max_plies
+        self.connections = 0
+        self.sessions = 0
+        self.moves = 0
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.started = time.perf_counter()
+        self.handlers = {
+            'register': self.cmd_register,
+            'login': self.cmd_login,
+            'new': self.cmd_new,
+            'move': self.cmd_move,
+            'fen': self.cmd_fen,
+            'close': self.cmd_close,
+            'stats': self.cmd_stats,
+        }
+
+    async def handle(self, reader, writer):
+        conn = Connection(writer)
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                words = line.decode('utf-8', 'replace').split()
+                if not words:
+                    continue
+                if words[0] == 'quit':
+                    break
+                handler = self.handlers.get(words[0])
+                try:
+                    if handler is None:
+                        raise ValueError("неизвестная команда %s" % words[0])
+                    await handler(conn, words[1:])
+                except ValueError as e:
+                    conn.send("error %s" % e)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            conn.closed = True
+            self.connections -= 1
+            self.sessions -= len(conn.sessions)
+            for session in conn.sessions.values():
+                session.close()
+            conn.sessions.clear()
+            writer.close()
+
+    async def _with_store(self, func, *args):
+        """func(store, *args) в потоках входа: чтение хранилища, fsync и шифрование пароля
+        не останавливают цикл событий, а с ним и остальные соединения"""
+        return await asyncio.get_running_loop().run_in_executor(self.auth, func, self.store, *args)
+
+    # ---------- Команды ----------
+
+    async def cmd_register(self, conn, args):
+        if len(args) != 2:
+            raise ValueError("register <логин> <пароль>")
+        error = await self._with_store(register_user, *args)
+        conn.send("ok" if error is None else "error %s" % error)
+
+    async def cmd_login(self, conn, args):
+        if len(args) != 2:
+            raise ValueError("login <логин> <пароль>")
+        if not await self._with_store(check_login, *args):
+            raise ValueError("Неверный логин или пароль!")
+        conn.user = args[0]
+        conn.send("ok")
+
+    def _session(self, conn, args, count):
+        if conn.user is None:
+            raise ValueError("сначала login")
+        if len(args) != count:
+            raise ValueError("неверное число аргументов")
+        session = conn.sessions.get(args[0])
+        if session is None:
+            raise ValueError("нет партии %s" % args[0])
+        return session
+
+    async def cmd_new(self, conn, args):
+        if conn.user is None:
+            raise ValueError("сначала login")
+        if len(conn.sessions) >= self.max_sessions:
+            raise ValueError("не больше %d партий на соединение" % self.max_sessions)
+        seed = int(args[0]) if args else random.getrandbits(32)
+        pos = random_start(random.Random(seed))
+        log = None
+        if self.log_dir:
+            # Файл открывается на каждую строку: тысячи партий не держат тысячи открытых файлов
+            # shared_tt: таблицу транспозиций процесс ИИ делит между партиями (replay.py)
+            log = open_log(self.log_dir, to_fen(pos), seed, keep_open=False, user=conn.user,
+                           time_ms=self.ai.time_ms, depth=self.ai.depth, tt_mb=self.ai.tt_size_mb,
+                           shared_tt=True)
+        session = GameSession(str(conn.next_id), pos, log)
+        conn.next_id += 1
+        conn.sessions[session.id] = session
+        self.sessions += 1
+        conn.send("game %s %s" % (session.id, to_fen(session.pos)))
+
+    async def cmd_fen(self, conn, args):
+        session = self._session(conn, args, 1)
+        conn.send("fen %s %s" % (session.id, to_fen(session.pos)))
+
+    async def cmd_close(self, conn, args):
+        session = self._session(conn, args, 1)
+        del conn.sessions[session.id]
+        session.close()
+        self.sessions -= 1
+        conn.send("ok")
+
+    async def cmd_move(self, conn, args):
+        session = self._session(conn, args, 2)
+        if session.result is not None:
+            raise ValueError("партия %s окончена" % session.id)
+        if session.thinking:
+            raise ValueError("в партии %s думает ИИ" % session.id)
+        started = time.perf_counter()
+        move = parse_move(args[1])
+        pos = session.pos
+        legal = []
+        generate(pos, WHITE, legal)
+        if pos.side != WHITE or move not in legal:
+            raise ValueError("недопустимый ход %s" % args[1])
+        pos.make_move(move)
+        session.plies += 1
+        if session.log is not None:
+            session.log.move(move_name(move))
+        if self._finished(session):
+            self._reply(conn, session, None, started)
+            return
+        session.thinking = True
+        # Ожидание места в очереди задерживает чтение следующих команд этого соединения
+        future = await self.ai.submit(pack(pos))
+        asyncio.ensure_future(self._answer(conn, session, future, started))
+
+    async def _answer(self, conn, session, future, started):
+        try:
+            move, *timing = await future
+        except Exception as e:
+            session.thinking = False
+            conn.send("error %s ИИ: %s" % (session.id, e))
+            return
+        session.thinking = False
+        if conn.closed:
+            return
+        pos = session.pos
+        if move is not None:
+            pos.make_move(move)
+            session.plies += 1
+            if session.log is not None:
+                session.log.ai_move(move_name(move), *timing)
+        self._finished(session)
+        self._reply(conn, session, move, started)
+        try:
+            await conn.writer.drain()
+        except ConnectionError:
+            pass
+
+    def _finished(self, session):
+        """Проверяет конец партии после хода и запоминает итог"""
+        pos = session.pos
+        if pos.kings[BLACK] is None:
+            session.result = 'white'
+        elif pos.kings[WHITE] is None:
+            session.result = 'black'
+        elif session.plies >= self.max_plies or not generate(pos, pos.side, []):
+            session.result = 'draw'
+        if session.result is not None and session.log is not None:
+            session.log.finish(session.result)
+        return session.result is not None
+
+    def _reply(self, conn, session, move, started):
+        self.moves += 1
+        self.latencies.append((time.perf_counter() - started) * 1000.0)
+        name = move_name(move) if move is not None else '-'
+        if session.result is None:
+            conn.send("moved %s %s %s" % (session.id, name, to_fen(session.pos)))
+        else:
+            conn.send("over %s %s %s %s" % (session.id, session.result, name, to_fen(session.pos)))
+
+    async def cmd_stats(self, conn, args):
+        elapsed = time.perf_counter() - self.started
+        latencies = list(self.latencies)
+        stats = {
+            'connections': self.connections,
+            'sessions': self.sessions,
+            'moves': self.moves,
+            'moves_per_s': self.moves / elapsed if elapsed else 0.0,
+            'queue': self.ai.queue.qsize(),
+            'queue_size': self.ai.queue.maxsize,
+            'ai_busy': self.ai.busy,
+            'ai_done': self.ai.done,
+            'jobs': self.ai.jobs,
+        }
+        if latencies:
+            stats.update({'p50_ms': percentile(latencies, 50), 'p95_ms': percentile(latencies, 95),
+                          'p99_ms': percentile(latencies, 99), 'max_ms': max(latencies)})
+        conn.send("stats %s" % json.dumps(stats, separators=(',', ':')))
+
+
+async def serve(args):
+    jobs = args.jobs or os.cpu_count() or 1
+    loop = asyncio.get_running_loop()
+    # Соединение SQLite работает только в потоке, где открыто, а json переписывается целиком,
+    # поэтому им — один поток, в котором хранилище и открывается; journal сам блокирует записи
+    auth = concurrent.futures.ThreadPoolExecutor(
+        AUTH_THREADS if args.backend == 'journal' else 1, thread_name_prefix='auth')
+    store = await loop.run_in_executor(
+        auth, functools.partial(open_user_store, args.backend, migrate_from=None, path=args.store))
+    ai = AiQueue(jobs, args.queue, args.ai_time_ms, args.ai_depth, args.tt_mb,
+                 None if args.no_tablebases else args.tablebases)
+    game_server = GameServer(store, ai, auth, args.max_sessions, log_dir=args.log_dir)
+    if args.unix:
+        server = await asyncio.start_unix_server(game_server.handle, args.unix, backlog=args.backlog)
+        where = args.unix
+    else:
+        server = await asyncio.start_server(game_server.handle, args.host, args.port, backlog=args.backlog)
+        where = "%s:%d" % (args.host, args.port)
+    print("сервер слушает %s, процессов ИИ %d" % (where, jobs), file=sys.stderr, flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        ai.close()
+        await loop.run_in_executor(auth, store.close)
+        auth.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сервер партий с ИИ на asyncio")
+    parser.add_argument('--host', default='127.0.0.1', help="адрес TCP")
+    parser.add_argument('--port', type=int, default=PORT, help="порт TCP")
+    parser.add_argument('--unix', default=None, help="путь Unix-сокета вместо TCP")
+    parser.add_argument('--backlog', type=int, default=1024, help="очередь входящих соединений")
+    parser.add_argument('--jobs', type=int, default=None, help="процессов ИИ (по умолчанию все ядра)")
+    parser.add_argument('--queue', type=int, default=QUEUE_SIZE, help="ходов ИИ в очереди")
+    parser.add_argument('--max-sessions', type=int, default=MAX_SESSIONS, help="партий на соединение")
+    parser.add_argument('--ai-depth', type=int, default=3, help="глубина поиска ИИ")
+    parser.add_argument('--ai-time-ms', type=int, default=None, help="ограничение времени на ход ИИ")
+    parser.add_argument('--tt-mb', type=float, default=4, help="таблица транспозиций процесса ИИ")
+    parser.add_argument('--backend', choices=BACKENDS, default='sqlite', help="хранилище пользователей")
+    parser.add_argument('--store', default=None, help="файл хранилища (по умолчанию стандартный)")
+    parser.add_argument('--log-dir', default=None, help="каталог записей партий (по умолчанию не пишутся)")
+    tables = parser.add_mutually_exclusive_group()
+    tables.add_argument('--tablebases', default=TABLEBASE_DIR, help="каталог эндшпильных таблиц")
+    tables.add_argument('--no-tablebases', action='store_true', help="не использовать эндшпильные таблицы")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""Стартовые расстановки: перечисление всех допустимых и равномерный выбор по номеру.
+
+Ограничения те же, что у прежней расстановки в init_board: черный король в верхней половине
+доски, белый — в нижней и не рядом с черным, пешки на горизонталях 3-6, белые пешки не рядом
+с черным королем, все фигуры на разных клетках. Белые пешки одинаковы, поэтому пара клеток
+для них считается одной расстановкой.
+
+Расстановки не хранятся: для каждой пары клеток королей запоминается, сколько расстановок с ней
+начинается (накопленная сумма), а остальное восстанавливается из номера комбинаторно. Выбор —
+один вызов randrange, двоичный поиск по таблице из тысячи пар и разбор номера.
+"""
+
+import bisect
+import random
+from array import array
+
+from bitboard import Position, KING_ATTACKS, square
+
+PAWN_SQUARES = tuple(square(r, c) for r in range(2, 6) for c in range(8))  # Горизонтали 3-6
+BLACK_KING_SQUARES = tuple(square(r, c) for r in range(0, 4) for c in range(8))
+WHITE_KING_SQUARES = tuple(square(r, c) for r in range(4, 8) for c in range(8))
+
+
+class StartSampler:
+    """Нумерация допустимых стартовых расстановок и равномерный выбор среди них"""
+
+    def __init__(self):
+        self.kings = []  # (клетка черного короля, клетка белого короля)
+        self.cumulative = array('Q')  # Число расстановок с парами королей 0..i включительно
+        total = 0
+        for bk in BLACK_KING_SQUARES:
+            near = KING_ATTACKS[bk] | 1 << bk
+            for wk in WHITE_KING_SQUARES:
+                if near >> wk & 1:
+                    continue
+                white_pawns = len(self._white_pawn_squares(bk, wk))
+                total += white_pawns * (white_pawns - 1) // 2 * self._black_pawn_choices(bk, wk)
+                self.kings.append((bk, wk))
+                self.cumulative.append(total)
+        self.count = total
+
+    def __len__(self):
+        return self.count
+
+    @staticmethod
+    def _white_pawn_squares(bk, wk):
+        near = KING_ATTACKS[bk] | 1 << bk | 1 << wk
+        return [sq for sq in PAWN_SQUARES if not near >> sq & 1]
+
+    @staticmethod
+    def _black_pawn_choices(bk, wk):
+        # Черная пешка — на любой свободной клетке горизонталей 3-6, кроме двух белых пешек
+        return len(PAWN_SQUARES) - (bk in PAWN_SQUARES) - (wk in PAWN_SQUARES) - 2
+
+    def layout(self, index):
+        """Расстановка с номером index: (черный король, белый король, белые пешки, черная пешка)"""
+        if not 0 <= index < self.count:
+            raise IndexError("Номер расстановки вне диапазона: %d" % index)
+        pair = bisect.bisect_right(self.cumulative, index)
+        bk, wk = self.kings[pair]
+        index -= self.cumulative[pair - 1] if pair else 0
+        pawns_index, black_index = divmod(index, self._black_pawn_choices(bk, wk))
+
+        # Номер пары белых пешек в лексикографическом порядке сочетаний
+        allowed = self._white_pawn_squares(bk, wk)
+        first = 0
+        while pawns_index >= len(allowed) - 1 - first:
+            pawns_index -= len(allowed) - 1 - first
+            first += 1
+        white_pawns = (allowed[first], allowed[first + 1 + pawns_index])
+
+        taken = (bk, wk) + white_pawns
+        for sq in PAWN_SQUARES:
+            if sq in taken:
+                continue
+            if not black_index:
+                return bk, wk, white_pawns, sq
+            black_index -= 1
+        raise AssertionError("таблица расстановок не согласована")
+
+    def position(self, index):
+        """Позиция с расстановкой номер index (ход белых)"""
+        bk, wk, white_pawns, bp = self.layout(index)
+        pos = Position()
+        pos.put("K", wk)
+        for sq in white_pawns:
+            pos.put("P", sq)
+        pos.put("k", bk)
+        pos.put("p", bp)
+        return pos
+
+    def sample(self, rng=random):
+        """Равномерно случайная расстановка; rng — random.Random с нужным зерном"""
+        return self.position(rng.randrange(self.count))
+
+
+_sampler = None
+
+
+def default_sampler():
+    """Общий экземпляр: таблица строится один раз на процесс при первом обращении"""
+    global _sampler
+    if _sampler is None:
+        _sampler = StartSampler()
+    return _sampler
@@ -0,0 +1,700 @@
+"""Эндшпильные таблицы для семейства K+2P против K+P (включая ферзей после превращения).
+
+Таблица одного набора материала строится ретроградным анализом: сначала позиции, где
+сторона на ходу бьет короля, затем уровень за уровнем позиции-предшественники. Результат —
+по одному байту на позицию, файл открывается через mmap, поэтому проба стоит одного расчета
+индекса и одного чтения байта.
+
+Хранятся только позиции с ходом белых: позиция с ходом черных после смены цветов и отражения
+доски по горизонтали — позиция с ходом белых набора с переставленными сторонами (KvKP для
+KPvK), поэтому такие наборы строятся парой. Кроме того, белый король отражением по вертикали
+приводится к левой половине доски (без пешек — отражениями и поворотами к треугольнику из 10
+клеток), а одинаковые фигуры нумеруются сочетаниями клеток. Семейство KPPvKP — 27 таблиц и
+2,53 млрд позиций (без симметрий было 8,87 млрд; самая большая, KPQvKQ, — 403 млн).
+
+Генерация держит в памяти только порции: значения и счетчики ходов лежат в файлах через mmap,
+позиции, решенные на уровне, и отложенные события — в файлах по уровням во временном каталоге.
+
+Запуск: python tablebase.py [--dir tablebases] [--jobs N] [KPPvKP ...]
+"""
+
+import argparse
+import itertools
+import mmap
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from array import array
+
+from bitboard import Position, WHITE, BLACK, KING_STEPS, RAYS, iter_bits
+from movegen import generate
+
+# Значение байта: 0 — ничья, 1..126 — выигрыш стороны на ходу (взятие короля через N полуходов),
+# 128 + N — проигрыш через N полуходов, 255 — невозможная позиция
+DRAW = 0
+MAX_DISTANCE = 126
+LOSS_BASE = 128
+INVALID = 255
+
+MAGIC = b'KTB2'
+HEADER_SIZE = 16
+TABLEBASE_DIR = 'tablebases'
+FAMILY_ROOT = 'KPPvKP'
+
+CHUNK = 4096  # Позиций границы уровня в одной задаче воркера
+SCAN_CHUNK = CHUNK * 16  # Позиций в одной задаче первичного прохода
+BUFFER = 1 << 16  # Номеров в буфере списка уровня до записи в файл
+
+
+def is_win(value):
+    return 0 < value <= MAX_DISTANCE
+
+
+def is_loss(value):
+    return LOSS_BASE < value < INVALID
+
+
+def distance_of(value):
+    """Число полуходов до взятия короля (0 для ничьей)"""
+    if is_win(value):
+        return value
+    if is_loss(value):
+        return value - LOSS_BASE
+    return 0
+
+
+def signature_of(pos):
+    """Набор материала позиции, например 'KPPvKP'"""
+    counts = pos.counts
+    return ('K' + 'P' * counts['P'] + 'Q' * counts['Q'] + 'v'
+            + 'K' + 'P' * counts['p'] + 'Q' * counts['q'])
+
+
+def parse_signature(signature):
+    """Фигуры по слотам: белый король, черный король, остальные белые, остальные черные"""
+    white, black = signature.upper().split('V')
+    if white[:1] != 'K' or black[:1] != 'K':
+        raise ValueError("Неверный набор материала: %s" % signature)
+    return ('K', 'k') + tuple(sorted(white[1:])) + tuple(sorted(black[1:].lower()))
+
+
+def family(root=FAMILY_ROOT):
+    """Все наборы материала, достижимые из root взятиями и превращениями (сначала меньшие)"""
+    seen = set()
+    order = []
+
+    def visit(signature):
+        if signature in seen:
+            return
+        seen.add(signature)
+        for child in successor_signatures(signature):
+            visit(child)
+        order.append(signature)
+
+    visit(root)
+    return order
+
+
+def successor_signatures(signature):
+    """Наборы материала после одного взятия или превращения"""
+    white, black = signature.split('v')
+    result = set()
+    for side, other, make in ((white, black, lambda w, b: w + 'v' + b), (black, white, lambda b, w: w + 'v' + b)):
+        extras = side[1:]
+        for i, piece in enumerate(extras):
+            # Фигуру могут взять
+            result.add(make('K' + ''.join(sorted(extras[:i] + extras[i + 1:])), other))
+            if piece == 'P':
+                result.add(make('K' + ''.join(sorted(extras[:i] + 'Q' + extras[i + 1:])), other))
+    return sorted(result)
+
+
+def _transform(fn):
+    return tuple(fn(sq) for sq in range(64))
+
+
+# Симметрии доски, которые не меняют правил: отражение по вертикали (a <-> h) сохраняет ходы
+# пешек, а без пешек годятся все 8 отражений и поворотов квадрата
+_IDENTITY = _transform(lambda sq: sq)
+_FILE_MIRROR = _transform(lambda sq: sq ^ 7)
+FILE_SYMMETRIES = (_IDENTITY, _FILE_MIRROR)
+BOARD_SYMMETRIES = tuple(
+    _transform(lambda sq, flip=flip, diagonal=diagonal: ((sq & 7) << 3 | sq >> 3 if diagonal else sq) ^ flip)
+    for diagonal in (False, True) for flip in (0, 7, 56, 63)
+)
+
+
+def flipped_signature(signature):
+    """Набор материала с переставленными сторонами: KvKP для KPvK"""
+    white, black = signature.split('v')
+    return black + 'v' + white
+
+
+def table_signature(pos):
+    """Набор, в таблице которого лежит позиция: при ходе черных — с переставленными сторонами"""
+    signature = signature_of(pos)
+    return signature if pos.side == WHITE else flipped_signature(signature)
+
+
+_combinations = {}
+
+
+def _codes(squares, count):
+    """Сочетания count клеток из squares по возрастанию и их номера"""
+    key = (squares, count)
+    if key not in _combinations:
+        codes = list(itertools.combinations(squares, count))
+        _combinations[key] = (codes, {code: i for i, code in enumerate(codes)})
+    return _combinations[key]
+
+
+class Layout:
+    """Нумерация позиций одного набора материала с ходом белых (позиция с ходом черных
+    хранится в наборе с переставленными сторонами, см. squares_of).
+
+    Индекс — смешанная система счисления по разрядам: белый король, затем группы одинаковых
+    фигур. Белый король симметрией доски приводится к наименьшей клетке своей орбиты: 32 клетки
+    левой половины доски, без пешек — 10 клеток треугольника. Группа одинаковых фигур — номер
+    сочетания их клеток; пешки занимают только горизонтали 2-7 (48 клеток), остальные — все 64.
+    Совпадающие клетки разных фигур и позиции, которые симметрия переводит в другой номер
+    (король на диагонали), остаются в таблице как невозможные."""
+
+    def __init__(self, signature):
+        self.pieces = parse_signature(signature)
+        self.signature = signature_of_pieces(self.pieces)
+        self.flipped = flipped_signature(self.signature)
+        pawns = 'P' in self.pieces or 'p' in self.pieces
+        symmetries = FILE_SYMMETRIES if pawns else BOARD_SYMMETRIES
+        # Для каждой клетки белого короля — симметрии, переводящие её в наименьшую клетку орбиты
+        self.king_symmetries = []
+        for sq in range(64):
+            target = min(t[sq] for t in symmetries)
+            self.king_symmetries.append(tuple(t for t in symmetries if t[sq] == target))
+        king_squares = tuple(sorted(set(t[sq] for sq in range(64) for t in self.king_symmetries[sq])))
+
+        self.digits = [(0, 1) + _codes(king_squares, 1)]
+        start = 1
+        while start < len(self.pieces):
+            end = start + 1
+            while end < len(self.pieces) and self.pieces[end] == self.pieces[start]:
+                end += 1
+            squares = tuple(range(8, 56)) if self.pieces[start] in ('P', 'p') else tuple(range(64))
+            self.digits.append((start, end) + _codes(squares, end - start))
+            start = end
+        self.groups = [(start, end) for start, end, _, _ in self.digits if end - start > 1]
+        self.multipliers = []
+        mult = 1
+        for _, _, codes, _ in self.digits:
+            self.multipliers.append(mult)
+            mult *= len(codes)
+        self.size = mult
+        # Слот фигуры после смены цветов: короли меняются местами, белые фигуры и черные тоже
+        white = sum(1 for p in self.pieces[2:] if p.isupper())
+        black = len(self.pieces) - 2 - white
+        self.flip_slots = (1, 0) + tuple(range(2 + white, 2 + white + black)) + tuple(range(2, 2 + white))
+
+    def index(self, squares):
+        """Номер позиции по клеткам фигур (после canonical)"""
+        idx = 0
+        for (start, end, _, ranks), mult in zip(self.digits, self.multipliers):
+            idx += mult * ranks[tuple(squares[start:end])]
+        return idx
+
+    def decode(self, idx):
+        """Клетки фигур по слотам"""
+        squares = []
+        for _, _, codes, _ in self.digits:
+            idx, code = divmod(idx, len(codes))
+            squares.extend(codes[code])
+        return squares
+
+    def canonical(self, squares):
+        """Клетки той же позиции после симметрии, приводящей её к нумерации"""
+        best = None
+        for t in self.king_symmetries[squares[0]]:
+            image = [t[sq] for sq in squares]
+            for start, end in self.groups:
+                image[start:end] = sorted(image[start:end])
+            if best is None or image < best:
+                best = image
+        return best
+
+    def is_valid(self, squares):
+        return len(set(squares)) == len(squares) and self.canonical(squares) == squares
+
+    def flip(self, squares):
+        """Клетки позиции с ходом черных как позиции с ходом белых набора self.flipped
+        (смена цветов и отражение по горизонтали)"""
+        return [squares[slot] ^ 56 for slot in self.flip_slots]
+
+    def squares_of(self, pos):
+        """Клетки фигур позиции по слотам этой нумерации. Позиция с ходом черных читается со
+        сменой цветов, поэтому её нумерация — нумерация набора с переставленными сторонами"""
+        bb = pos.bb
+        black = pos.side == BLACK
+        squares = []
+        previous = None
+        for piece in self.pieces:
+            if piece != previous:
+                found = iter_bits(bb[piece.swapcase()] if black else bb[piece])
+                previous = piece
+            squares.append(next(found) ^ 56 if black else next(found))
+        return squares
+
+    def index_of(self, pos):
+        return self.index(self.canonical(self.squares_of(pos)))
+
+    def position(self, squares):
+        pos = Position()
+        for piece, sq in zip(self.pieces, squares):
+            pos.put(piece, sq)
+        return pos
+
+
+def signature_of_pieces(pieces):
+    white = ''.join(p for p in pieces if p.isupper())
+    black = ''.join(p for p in pieces if p.islower()).upper()
+    return white + 'v' + black
+
+
+_layouts = {}
+
+
+def layout_for(signature):
+    layout = _layouts.get(signature)
+    if layout is None:
+        layout = _layouts[signature] = Layout(signature)
+    return layout
+
+
+def table_path(directory, signature):
+    return os.path.join(directory, signature + '.ktb')
+
+
+class Tablebase:
+    """Набор таблиц из каталога; файлы открываются через mmap при первом обращении"""
+
+    def __init__(self, directory=TABLEBASE_DIR):
+        self.directory = directory
+        self._tables = {}
+
+    def _table(self, signature):
+        if signature in self._tables:
+            return self._tables[signature]
+        table = None
+        path = table_path(self.directory, signature)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                table = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if table[:4] != MAGIC or table[4:HEADER_SIZE].rstrip(b'\0').decode() != signature:
+                table.close()
+                raise ValueError("Поврежденный файл таблицы: %s" % path)
+        self._tables[signature] = table
+        return table
+
+    def has(self, signature):
+        return self._table(signature) is not None
+
+    def probe_index(self, signature, idx):
+        table = self._table(signature)
+        if table is None:
+            return None
+        return table[HEADER_SIZE + idx]
+
+    def probe(self, pos):
+        """Значение позиции для стороны на ходу или None, если таблицы нет"""
+        if pos.kings[WHITE] is None or pos.kings[BLACK] is None:
+            return None
+        signature = table_signature(pos)
+        table = self._table(signature)
+        if table is None:
+            return None
+        return table[HEADER_SIZE + layout_for(signature).index_of(pos)]
+
+    def best_move(self, pos):
+        """Лучший по таблицам ход стороны pos.side: (ход, значение) или None.
+
+        Выигрыш выбирается самый быстрый, проигрыш — самый долгий."""
+        if self.probe(pos) is None:
+            return None
+        side = pos.side
+        enemy_king = pos.kings[side ^ 1]
+        moves = []
+        generate(pos, side, moves)
+        best = None
+        best_rank = None
+        for move in moves:
+            if move >> 6 & 63 == enemy_king:
+                return move, 1
+            pos.make_move(move)
+            child = self.probe(pos)
+            pos.unmake_move()
+            if child is None or child == INVALID:
+                return None
+            # Ранг хода: выигрыш (быстрее лучше), ничья, проигрыш (дольше лучше)
+            if is_loss(child):
+                rank = (2, -distance_of(child))
+                value = distance_of(child) + 1
+            elif is_win(child):
+                rank = (0, distance_of(child))
+                value = LOSS_BASE + distance_of(child) + 1
+            else:
+                rank = (1, 0)
+                value = DRAW
+            if best_rank is None or rank > best_rank:
+                best, best_rank = (move, value), rank
+        return best
+
+    def close(self):
+        for table in self._tables.values():
+            if table is not None:
+                table.close()
+        self._tables.clear()
+
+
+# ===================== Генерация =====================
+
+# Позиции пары наборов (набор и он же с переставленными сторонами) нумеруются вместе:
+# id = индекс << 1 | t, где t — номер таблицы пары (у симметричного набора вроде KPvKP она одна)
+
+# Типы отложенных событий от ходов, которые меняют набор материала
+CHILD_LOSS = 0  # Соперник после хода проигрывает — позиция выиграна
+CHILD_WIN = 1  # Соперник после хода выигрывает — одним неопровергнутым ходом меньше
+
+_worker_tables = None
+
+
+def _init_worker(directory):
+    global _worker_tables
+    _worker_tables = Tablebase(directory)
+
+
+def _scan_chunk(args):
+    """Первичный проход по позициям [start, stop) таблицы t: невозможные позиции, немедленные
+    взятия короля, число ходов и значения ходов в другие наборы материала"""
+    signatures, t, start, stop = args
+    layout = layout_for(signatures[t])
+    target = layout_for(layout.flipped)
+    tables = _worker_tables
+    values = bytearray(stop - start)
+    counts = bytearray(stop - start)
+    wins = array('Q')
+    events = {}  # Уровень -> id << 1 | тип события
+    moves = []
+    for idx in range(start, stop):
+        squares = layout.decode(idx)
+        if not layout.is_valid(squares):
+            values[idx - start] = INVALID
+            continue
+        pos = layout.position(squares)
+        if pos.attacks[WHITE] >> pos.kings[BLACK] & 1:
+            values[idx - start] = 1
+            wins.append(idx << 1 | t)
+            continue
+        generate(pos, WHITE, moves)
+        occupied = pos.occupied
+        # Ходы в позиции той же пары считаются по различным потомкам: симметричные ходы ведут
+        # в одну запись, а обратный проход снимает с предшественника по одному ходу за потомка
+        children = set()
+        captures = 0
+        for move in moves:
+            from_sq = move & 63
+            to_sq = move >> 6 & 63
+            promotes = to_sq < 8 and pos.squares[from_sq] == 'P'
+            if not (occupied >> to_sq & 1 or promotes):
+                child = list(squares)
+                child[squares.index(from_sq)] = to_sq
+                children.add(target.index(target.canonical(layout.flip(child))))
+                continue
+            captures += 1
+            pos.make_move(move)
+            child = tables.probe(pos)
+            if child is None:
+                raise RuntimeError("Нет таблицы %s, нужной для %s" % (table_signature(pos), signatures[t]))
+            pos.unmake_move()
+            if is_loss(child):
+                kind = CHILD_LOSS
+            elif is_win(child):
+                kind = CHILD_WIN
+            else:
+                continue
+            level = distance_of(child)
+            if level not in events:
+                events[level] = array('Q')
+            events[level].append((idx << 1 | t) << 1 | kind)
+        counts[idx - start] = len(children) + captures
+    return t, start, bytes(values), bytes(counts), wins, events
+
+
+def predecessors(layout, squares):
+    """Индексы (без повторов) позиций таблицы layout.flipped, из которых в позицию squares
+    ведет ход без взятия и превращения. В squares ходят белые, значит, перед этим ходили
+    черные: их ход отменяется, и позиция с ходом черных переводится в нумерацию layout.flipped"""
+    target = layout_for(layout.flipped)
+    occupied = 0
+    for sq in squares:
+        occupied |= 1 << sq
+    result = set()
+    for slot, piece in enumerate(layout.pieces):
+        if piece.isupper():
+            continue
+        sq = squares[slot]
+        if piece == 'k':
+            origins = [t for t in KING_STEPS[sq] if not occupied >> t & 1]
+        elif piece == 'q':
+            origins = []
+            for ray in RAYS[sq]:
+                for t in ray:
+                    if occupied >> t & 1:
+                        break
+                    origins.append(t)
+        else:
+            origin = sq - 8
+            origins = [origin] if origin >= 8 and not occupied >> origin & 1 else []
+        for origin in origins:
+            previous = list(squares)
+            previous[slot] = origin
+            result.add(target.index(target.canonical(layout.flip(previous))))
+    return result
+
+
+def _predecessors_chunk(args):
+    """id предшественников для порции id границы уровня"""
+    signatures, ids = args
+    result = array('Q')
+    for g in ids:
+        t = g & 1
+        other = len(signatures) - 1 - t
+        layout = layout_for(signatures[t])
+        for idx in predecessors(layout, layout.decode(g >> 1)):
+            result.append(idx << 1 | other)
+    return result
+
+
+def _map(pool, func, tasks):
+    if pool is None:
+        return map(func, tasks)
+    return pool.imap(func, tasks)
+
+
+class _ByteFile:
+    """Байт на позицию в файле через mmap: в памяти только страницы, с которыми идет работа"""
+
+    def __init__(self, path, size, header=b''):
+        self._f = open(path, 'w+b')
+        self._f.write(header)
+        self._f.truncate(len(header) + size)
+        self._map = mmap.mmap(self._f.fileno(), 0)
+        self.data = memoryview(self._map)[len(header):]
+
+    def close(self):
+        self.data.release()
+        self._map.close()
+        self._f.close()
+
+
+class _LevelLists:
+    """Списки id по уровням: дописываются в файлы каталога, в памяти — только буферы"""
+
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+        self.levels = set()
+        self._buffers = {}
+
+    def _path(self, level):
+        return os.path.join(self.directory, "%s-%d" % (self.name, level))
+
+    def _buffer(self, level):
+        buffer = self._buffers.get(level)
+        if buffer is None:
+            buffer = self._buffers[level] = array('Q')
+            self.levels.add(level)
+        return buffer
+
+    def append(self, level, item):
+        buffer = self._buffer(level)
+        buffer.append(item)
+        if len(buffer) >= BUFFER:
+            self._flush(level, buffer)
+
+    def extend(self, level, items):
+        buffer = self._buffer(level)
+        buffer.extend(items)
+        if len(buffer) >= BUFFER:
+            self._flush(level, buffer)
+
+    def _flush(self, level, buffer):
+        with open(self._path(level), 'ab') as f:
+            buffer.tofile(f)
+        del buffer[:]
+
+    def pending(self, level):
+        """Есть ли списки уровня level и выше"""
+        return any(lvl >= level for lvl in self.levels)
+
+    def pop(self, level, count=CHUNK):
+        """Перебирает id уровня level порциями по count (array) и удаляет список"""
+        self.levels.discard(level)
+        buffer = self._buffers.pop(level, None)
+        path = self._path(level)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                while True:
+                    part = array('Q')
+                    try:
+                        part.fromfile(f, count)
+                    except EOFError:  # Прочитан остаток короче count
+                        if part:
+                            yield part
+                        break
+                    yield part
+            os.remove(path)
+        if buffer:
+            for i in range(0, len(buffer), count):
+                yield buffer[i:i + count]
+
+
+def generate_table(signature, directory=TABLEBASE_DIR, jobs=None, log=print):
+    """Строит таблицу набора материала вместе с таблицей набора с переставленными сторонами;
+    нужные таблицы меньших наборов должны уже быть. Возвращает пути файлов"""
+    signature = layout_for(signature).signature
+    flipped = flipped_signature(signature)
+    signatures = (signature,) if flipped == signature else (signature, flipped)
+    layouts = [layout_for(s) for s in signatures]
+    name = '+'.join(signatures)
+    jobs = jobs or os.cpu_count() or 1
+    started = time.perf_counter()
+
+    os.makedirs(directory, exist_ok=True)
+    work = tempfile.mkdtemp(prefix='.%s-' % signature, dir=directory)
+    paths = [table_path(directory, s) for s in signatures]
+    values = []
+    remaining = []
+    pool = None
+    try:
+        for s, layout, path in zip(signatures, layouts, paths):
+            header = MAGIC + s.encode().ljust(HEADER_SIZE - len(MAGIC), b'\0')
+            values.append(_ByteFile(path + '.tmp', layout.size, header))
+            remaining.append(_ByteFile(os.path.join(work, s + '.moves'), layout.size))
+        won = _LevelLists(work, 'won')  # Выигранные за level полуходов
+        lost = _LevelLists(work, 'lost')  # Проигранные за level полуходов
+        events = _LevelLists(work, 'events')  # От ходов в другие наборы, по расстоянию потомка
+        wins = losses = 0
+
+        pool = multiprocessing.Pool(jobs, _init_worker, (directory,)) if jobs > 1 else None
+        if pool is None:
+            _init_worker(directory)
+        tasks = [(signatures, t, start, min(start + SCAN_CHUNK, layout.size))
+                 for t, layout in enumerate(layouts) for start in range(0, layout.size, SCAN_CHUNK)]
+        for t, start, chunk_values, counts, chunk_wins, chunk_events in _map(pool, _scan_chunk, tasks):
+            values[t].data[start:start + len(counts)] = chunk_values
+            remaining[t].data[start:start + len(counts)] = counts
+            won.extend(1, chunk_wins)
+            wins += len(chunk_wins)
+            for level, items in chunk_events.items():
+                events.extend(level, items)
+        log("%s: %d позиций, первичный проход %.1f с" % (
+            name, sum(layout.size for layout in layouts), time.perf_counter() - started))
+
+        tables = [v.data for v in values]
+        counters = [r.data for r in remaining]
+        level = 1
+        while won.pending(level) or lost.pending(level) or events.pending(level):
+            if level >= MAX_DISTANCE:
+                raise OverflowError("Расстояние до результата больше %d полуходов" % MAX_DISTANCE)
+            win_value = level + 1
+            loss_value = LOSS_BASE + level + 1
+            for part in events.pop(level):
+                for item in part:
+                    g = item >> 1
+                    t, idx = g & 1, g >> 1
+                    if tables[t][idx]:
+                        continue
+                    if item & 1 == CHILD_LOSS:
+                        tables[t][idx] = win_value
+                        won.append(win_value, g)
+                        wins += 1
+                    else:
+                        counters[t][idx] -= 1
+                        if not counters[t][idx]:
+                            tables[t][idx] = loss_value
+                            lost.append(win_value, g)
+                            losses += 1
+            # Проигранная позиция выигрывает все предшествующие, выигранная — снимает с каждой
+            # из них по ходу; проигранные первыми, чтобы выигрыш не записался проигрышем
+            for frontier, resolved_loss in ((lost, True), (won, False)):
+                chunks = ((signatures, part) for part in frontier.pop(level))
+                for preds in _map(pool, _predecessors_chunk, chunks):
+                    for g in preds:
+                        t, idx = g & 1, g >> 1
+                        if tables[t][idx]:
+                            continue
+                        if resolved_loss:
+                            tables[t][idx] = win_value
+                            won.append(win_value, g)
+                            wins += 1
+                        else:
+                            counters[t][idx] -= 1
+                            if not counters[t][idx]:
+                                tables[t][idx] = loss_value
+                                lost.append(win_value, g)
+                                losses += 1
+            level += 1
+        del tables, counters
+        for v in values:
+            v.close()
+        values = []
+        for path in paths:
+            os.replace(path + '.tmp', path)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        for v in values:
+            v.close()
+        for r in remaining:
+            r.close()
+        for path in paths:
+            if os.path.exists(path + '.tmp'):
+                os.remove(path + '.tmp')
+        shutil.rmtree(work, ignore_errors=True)
+
+    log("%s: выигрышей %d, проигрышей %d, максимум %d полуходов, %.1f с" % (
+        name, wins, losses, level - 1, time.perf_counter() - started))
+    return paths
+
+
+def generate_family(signatures, directory=TABLEBASE_DIR, jobs=None, force=False, log=print):
+    """Строит таблицы наборов и всех меньших наборов, от которых они зависят"""
+    order = []
+    for signature in signatures:
+        for needed in family(Layout(signature).signature):
+            if needed not in order:
+                order.append(needed)
+    done = set()
+    for signature in order:
+        pair = {signature, flipped_signature(signature)}
+        if pair & done or not force and all(os.path.exists(table_path(directory, s)) for s in pair):
+            continue
+        generate_table(signature, directory, jobs, log)
+        done |= pair
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Генерация эндшпильных таблиц ретроградным анализом")
+    parser.add_argument('signatures', nargs='*', default=[FAMILY_ROOT],
+                        help="наборы материала, например KPvK KQvKP (по умолчанию все семейство %s)" % FAMILY_ROOT)
+    parser.add_argument('--dir', default=TABLEBASE_DIR, help="каталог для файлов таблиц")
+    parser.add_argument('--jobs', type=int, default=None, help="число процессов (по умолчанию все ядра)")
+    parser.add_argument('--force', action='store_true', help="пересоздать существующие таблицы")
+    args = parser.parse_args(argv)
+    generate_family(args.signatures, args.dir, args.jobs, args.force)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""Пачечная оценка batcheval совпадает со скалярной search.evaluate."""
+
+import random
+import unittest
+
+import batcheval
+from bitboard import WHITE, BLACK
+from engine import random_start
+from movegen import generate
+from search import evaluate
+from serialize import pack
+
+POSITIONS = 300
+
+
+def sample_positions(count=POSITIONS, seed=11):
+    """Стартовые расстановки и позиции после случайных ходов (с превращениями и взятыми
+    королями), у каждой сторона на ходу выбрана случайно"""
+    rng = random.Random(seed)
+    positions = []
+    moves = []
+    while len(positions) < count:
+        pos = random_start(rng)
+        for _ in range(rng.randrange(40)):
+            if pos.kings[WHITE] is None or pos.kings[BLACK] is None:
+                break
+            if not generate(pos, pos.side, moves):
+                break
+            pos.make_move(rng.choice(moves))
+        pos.set_side(rng.choice((WHITE, BLACK)))
+        positions.append(pos.copy())
+    return positions
+
+
+class BatchEvalTest(unittest.TestCase):
+    def setUp(self):
+        self.positions = sample_positions()
+
+    def test_batch_matches_scalar(self):
+        scores = batcheval.evaluate_batch(self.positions)
+        self.assertIsInstance(scores, list)
+        self.assertEqual(scores, [evaluate(pos) for pos in self.positions])
+
+    def test_children_match_scalar(self):
+        moves = []
+        for pos in self.positions[:50]:
+            generate(pos, pos.side, moves)
+            expected = []
+            for move in moves:
+                pos.make_move(move)
+                expected.append(evaluate(pos))
+                pos.unmake_move()
+            scores = batcheval.evaluate_children(pos, moves)
+            self.assertIsInstance(scores, list)
+            self.assertEqual(scores, expected)
+
+    def test_empty_batch(self):
+        self.assertEqual(batcheval.evaluate_batch([]), [])
+
+    @unittest.skipUnless(batcheval.HAVE_NUMPY, "нет NumPy")
+    def test_packed_records_match_bitboards(self):
+        codes, side = batcheval.stack(self.positions)
+        packed_codes, packed_side = batcheval.stack_packed([pack(pos) for pos in self.positions])
+        self.assertEqual(codes.tolist(), packed_codes.tolist())
+        self.assertEqual(side.tolist(), packed_side.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""Партии, записанные движком, воспроизводятся replay.py ход в ход."""
+
+import io
+import json
+import random
+import tempfile
+import unittest
+
+import replay
+from bitboard import WHITE, row_col
+from engine import Engine, random_start
+from gamelog import list_logs, open_log
+from movegen import generate, move_name
+from serialize import to_fen
+
+GAMES = 15
+AI_TIME_MS = 40  # Короткий предел: часть поисков прерывается посреди итерации
+
+
+def record_games(directory, games=GAMES, seed=7):
+    """Играет games партий случайных ходов белых против ИИ (по очереди choose_move и start_ai)"""
+    rng = random.Random(seed)
+    engine = Engine(ai_time_ms=AI_TIME_MS, tablebase_dir=None, log_dir=directory)
+    moves = []
+    try:
+        for game in range(games):
+            engine.new_game(rng)
+            while not engine.game_over:
+                engine.pos.set_side(WHITE)
+                if not generate(engine.pos, WHITE, moves):
+                    break
+                move = rng.choice(moves)
+                engine.move_piece(row_col(move & 63), row_col(move >> 6 & 63))
+                if engine.game_over:
+                    break
+                if game % 2:
+                    reply = engine.ai_move()
+                else:
+                    task = engine.start_ai()
+                    task.join()
+                    reply = task.result()
+                    if reply is not None:
+                        engine.move_piece(*reply)
+                if reply is None:
+                    break
+    finally:
+        engine.close()
+
+
+class ReplayTest(unittest.TestCase):
+    def test_engine_games_replay_without_divergence(self):
+        with tempfile.TemporaryDirectory() as directory:
+            record_games(directory)
+            paths = list_logs(directory)
+            self.assertEqual(len(paths), GAMES)
+            out = io.StringIO()
+            totals = replay.run(paths, out, jobs=1, tablebase_dir=None)
+        self.assertEqual(totals['errors'], 0, out.getvalue())
+        self.assertGreater(totals['checked'], GAMES)
+        self.assertEqual(totals['divergent'], 0, out.getvalue())
+        self.assertEqual(totals['ties'], 0, out.getvalue())
+
+    def test_inexact_games_are_unchecked(self):
+        rng = random.Random(3)
+        moves = []
+        with tempfile.TemporaryDirectory() as directory:
+            for settings in ({'ponder': True}, {'jobs': 2}, {'shared_tt': True}):
+                pos = random_start(rng)
+                log = open_log(directory, to_fen(pos), **settings)
+                generate(pos, pos.side, moves)
+                # Любой допустимый ход: ход поиска в такой записи не проверяется
+                log.ai_move(move_name(moves[-1]), 50.0, 3, 50.0)
+                log.finish('abandoned')
+            out = io.StringIO()
+            totals = replay.run(list_logs(directory), out, jobs=1, tablebase_dir=None, report_all=True)
+        self.assertEqual(totals['errors'], 0, out.getvalue())
+        self.assertEqual(totals['checked'], 0)
+        self.assertEqual(totals['unchecked'], 3)
+        self.assertEqual(totals['divergent'], 0)
+        self.assertEqual(totals['inexact_games'], 3)
+        reasons = sorted(json.loads(line)['inexact'] for line in out.getvalue().splitlines())
+        self.assertEqual(reasons, ['jobs', 'ponder', 'shared_tt'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+"""Таблица транспозиций фиксированного размера с заменой по глубине"""
+
+import multiprocessing
+from array import array
+
+# Тип оценки в записи; 0 — пустая запись
+EXACT = 1
+LOWER = 2  # Оценка не меньше сохраненной (было отсечение)
+UPPER = 3  # Оценка не больше сохраненной (ни один ход не улучшил альфу)
+
+ENTRY_BYTES = 16  # Два 64-битных слова на запись
+SCORE_OFFSET = 1 << 15
+
+# Упаковка данных записи в одно 64-битное слово:
+# ход 12 бит | глубина 8 бит | тип оценки 2 бита | оценка 16 бит | поколение 8 бит
+_DEPTH_SHIFT = 12
+_BOUND_SHIFT = 20
+_SCORE_SHIFT = 22
+_GEN_SHIFT = 38
+
+
+def entries_for_size(size_mb):
+    """Число записей (степень двойки), умещающихся в size_mb мегабайт"""
+    entries = max(1, int(size_mb * 1024 * 1024) // ENTRY_BYTES)
+    return 1 << (entries.bit_length() - 1)
+
+
+def shared_buffer(size_mb=16):
+    """Память таблицы, общая для процессов: передается воркерам пула и в TranspositionTable(buffer=...)"""
+    return multiprocessing.RawArray('Q', entries_for_size(size_mb) * 2)
+
+
+class TranspositionTable:
+    """Хеш-таблица позиций: лучший ход, глубина, оценка и её тип.
+
+    Каждая запись — два слова: ключ XOR данные и сами данные, поэтому запись,
+    перезаписанная наполовину, просто не пройдет проверку ключа. Новая запись
+    вытесняет старую, если та пустая, из прошлого поиска, с тем же ключом или
+    не глубже новой. По той же причине таблицу можно без блокировок делить между
+    процессами: buffer — память из shared_buffer(), size_mb тогда не используется."""
+
+    def __init__(self, size_mb=16, buffer=None):
+        self.buffer = buffer
+        if buffer is None:
+            self.entries = entries_for_size(size_mb)
+            self.table = array('Q', bytes(self.entries * ENTRY_BYTES))
+        else:
+            self.table = memoryview(buffer).cast('B').cast('Q')
+            self.entries = len(self.table) // 2
+        self.mask = self.entries - 1
+        self.generation = 0
+        self.reset_stats()
+
+    @property
+    def size_mb(self):
+        return self.entries * ENTRY_BYTES / (1024 * 1024)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0  # Слот занят другой позицией
+        self.stores = 0
+        self.rejected = 0  # Запись не сохранена: в слоте более глубокая позиция
+
+    def new_search(self):
+        """Начинает новое поколение: записи прошлых поисков можно вытеснять"""
+        self.generation = (self.generation + 1) & 255
+
+    def clear(self):
+        if self.buffer is None:
+            self.table = array('Q', bytes(self.entries * ENTRY_BYTES))
+        else:
+            # Общая память очищается на месте, чтобы воркеры видели ту же таблицу
+            self.table.cast('B')[:] = bytes(self.entries * ENTRY_BYTES)
+        self.generation = 0
+
+    def probe(self, key):
+        """Возвращает (ход, глубина, тип, оценка) или None"""
+        index = (key & self.mask) << 1
+        table = self.table
+        data = table[index + 1]
+        if not data:
+            self.misses += 1
+            return None
+        if table[index] ^ data != key:
+            self.misses += 1
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return (
+            data & 4095,
+            data >> _DEPTH_SHIFT & 255,
+            data >> _BOUND_SHIFT & 3,
+            (data >> _SCORE_SHIFT & 0xFFFF) - SCORE_OFFSET,
+        )
+
+    def store(self, key, move, depth, bound, score):
+        index = (key & self.mask) << 1
+        table = self.table
+        old = table[index + 1]
+        if old and table[index] ^ old != key:
+            if (old >> _GEN_SHIFT & 255) == self.generation and (old >> _DEPTH_SHIFT & 255) > depth:
+                self.rejected += 1
+                return
+        elif old and not move:
+            # Та же позиция без нового лучшего хода — сохраняем прежний
+            move = old & 4095
+        data = (
+            move
+            | min(max(depth, 0), 255) << _DEPTH_SHIFT
+            | bound << _BOUND_SHIFT
+            | (score + SCORE_OFFSET) << _SCORE_SHIFT
+            | self.generation << _GEN_SHIFT
+        )
+        table[index] = key ^ data
+        table[index + 1] = data
+        self.stores += 1
+
+    def hashfull(self):
+        """Доля занятых записей текущего поколения в промилле (по первой тысяче слотов)"""
+        sample = min(1000, self.entries)
+        table = self.table
+        used = 0
+        for i in range(sample):
+            data = table[2 * i + 1]
+            if data and (data >> _GEN_SHIFT & 255) == self.generation:
+                used += 1
+        return used * 1000 // sample
+
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            'size_mb': self.size_mb,
+            'entries': self.entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+            'stores': self.stores,
+            'rejected': self.rejected,
+            'hit_rate': self.hits / probes if probes else 0.0,
+            'hashfull': self.hashfull(),
+        }
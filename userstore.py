@@ -0,0 +1,391 @@
+"""Хранилища пользователей: записи {'login', 'password'} с поиском по логину.
+
+JsonUserStore — прежний формат users.json (весь файл читается и переписывается целиком),
+SqliteUserStore — таблица SQLite с первичным ключом по логину и постоянным соединением:
+поиск — одно обращение к индексу, регистрация — вставка одной строки.
+JournalUserStore — снимок и журнал дописываний с индексом в памяти и фоновым уплотнением.
+"""
+
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки между процессами недоступны
+    fcntl = None
+
+DB_FILE = 'users.json'  # Прежний файл пользователей
+SQLITE_FILE = 'users.sqlite3'
+JOURNAL_FILE = 'users.journal'
+BACKENDS = ('json', 'sqlite', 'journal')
+
+
+class UserStore:
+    """Общий интерфейс хранилищ пользователей"""
+
+    def get(self, login):
+        """Запись пользователя {'login', 'password'} или None"""
+        raise NotImplementedError
+
+    def add(self, login, password):
+        """Добавляет пользователя; False, если такой логин уже есть"""
+        raise NotImplementedError
+
+    def add_many(self, users):
+        """Добавляет пачку пар (логин, пароль). Возвращает список: True — добавлен, False — логин занят"""
+        return [self.add(login, password) for login, password in users]
+
+    def __iter__(self):
+        """Перебирает все записи"""
+        raise NotImplementedError
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, login):
+        return self.get(login) is not None
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_json_users(path=DB_FILE):
+    """Список пользователей из JSON-файла (пустой, если файла нет)"""
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return []
+
+
+class JsonUserStore(UserStore):
+    """Прежнее хранилище: список словарей в одном JSON-файле"""
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+
+    def get(self, login):
+        for user in load_json_users(self.path):
+            if user['login'] == login:
+                return user
+        return None
+
+    def add(self, login, password):
+        users = load_json_users(self.path)
+        if any(user['login'] == login for user in users):
+            return False
+        users.append({'login': login, 'password': password})
+        with open(self.path, "w") as f:
+            json.dump(users, f)
+        return True
+
+    def add_many(self, users):
+        existing = load_json_users(self.path)
+        logins = {user['login'] for user in existing}
+        results = []
+        for login, password in users:
+            results.append(login not in logins)
+            if login not in logins:
+                logins.add(login)
+                existing.append({'login': login, 'password': password})
+        if any(results):
+            with open(self.path, "w") as f:
+                json.dump(existing, f)
+        return results
+
+    def __iter__(self):
+        return iter(load_json_users(self.path))
+
+
+class SqliteUserStore(UserStore):
+    """Пользователи в SQLite; логин — первичный ключ.
+
+    При первом открытии базы пользователи из migrate_from (прежнего users.json) переносятся
+    одной транзакцией; сам JSON-файл не меняется. Версия схемы хранится в PRAGMA user_version,
+    поэтому перенос выполняется ровно один раз."""
+
+    SCHEMA_VERSION = 1
+
+    def __init__(self, path=SQLITE_FILE, migrate_from=None):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self._init_schema(migrate_from)
+
+    def _init_schema(self, migrate_from):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= self.SCHEMA_VERSION:
+            return
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS users (login TEXT PRIMARY KEY, password TEXT NOT NULL) WITHOUT ROWID"
+            )
+            if migrate_from is not None:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO users (login, password) VALUES (?, ?)",
+                    ((user['login'], user['password']) for user in load_json_users(migrate_from)),
+                )
+            self.conn.execute("PRAGMA user_version = %d" % self.SCHEMA_VERSION)
+
+    def get(self, login):
+        row = self.conn.execute("SELECT login, password FROM users WHERE login = ?", (login,)).fetchone()
+        if row is None:
+            return None
+        return {'login': row[0], 'password': row[1]}
+
+    def add(self, login, password):
+        try:
+            with self.conn:
+                self.conn.execute("INSERT INTO users (login, password) VALUES (?, ?)", (login, password))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def add_many(self, users):
+        """Пачка вставляется одной транзакцией"""
+        results = []
+        with self.conn:
+            for login, password in users:
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO users (login, password) VALUES (?, ?)", (login, password))
+                results.append(cursor.rowcount == 1)
+        return results
+
+    def __iter__(self):
+        for login, password in self.conn.execute("SELECT login, password FROM users ORDER BY login"):
+            yield {'login': login, 'password': password}
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+class _FileLock:
+    """Блокировка flock на отдельном файле: общая для чтения, исключительная для записи"""
+
+    def __init__(self, path):
+        self.file = open(path, 'a+b')
+
+    def acquire(self, exclusive):
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    def release(self):
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+    def close(self):
+        self.file.close()
+
+
+def _fsync_dir(path):
+    """Сохраняет на диск запись каталога (нужно после переименования файла)"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class JournalUserStore(UserStore):
+    """Снимок (JSON-список, как users.json) плюс журнал: по строке JSON на регистрацию.
+
+    При открытии индекс в памяти строится из снимка и журнала; недописанная при сбое последняя
+    строка журнала отбрасывается и обрезается при следующей записи. Регистрация — одно
+    дописывание в журнал и один fsync; add_many записывает пачку пользователей с одним fsync.
+    Фоновый поток периодически записывает новый снимок во временный файл, переименовывает его
+    поверх старого и очищает журнал. Несколько процессов на одной машине работают с хранилищем
+    через flock на файле path + '.lock': перед записью и при промахе индекса процесс дочитывает
+    журнал, а если снимок сменился, перечитывает всё заново."""
+
+    def __init__(self, path=JOURNAL_FILE, migrate_from=None, compact_interval=60.0, compact_min_records=1000):
+        self.path = path
+        self.snapshot_path = path + '.snapshot'
+        self.compact_min_records = compact_min_records
+        self._index = {}
+        self._snapshot_id = None  # (inode, mtime) прочитанного снимка
+        self._offset = 0  # Сколько байт журнала уже в индексе
+        self._journal_records = 0
+        self._mutex = threading.RLock()  # Между потоками процесса; flock — между процессами
+        self._lock = _FileLock(path + '.lock')
+        self._stop = threading.Event()
+        with self._locked(exclusive=True):
+            if migrate_from is not None and not os.path.exists(self.snapshot_path) \
+                    and not os.path.exists(self.path):
+                self._write_snapshot(load_json_users(migrate_from))
+            self._refresh()
+        self._compactor = None
+        if compact_interval:
+            self._compactor = threading.Thread(
+                target=self._compact_loop, args=(compact_interval,), name="user-compactor", daemon=True)
+            self._compactor.start()
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive):
+        with self._mutex:
+            self._lock.acquire(exclusive)
+            try:
+                yield
+            finally:
+                self._lock.release()
+
+    # ---------- Чтение ----------
+
+    def _file_id(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _refresh(self):
+        """Доводит индекс до состояния файлов (вызывается под блокировкой)"""
+        snapshot_id = self._file_id(self.snapshot_path)
+        if snapshot_id != self._snapshot_id:
+            self._index = {user['login']: user['password'] for user in load_json_users(self.snapshot_path)}
+            self._snapshot_id = snapshot_id
+            self._offset = 0
+            self._journal_records = 0
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            self._offset = 0
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if size < self._offset:
+                # Журнал очищен уплотнением, а снимок с тем же id — перечитываем всё
+                self._snapshot_id = None
+                return self._refresh()
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                user = json.loads(line)
+            except ValueError:
+                continue  # Испорченная строка — пропускаем, остальные записи целы
+            self._index.setdefault(user['login'], user['password'])
+            self._journal_records += 1
+        self._offset += end
+
+    def get(self, login):
+        with self._mutex:
+            password = self._index.get(login)
+            if password is None:
+                # Пользователь мог зарегистрироваться через другой процесс
+                with self._locked(exclusive=False):
+                    self._refresh()
+                password = self._index.get(login)
+        if password is None:
+            return None
+        return {'login': login, 'password': password}
+
+    def __iter__(self):
+        with self._locked(exclusive=False):
+            self._refresh()
+            users = [{'login': login, 'password': password} for login, password in self._index.items()]
+        return iter(users)
+
+    def __len__(self):
+        with self._locked(exclusive=False):
+            self._refresh()
+            return len(self._index)
+
+    # ---------- Запись ----------
+
+    def add(self, login, password):
+        return self.add_many([(login, password)])[0]
+
+    def add_many(self, users):
+        """Групповая запись: все новые пользователи пачки дописываются одним write и одним fsync.
+        Возвращает список: True — добавлен, False — логин уже занят"""
+        results = []
+        lines = []
+        with self._locked(exclusive=True):
+            self._refresh()
+            added = {}
+            for login, password in users:
+                if login in self._index or login in added:
+                    results.append(False)
+                    continue
+                added[login] = password
+                lines.append(json.dumps({'login': login, 'password': password}) + "\n")
+                results.append(True)
+            if lines:
+                fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+                try:
+                    # Хвост, недописанный при сбое, обрезается, чтобы новая строка начиналась с начала строки
+                    os.ftruncate(fd, self._offset)
+                    os.lseek(fd, self._offset, os.SEEK_SET)
+                    data = "".join(lines).encode('utf-8')
+                    os.write(fd, data)
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                self._offset += len(data)
+                self._journal_records += len(lines)
+                self._index.update(added)
+        return results
+
+    # ---------- Уплотнение ----------
+
+    def _write_snapshot(self, users):
+        tmp = self.snapshot_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(users, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        _fsync_dir(self.snapshot_path)
+
+    def compact(self):
+        """Записывает снимок со всеми пользователями и очищает журнал"""
+        with self._locked(exclusive=True):
+            self._refresh()
+            if not self._journal_records and self._offset == 0:
+                return False
+            self._write_snapshot([{'login': login, 'password': password}
+                                  for login, password in self._index.items()])
+            # Если процесс упадет до очистки, журнал повторит записи снимка — это безопасно
+            with open(self.path, 'r+b') as f:
+                f.truncate(0)
+                os.fsync(f.fileno())
+            self._snapshot_id = self._file_id(self.snapshot_path)
+            self._offset = 0
+            self._journal_records = 0
+        return True
+
+    def _compact_loop(self, interval):
+        while not self._stop.wait(interval):
+            if self._journal_records >= self.compact_min_records:
+                self.compact()
+
+    def close(self):
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join()
+        self._lock.close()
+
+
+def open_user_store(backend='sqlite', migrate_from=DB_FILE, path=None):
+    """Хранилище пользователей выбранного типа: 'json', 'sqlite' или 'journal'.
+    path — файл хранилища (по умолчанию стандартный для типа)"""
+    if backend == 'json':
+        return JsonUserStore(path or migrate_from or DB_FILE)
+    if backend == 'sqlite':
+        return SqliteUserStore(path or SQLITE_FILE, migrate_from=migrate_from)
+    if backend == 'journal':
+        return JournalUserStore(path or JOURNAL_FILE, migrate_from=migrate_from)
+    raise ValueError("Неизвестное хранилище пользователей: %r" % backend)
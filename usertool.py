@@ -0,0 +1,258 @@
+"""Массовый перенос пользователей между окружениями: потоковый импорт и экспорт в JSON или JSONL.
+
+Записи читаются и пишутся по одной, поэтому память не зависит от числа пользователей. Пароли
+при необходимости шифруются или перешифровываются другим ключом в пуле процессов пачками;
+формат шифра тот же, что у окна входа ('iv:ct' в base64), так что users.json переносится
+без изменений. Дубликаты отсекаются по индексу хранилища.
+
+Запуск:
+    python usertool.py export [-o users.json] [--to-key other.key]
+    python usertool.py import users.json [--plaintext | --from-key other.key]
+"""
+
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from passwords import KEY_FILE, load_or_create_key, encrypt_password, decrypt_password
+from userstore import open_user_store, BACKENDS
+
+BATCH = 1000  # Записей в одной пачке для пула
+READ_CHUNK = 1 << 16
+
+
+def iter_users(f, chunk_size=READ_CHUNK):
+    """Перебирает записи из текстового потока: JSON-массив (как users.json) или JSONL.
+    В памяти держится только текущий кусок файла"""
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+    while True:
+        # Между записями могут быть только пробелы, переводы строк, запятые и скобки массива
+        while pos < len(buf) and buf[pos] in ' \t\r\n,[]':
+            pos += 1
+        if pos == len(buf):
+            if eof:
+                return
+            buf = f.read(chunk_size)
+            pos = 0
+            eof = not buf
+            continue
+        try:
+            record, end = decoder.raw_decode(buf, pos)
+        except ValueError:
+            if eof:
+                raise ValueError("Неверная запись пользователя около: %r" % buf[pos:pos + 40])
+            more = f.read(chunk_size)
+            eof = not more
+            buf = buf[pos:] + more
+            pos = 0
+            continue
+        pos = end
+        if not isinstance(record, dict) or 'login' not in record or 'password' not in record:
+            raise ValueError("Запись без полей login и password: %r" % (record,))
+        yield record['login'], record['password']
+
+
+def batches(users, size=BATCH):
+    batch = []
+    for user in users:
+        batch.append(user)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ---------- Пароли в воркерах ----------
+
+_from_key = None  # None — пароль открытым текстом
+_to_key = None
+
+
+def _init_worker(from_key, to_key):
+    global _from_key, _to_key
+    _from_key = from_key
+    _to_key = to_key
+
+
+def _convert_batch(batch):
+    """Шифрует (или расшифровывает старым ключом и шифрует новым) пароли пачки"""
+    result = []
+    for login, password in batch:
+        if _from_key is not None:
+            password = decrypt_password(password, _from_key)
+        result.append((login, encrypt_password(password, _to_key)))
+    return result
+
+
+def convert(batches_in, from_key, to_key, jobs):
+    """Перебирает пачки с перешифрованными паролями в исходном порядке.
+    В работе одновременно не больше двух пачек на процесс, так что чтение не убегает вперед"""
+    if jobs <= 1:
+        _init_worker(from_key, to_key)
+        for batch in batches_in:
+            yield _convert_batch(batch)
+        return
+    with multiprocessing.Pool(jobs, _init_worker, (from_key, to_key)) as pool:
+        pending = collections.deque()
+        for batch in batches_in:
+            pending.append(pool.apply_async(_convert_batch, (batch,)))
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+class Progress:
+    """Печать прогресса и скорости не чаще раза в interval секунд"""
+
+    def __init__(self, log, interval=1.0):
+        self.log = log
+        self.interval = interval
+        self.started = self.last = time.perf_counter()
+        self.done = 0
+        self.duplicates = 0
+
+    def update(self, done, duplicates=0):
+        self.done += done
+        self.duplicates += duplicates
+        now = time.perf_counter()
+        if self.log is not None and now - self.last >= self.interval:
+            self.last = now
+            self.report()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        self.log("%d записей, %.0f записей/с, дубликатов %d" % (
+            self.done, self.done / elapsed if elapsed else 0.0, self.duplicates))
+
+
+# ---------- Импорт и экспорт ----------
+
+def import_users(f, store, from_key=None, to_key=None, reencrypt=False, jobs=1, batch=BATCH, log=None):
+    """Добавляет пользователей из потока f в хранилище; логины, которые уже есть, пропускаются.
+
+    reencrypt=False — пароли уже зашифрованы ключом хранилища и переносятся как есть;
+    иначе пароли шифруются ключом to_key, а если задан from_key — сначала им расшифровываются.
+    Возвращает (добавлено, дубликатов)"""
+    progress = Progress(log)
+    added = 0
+
+    def fresh(users):
+        # Дубликаты отсекаются до шифрования; логины из ещё не записанных пачек отсечет add_many
+        for batch_users in batches(users, batch):
+            kept = [user for user in batch_users if user[0] not in store]
+            skipped = len(batch_users) - len(kept)
+            if skipped:
+                progress.update(skipped, skipped)
+            if kept:
+                yield kept
+
+    converted = fresh(iter_users(f))
+    if reencrypt:
+        converted = convert(converted, from_key, to_key, jobs)
+    for chunk in converted:
+        results = store.add_many(chunk)
+        ok = sum(results)
+        added += ok
+        progress.update(len(chunk), len(chunk) - ok)
+    if log is not None:
+        progress.report()
+    return added, progress.duplicates
+
+
+def export_users(store, out, fmt='json', from_key=None, to_key=None, jobs=1, batch=BATCH, log=None):
+    """Пишет всех пользователей хранилища в поток out: 'json' — массив как users.json, 'jsonl' —
+    по записи в строке. Если задан to_key, пароли перешифровываются из from_key в to_key.
+    Возвращает число записей"""
+    progress = Progress(log)
+    chunks = batches(((user['login'], user['password']) for user in store), batch)
+    if to_key is not None:
+        chunks = convert(chunks, from_key, to_key, jobs)
+    first = True
+    if fmt == 'json':
+        out.write('[')
+    for chunk in chunks:
+        for login, password in chunk:
+            text = json.dumps({'login': login, 'password': password})
+            if fmt == 'json':
+                out.write(text if first else ', ' + text)
+            else:
+                out.write(text + '\n')
+            first = False
+        progress.update(len(chunk))
+    if fmt == 'json':
+        out.write(']')
+    if log is not None:
+        progress.report()
+    return progress.done
+
+
+def _read_key(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Импорт и экспорт пользователей в JSON/JSONL")
+    parser.add_argument('--backend', choices=BACKENDS, default='sqlite', help="тип хранилища")
+    parser.add_argument('--store', default=None, help="файл хранилища (по умолчанию стандартный)")
+    parser.add_argument('--key', default=KEY_FILE, help="ключ шифрования хранилища")
+    parser.add_argument('--jobs', type=int, default=None, help="число процессов (по умолчанию все ядра)")
+    parser.add_argument('--batch', type=int, default=BATCH, help="записей в одной пачке")
+    parser.add_argument('-q', '--quiet', action='store_true', help="не печатать прогресс")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    exp = commands.add_parser('export', help="выгрузить пользователей хранилища")
+    exp.add_argument('-o', '--output', default='-', help="файл (по умолчанию stdout)")
+    exp.add_argument('--format', choices=('json', 'jsonl'), default=None,
+                     help="формат (по умолчанию по расширению файла, иначе json)")
+    exp.add_argument('--to-key', default=None, help="перешифровать пароли этим ключом")
+
+    imp = commands.add_parser('import', help="загрузить пользователей в хранилище")
+    imp.add_argument('input', help="файл JSON или JSONL ('-' — stdin)")
+    source = imp.add_mutually_exclusive_group()
+    source.add_argument('--plaintext', action='store_true', help="пароли во входном файле не зашифрованы")
+    source.add_argument('--from-key', default=None, help="пароли зашифрованы этим ключом, перешифровать")
+    args = parser.parse_args(argv)
+
+    jobs = args.jobs or os.cpu_count() or 1
+    log = None if args.quiet else (lambda message: print(message, file=sys.stderr, flush=True))
+    store = open_user_store(args.backend, migrate_from=None, path=args.store)
+    try:
+        if args.command == 'export':
+            fmt = args.format or ('jsonl' if args.output.endswith('.jsonl') else 'json')
+            to_key = _read_key(args.to_key) if args.to_key else None
+            key = load_or_create_key(args.key) if to_key is not None else None
+            out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+            try:
+                export_users(store, out, fmt, key, to_key, jobs, args.batch, log)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+        else:
+            from_key = _read_key(args.from_key) if args.from_key else None
+            reencrypt = args.plaintext or from_key is not None
+            key = load_or_create_key(args.key) if reencrypt else None
+            f = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+            try:
+                added, duplicates = import_users(f, store, from_key, key, reencrypt, jobs, args.batch, log)
+            finally:
+                if f is not sys.stdin:
+                    f.close()
+            if log is not None:
+                log("добавлено %d, пропущено дубликатов %d" % (added, duplicates))
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())